@@ -1 +1,46 @@
-"""Proglove Streams."""
+"""Proglove Streams.
+
+The main classes are available from the package, each module being
+imported on first access:
+
+    from proglove_streams import Gateway, GatewayMessageHandler
+
+"""
+import importlib
+from typing import Any, Dict, List
+
+# public names and the module they are imported from
+_EXPORTS: Dict[str, str] = {
+    "AsyncGateway": "proglove_streams.async_gateway",
+    "AsyncGatewayMessageHandler": "proglove_streams.async_gateway",
+    "CommandError": "proglove_streams.exception",
+    "EventFilter": "proglove_streams.event_filter",
+    "Gateway": "proglove_streams.gateway",
+    "GatewayMessageHandler": "proglove_streams.gateway",
+    "GatewayPool": "proglove_streams.pool",
+    "Metrics": "proglove_streams.metrics",
+    "ProgloveStreamsException": "proglove_streams.exception",
+    "ReconnectPolicy": "proglove_streams.reconnect",
+    "ScanDeduplicator": "proglove_streams.dedup",
+    "ScanRouter": "proglove_streams.scan_router",
+    "init_logging": "proglove_streams.logging",
+    "start_gateways": "proglove_streams.gateway",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    """Import a public name on first access."""
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    """List the public names."""
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -3,24 +3,33 @@ import argparse
 import logging
 import platform
 import time
+from typing import TYPE_CHECKING
 
-from streams_api.customer_integrations.button_pressed.model import ButtonPressedStream
-from streams_api.customer_integrations.errors.model import ErrorsStream
-from streams_api.customer_integrations.gateway_state_event.model import (
-    GatewayStateEventStream,
-)
-from streams_api.customer_integrations.scan.model import ScanStream
-from streams_api.customer_integrations.scanner_state.model import ScannerStateStream
-
+from proglove_streams.capture import CaptureRecorder, capture_files, replay
 from proglove_streams.client import Client
 from proglove_streams.exception import ProgloveStreamsException
 from proglove_streams.gateway import Gateway, GatewayMessageHandler
-from proglove_streams.logging import init_logging
+from proglove_streams.logging import PRODUCTION_SAMPLE_RATE, init_logging
+from proglove_streams.reconnect import ReconnectPolicy
+from proglove_streams.scan_router import ScanCallback, ScanRouter
+
+if TYPE_CHECKING:
+    from streams_api.customer_integrations.button_pressed.model import (
+        ButtonPressedStream,
+    )
+    from streams_api.customer_integrations.errors.model import ErrorsStream
+    from streams_api.customer_integrations.gateway_state_event.model import (
+        GatewayStateEventStream,
+    )
+    from streams_api.customer_integrations.scan.model import ScanStream
+    from streams_api.customer_integrations.scanner_state.model import (
+        ScannerStateStream,
+    )
 
 logger = logging.getLogger(__name__)
 
 
-def _set_display(client: Gateway, event: ScanStream) -> None:
+def _set_display(client: Gateway, event: "ScanStream") -> None:
     client.set_display(
         str(event.device_serial),
         "PG3",
@@ -44,7 +53,7 @@ def _set_display(client: Gateway, event: ScanStream) -> None:
     )
 
 
-def _block_trigger(client: Gateway, event: ScanStream) -> None:
+def _block_trigger(client: Gateway, event: "ScanStream") -> None:
     client.set_trigger_block(
         str(event.device_serial),
         True,
@@ -54,21 +63,37 @@ def _block_trigger(client: Gateway, event: ScanStream) -> None:
     )
 
 
-def _unblock_trigger(client: Gateway, event: ScanStream) -> None:
+def _unblock_trigger(client: Gateway, event: "ScanStream") -> None:
     client.set_trigger_block(str(event.device_serial), False, [], [])
 
 
-def on_connected(_client: Client, event: ScannerStateStream) -> None:
+def on_connected(_client: Client, event: "ScannerStateStream") -> None:
     """On connected event callback."""
     logger.info("device connected: %s", event.device_serial)
 
 
-def on_disconnected(_client: Client, event: ScannerStateStream) -> None:
+def on_disconnected(_client: Client, event: "ScannerStateStream") -> None:
     """On disconnected event callback."""
     logger.info("device disconnected: %s", event.device_serial)
 
 
-def on_scan(client: Client, event: ScanStream) -> None:
+def _send_feedback(feedback_action_id: str) -> ScanCallback:
+    def send_feedback(client: Gateway, event: "ScanStream") -> None:
+        client.send_feedback(str(event.device_serial), feedback_action_id)
+
+    return send_feedback
+
+
+SCAN_ROUTER = ScanRouter()
+SCAN_ROUTER.exact("DISPLAY", _set_display)
+SCAN_ROUTER.exact("BLOCK", _block_trigger)
+SCAN_ROUTER.exact("UNBLOCK", _unblock_trigger)
+SCAN_ROUTER.exact("FEEDBACK_OK", _send_feedback("FEEDBACK_POSITIVE"))
+SCAN_ROUTER.exact("FEEDBACK_NOK", _send_feedback("FEEDBACK_NEGATIVE"))
+SCAN_ROUTER.exact("STATE", lambda client, _event: client.get_gateway_state())
+
+
+def on_scan(client: Client, event: "ScanStream") -> None:
     """On scan event callback."""
     if not isinstance(client, Gateway):
         return
@@ -77,28 +102,15 @@ def on_scan(client: Client, event: ScanStream) -> None:
         "scan received: device %s, data: %s", event.device_serial, repr(event.scan_code)
     )
 
-    scan_code = str(event.scan_code).split("\r")[0]
+    SCAN_ROUTER(client, event)
 
-    if scan_code == "DISPLAY":
-        _set_display(client, event)
-    elif scan_code == "BLOCK":
-        _block_trigger(client, event)
-    elif scan_code == "UNBLOCK":
-        _unblock_trigger(client, event)
-    elif scan_code == "FEEDBACK_OK":
-        client.send_feedback(str(event.device_serial), "FEEDBACK_POSITIVE")
-    elif scan_code == "FEEDBACK_NOK":
-        client.send_feedback(str(event.device_serial), "FEEDBACK_NEGATIVE")
-    elif scan_code == "STATE":
-        client.get_gateway_state()
 
-
-def on_error(_client: Client, event: ErrorsStream) -> None:
+def on_error(_client: Client, event: "ErrorsStream") -> None:
     """On error event callback."""
     logger.info("error received: %s", event.error_code)
 
 
-def on_gateway_state_event(_client: Client, event: GatewayStateEventStream) -> None:
+def on_gateway_state_event(_client: Client, event: "GatewayStateEventStream") -> None:
     """On Gateway state event callback."""
     logger.info(
         """Gateway state received: serial: %s version: %s
@@ -111,7 +123,7 @@ def on_gateway_state_event(_client: Client, event: GatewayStateEventStream) -> N
 
 def on_button_pressed_event(
     _client: Client,
-    event: ButtonPressedStream,
+    event: "ButtonPressedStream",
 ) -> None:
     """On error event callback."""
     logger.info(
@@ -134,6 +146,19 @@ def app_example() -> None:
         choices=("DEBUG", "INFO", "WARNING", "ERROR"),
         default="DEBUG",
     )
+    parser.add_argument(
+        "-P",
+        "--production-logging",
+        help="sample the logs of every event and command, and format and write \
+            the logs from a dedicated thread",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-J",
+        "--json-logging",
+        help="write the logs as JSON lines",
+        action="store_true",
+    )
     parser.add_argument(
         "-b",
         "--baudrate",
@@ -151,12 +176,46 @@ def app_example() -> None:
         metavar="PORT",
         default="COM1" if platform.system() == "Windows" else "/dev/ttyACM0",
     )
+    parser.add_argument(
+        "-C",
+        "--capture",
+        help="record the received lines in a capture file, compressed when \
+            ending with .gz",
+        type=str,
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "-R",
+        "--replay",
+        help="handle the lines of a capture file instead of a Gateway",
+        type=str,
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "-S",
+        "--replay-speed",
+        help="replay speed relative to the recording, 0 for as fast as \
+            possible (default is 1)",
+        type=float,
+        metavar="SPEED",
+        default=1.0,
+    )
     args = parser.parse_args()
 
     device = args.port
     baudrate = args.baudrate
 
-    init_logging(getattr(logging, args.logging_level))
+    if args.production_logging:
+        init_logging(
+            getattr(logging, args.logging_level),
+            queued=True,
+            sample_rate=PRODUCTION_SAMPLE_RATE,
+            json_format=args.json_logging,
+        )
+    else:
+        init_logging(
+            getattr(logging, args.logging_level), json_format=args.json_logging
+        )
 
     logger.info("Streams API example application.")
 
@@ -169,17 +228,41 @@ def app_example() -> None:
         on_button_pressed=on_button_pressed_event,
     )
 
+    if args.replay:
+        try:
+            replay(
+                capture_files(args.replay) or args.replay,
+                handler,
+                speed=args.replay_speed or None,
+            )
+        except ProgloveStreamsException as e:
+            logger.error("Streams API exception: %s", e)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    recorder = None
     try:
-        gateway = Gateway(handler, device, baudrate)
+        if args.capture:
+            recorder = CaptureRecorder(args.capture)
+        gateway = Gateway(
+            handler, device, baudrate, reconnect=ReconnectPolicy(), recorder=recorder
+        )
         gateway.start()
     except ProgloveStreamsException as e:
-        logging.error("Streams API exception: %s", e)
+        logger.error("Streams API exception: %s", e)
+        if recorder is not None:
+            recorder.close()
         return
 
     logger.info("application started, press Ctrl-C to exit")
 
     try:
-        while True:
-            time.sleep(1000)
+        while gateway.is_running:
+            time.sleep(1)
+        logger.error("connection to the Gateway lost")
     except KeyboardInterrupt:
-        gateway.stop()
+        pass
+    gateway.stop()
+    if recorder is not None:
+        recorder.close()
@@ -0,0 +1,504 @@
+"""Asyncio Gateway module.
+
+The :class:`AsyncGateway` services the serial port from the running event
+loop instead of a dedicated thread: the port file descriptor is registered
+with ``loop.add_reader`` so the loop is only woken up when data is
+available. This requires a POSIX system.
+
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Union
+
+from serial import Serial, SerialException, serial_for_url
+
+from proglove_streams.client import Client
+from proglove_streams.codec import Codec, get_codec
+from proglove_streams.commands import (
+    CommandBatch,
+    CommandTracker,
+    display_command,
+    feedback_command,
+    new_command,
+    trigger_block_command,
+)
+from proglove_streams.devices import DeviceRegistry
+from proglove_streams.display_cache import DisplayCache
+from proglove_streams.exception import ProgloveStreamsException
+from proglove_streams.framing import LineFramer, discard_input
+from proglove_streams.handler import AsyncHandler, EventRouter, parse_gateway_state
+from proglove_streams.logging import log_sampled
+from proglove_streams.metrics import Metrics
+from proglove_streams.pending import PendingRequests
+
+if TYPE_CHECKING:
+    from streams_api.customer_integrations.gateway_state_event.model import (
+        GatewayStateEventStream,
+    )
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 4096
+
+# maximum number of events waiting for the handler
+DEFAULT_QUEUE_SIZE = 1000
+
+
+# pylint: disable=too-few-public-methods
+class AsyncGatewayMessageHandler(EventRouter, AsyncHandler):
+    """Default asynchronous Gateway message handler."""
+
+    async def handle(self, client: Client, event: Dict) -> None:
+        """Handle the events."""
+        resolved = self.resolve(event)
+        if resolved is None:
+            return
+
+        callback, stream = resolved
+        if self._metrics is None:
+            await callback(client, stream)
+            return
+
+        start = time.perf_counter()
+        try:
+            await callback(client, stream)
+        finally:
+            self._observe_callback(event, start)
+
+
+# pylint: disable=too-many-instance-attributes
+class AsyncGateway:
+    """Asyncio Gateway class."""
+
+    def __init__(
+        self,
+        handler: AsyncHandler,
+        port: str,
+        baudrate: int = 115200,
+        codec: Optional[Codec] = None,
+        command_timeout: float = 5.0,
+        display_cache_ttl: Optional[float] = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        metrics: Optional[Metrics] = None,
+    ):
+        """Initialize the class.
+
+        Arguments:
+            handler: The handler of the received events.
+            port: The serial port path, or a pyserial URL such as
+                ``socket://host:port``.
+            baudrate: The serial port baudrate.
+            codec: The JSON codec, by default the fastest one installed.
+            command_timeout: The time, in seconds, to wait for the reply to
+                a command before resolving its future.
+            display_cache_ttl: Do not send the display commands showing what
+                the device displays since less than this time, in seconds.
+                By default all the display commands are sent.
+            queue_size: The number of events waiting for the handler above
+                which the port is no longer read, until the handler caught
+                up with half of them (backpressure).
+            metrics: The registry counting the commands sent, none by
+                default.
+
+        """
+        if queue_size < 1:
+            raise ValueError("the queue size must be positive")
+
+        self._port = port
+        self._baudrate = baudrate
+        self._handler = handler
+        self._codec = codec or get_codec()
+        self._queue_size = queue_size
+
+        self._serial: Optional[Serial] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._events: Optional["asyncio.Queue[Dict[str, Any]]"] = None
+        self._dispatch_task: Optional["asyncio.Task[None]"] = None
+        self._expire_handle: Optional[asyncio.TimerHandle] = None
+        self._pending = PendingRequests(command_timeout)
+        self._devices = DeviceRegistry()
+        self._display_cache = (
+            DisplayCache(display_cache_ttl) if display_cache_ttl is not None else None
+        )
+        self._commands = CommandTracker(
+            self._codec, self._pending, self._devices, self._display_cache, metrics
+        )
+        self._framer = LineFramer()
+        self._write_buffer = bytearray()
+        self._write_drained: Optional["asyncio.Future[None]"] = None
+        self._is_reading = False
+
+    @property
+    def display_cache(self) -> Optional[DisplayCache]:
+        """Get the cache of the displays sent, if enabled."""
+        return self._display_cache
+
+    @property
+    def devices(self) -> DeviceRegistry:
+        """Get the state of the devices, updated from the received events."""
+        return self._devices
+
+    @property
+    def is_running(self) -> bool:
+        """Tell whether the port is being serviced.
+
+        The Gateway stops running when reading the port fails, and can be
+        started again.
+
+        """
+        return self._dispatch_task is not None
+
+    async def start(self, flush_input: bool = True) -> None:
+        """Start servicing the wrapped connection."""
+        if self.is_running:
+            return
+
+        logger.info("start the asyncio Gateway client")
+
+        if self._serial is not None:
+            self._serial.close()
+            self._serial = None
+
+        try:
+            logger.debug(
+                "open serial port %s with baudrate %u", self._port, self._baudrate
+            )
+            self._serial = serial_for_url(self._port, self._baudrate, timeout=0)
+
+            if flush_input:
+                discard_input(self._serial)
+
+        except (SerialException, ValueError) as e:
+            logger.error("could not open serial connection: %s", e)
+            raise ProgloveStreamsException(str(e)) from e
+
+        self._loop = asyncio.get_running_loop()
+        self._events = asyncio.Queue()
+        self._framer.clear()
+        self._write_buffer.clear()
+        self._commands.reset()
+        self._resume_reading()
+        self._dispatch_task = self._loop.create_task(self._dispatch_loop(self._events))
+
+        logger.info("asyncio Gateway client started")
+
+    async def stop(self) -> None:
+        """Stop the serial communication."""
+        logger.info("stop the asyncio Gateway client")
+
+        self._close_serial()
+        self._pending.cancel_all()
+
+        tasks = self._cancel_tasks()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def get_gateway_state(self) -> "asyncio.Future[GatewayStateEventStream]":
+        """Get the Gateway state command.
+
+        Returns:
+            A future resolved with the Gateway state reply.
+
+        """
+        return await self._send_command(new_command("gateway_state!"))
+
+    async def send_feedback(
+        self, device_serial: str, feedback_action_id: str
+    ) -> "asyncio.Future[None]":
+        """Send a feedback command.
+
+        Arguments:
+            device_serial: The Mark serial number.
+            feedback_action_id: The action ID of the feedback.
+
+        Returns:
+            A future failed with :class:`CommandError` if the Gateway
+            replies with an error, resolved otherwise once the command
+            timeout expired.
+
+        """
+        return await self._send_command(
+            feedback_command(device_serial, feedback_action_id)
+        )
+
+    # pylint: disable=too-many-arguments disable=duplicate-code
+    async def set_display(
+        self,
+        device_serial: str,
+        display_template_id: str,
+        display_fields: List[Dict[str, Union[int, str]]],
+        display_refresh_type: str = "DEFAULT",
+        time_validity_duration: Optional[int] = None,
+    ) -> "asyncio.Future[None]":
+        """Send a display command.
+
+        Arguments:
+            device_serial: The Mark serial number.
+            display_template_id: The template ID to display.
+            display_fields: A list of fields to display.
+            display_refresh_type: The display refresh type.
+            time_validity_duration: The time the display should be shown.
+
+        Returns:
+            A future failed with :class:`CommandError` on error reply.
+
+        """
+        return await self._send_command(
+            display_command(
+                device_serial,
+                display_template_id,
+                display_fields,
+                display_refresh_type,
+                time_validity_duration,
+            )
+        )
+
+    # pylint: disable=too-many-arguments disable=duplicate-code
+    async def set_trigger_block(
+        self,
+        device_serial: str,
+        trigger_block_state: bool,
+        trigger_block_gesture_list: List[str],
+        trigger_unblock_gesture_list: List[str],
+        time_validity_duration: Optional[int] = None,
+    ) -> "asyncio.Future[None]":
+        """Send a trigger block command.
+
+        Arguments:
+            device_serial: The Mark serial number.
+            trigger_block_state: The state of the trigger block.
+            trigger_block_gesture_list: A list of triggers to block.
+            trigger_unblock_gesture_list: A list of trigger that can ublock.
+            time_validity_duration: The time the blocking should last.
+
+        Returns:
+            A future failed with :class:`CommandError` on error reply.
+
+        """
+        return await self._send_command(
+            trigger_block_command(
+                device_serial,
+                trigger_block_state,
+                trigger_block_gesture_list,
+                trigger_unblock_gesture_list,
+                time_validity_duration,
+            )
+        )
+
+    def new_batch(self) -> CommandBatch:
+        """Create a batch of commands to send with :meth:`send_batch`."""
+        return CommandBatch(self._codec)
+
+    async def send_batch(
+        self, commands: Union[CommandBatch, Iterable[Dict[str, Any]]]
+    ) -> List[str]:
+        """Send many commands with a single write.
+
+        Arguments:
+            commands: A batch created with :meth:`new_batch`, or commands
+                built with the ``*_command`` functions.
+
+        Returns:
+            The event IDs of the commands.
+
+        """
+        commands = self._commands.batch(commands)
+        data = commands.encode()
+        if data:
+            await self._send_data(data)
+            self._commands.sent_batch(commands)
+        return commands.event_ids
+
+    def _close_serial(self) -> None:
+        if self._serial is None:
+            return
+
+        if self._loop is not None:
+            self._loop.remove_reader(self._serial.fileno())
+            self._loop.remove_writer(self._serial.fileno())
+        self._is_reading = False
+
+        if self._write_drained is not None and not self._write_drained.done():
+            self._write_drained.set_exception(
+                ProgloveStreamsException("serial connection closed")
+            )
+        self._write_drained = None
+
+        logger.debug("close the serial connection")
+        self._serial.close()
+        self._serial = None
+
+        # the devices may lose their displays until connected again
+        self._commands.reset()
+
+    def _on_readable(self) -> None:
+        if self._serial is None or self._events is None:
+            return
+
+        try:
+            data = self._serial.read(READ_SIZE)
+        except (SerialException, OSError) as e:
+            logger.error("could not read from serial: %s", e)
+            # stopped, so that the application sees it and starts it again
+            self._close_serial()
+            self._pending.fail_all(ProgloveStreamsException(str(e)))
+            self._cancel_tasks()
+            return
+
+        for line in self._framer.feed(data):
+            try:
+                event = self._codec.decode(line)
+            except self._codec.decode_errors as e:
+                log_sampled(logger, logging.DEBUG, None, "malformed JSON: %s", e)
+                continue
+
+            self._devices.update(event)
+            self._commands.received(event)
+            self._pending.correlate(event, parse_gateway_state)
+            self._events.put_nowait(event)
+
+        if self._expire_handle is not None and not self._pending:
+            self._expire_handle.cancel()
+            self._expire_handle = None
+
+        if self._events.qsize() >= self._queue_size:
+            logger.debug("event queue full, stop reading")
+            self._pause_reading()
+
+    def _pause_reading(self) -> None:
+        if self._is_reading and self._serial is not None and self._loop is not None:
+            self._loop.remove_reader(self._serial.fileno())
+            self._is_reading = False
+
+    def _resume_reading(self) -> None:
+        if not self._is_reading and self._serial is not None and self._loop is not None:
+            self._loop.add_reader(self._serial.fileno(), self._on_readable)
+            self._is_reading = True
+
+    def _cancel_tasks(self) -> List["asyncio.Task[None]"]:
+        """Cancel the dispatch task and the expiry, dropping the queued events."""
+        if self._expire_handle is not None:
+            self._expire_handle.cancel()
+            self._expire_handle = None
+
+        tasks = [self._dispatch_task] if self._dispatch_task is not None else []
+        for task in tasks:
+            task.cancel()
+        self._dispatch_task = None
+        return tasks
+
+    async def _dispatch_loop(self, events: "asyncio.Queue[Dict[str, Any]]") -> None:
+        while True:
+            event = await events.get()
+            try:
+                await self._handler.handle(self, event)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("handler failed for event %s", event)
+
+            # resumed once half empty, not to toggle the reader for every event
+            if not self._is_reading and events.qsize() <= self._queue_size // 2:
+                self._resume_reading()
+
+    def _schedule_expiry(self) -> None:
+        """Arm a timer for the next command timeout, if it is not armed yet."""
+        if self._loop is None:
+            return
+
+        deadline = self._pending.next_deadline()
+        handle = self._expire_handle
+        if deadline is None:
+            if handle is not None:
+                handle.cancel()
+                self._expire_handle = None
+            return
+
+        # the deadlines are on the time.monotonic clock
+        when = self._loop.time() + deadline - time.monotonic()
+        if handle is not None:
+            if handle.when() <= when:
+                return
+            handle.cancel()
+        self._expire_handle = self._loop.call_at(when, self._expire)
+
+    def _expire(self) -> None:
+        self._expire_handle = None
+        self._pending.expire()
+        self._schedule_expiry()
+
+    async def _send_command(self, command: Dict[str, Any]) -> "asyncio.Future[Any]":
+        if self._loop is None:
+            raise ProgloveStreamsException("serial connection not opened")
+
+        future = self._loop.create_future()
+        if not self._commands.prepare(command):
+            future.set_result(None)
+            return future
+
+        # registered before writing, the reply may come before write returns
+        self._commands.register(command, future)
+        self._schedule_expiry()
+        try:
+            await self._send_data(self._codec.encode(command) + b"\n")
+        except BaseException:
+            self._commands.discard(command)
+            raise
+        self._commands.sent(command)
+        return future
+
+    async def _send_data(self, data: bytes) -> None:
+        if self._serial is None or self._loop is None:
+            logger.warning("serial connection not opened")
+            raise ProgloveStreamsException("serial connection not opened")
+
+        self._write_buffer += data
+
+        # the waiter is done, and reset, once written or when the write fails
+        waiter = self._write_drained
+        if waiter is None:
+            waiter = self._write_drained = self._loop.create_future()
+            self._on_writable()
+            if not waiter.done():
+                self._loop.add_writer(self._serial.fileno(), self._on_writable)
+
+        await asyncio.shield(waiter)
+
+    def _on_writable(self) -> None:
+        if self._serial is None or self._loop is None:
+            return
+
+        try:
+            written = os.write(self._serial.fileno(), self._write_buffer)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.error("could not send data to serial: %s", e)
+            waiter, self._write_drained = self._write_drained, None
+            self._loop.remove_writer(self._serial.fileno())
+            self._write_buffer.clear()
+            if waiter is not None and not waiter.done():
+                waiter.set_exception(ProgloveStreamsException(str(e)))
+            return
+
+        del self._write_buffer[:written]
+        if self._write_buffer:
+            return
+
+        waiter, self._write_drained = self._write_drained, None
+        self._loop.remove_writer(self._serial.fileno())
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def __aenter__(self) -> "AsyncGateway":
+        """Use asynchronous context manager."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, _exc_type: Any, _exc_val: Any, _exc_tb: Any) -> None:
+        """Close asynchronous context manager."""
+        await self.stop()
@@ -0,0 +1,5 @@
+"""Benchmarks of the Streams API client.
+
+Run them with ``python -m proglove_streams.bench <benchmark>``.
+
+"""
@@ -0,0 +1,38 @@
+"""Benchmarks entry point."""
+import argparse
+import importlib
+from typing import Dict
+
+BENCHMARKS: Dict[str, str] = {
+    "codec": "compare the JSON codecs",
+    "framing": "compare Serial.readline with the chunked line framer",
+    "scan_router": "compare the ScanRouter with a linear list of routing rules",
+    "startup": "measure the startup time of many Gateways over ptys",
+    "throughput": "measure the event throughput of a Gateway fed through a pty",
+    "validation": "compare the event rate of the handler validation modes",
+}
+
+
+def main() -> None:
+    """Run a benchmark."""
+    parser = argparse.ArgumentParser("proglove_streams.bench")
+    parser.add_argument("benchmark", choices=BENCHMARKS, help="benchmark to run")
+    # the options after the benchmark, --help included, are the benchmark ones
+    parser.add_argument(
+        "arguments",
+        nargs=argparse.REMAINDER,
+        help="arguments of the benchmark, see BENCHMARK --help",
+    )
+    args = parser.parse_args()
+
+    module = importlib.import_module(f"proglove_streams.bench.{args.benchmark}")
+    benchmark_parser = argparse.ArgumentParser(
+        f"proglove_streams.bench {args.benchmark}",
+        description=BENCHMARKS[args.benchmark],
+    )
+    module.add_arguments(benchmark_parser)
+    module.run(benchmark_parser.parse_args(args.arguments))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Compare the JSON codecs on scan events and display commands."""
+import argparse
+import time
+from typing import Any, Callable, List
+
+from proglove_streams.bench.payloads import display_command, encode, scan_event
+from proglove_streams.codec import available_codecs
+
+
+def _time_per_call(function: Callable[[Any], Any], items: List[Any]) -> float:
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - start) * 1e6 / len(items)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the benchmark arguments."""
+    parser.add_argument("-n", "--events", type=int, default=100000)
+
+
+def run(args: argparse.Namespace) -> None:
+    """Run the benchmark."""
+    lines = [encode(scan_event()).rstrip(b"\n") for _ in range(args.events)]
+    commands = [display_command() for _ in range(args.events)]
+
+    print(f"{args.events} scan events decoded, display commands encoded")
+    for name, codec in available_codecs().items():
+        decode = _time_per_call(codec.decode, lines)
+        encode_ = _time_per_call(codec.encode, commands)
+        print(f"{name:>8}: decode {decode:6.2f} us, encode {encode_:6.2f} us")
@@ -0,0 +1,102 @@
+"""Compare Serial.readline with the chunked line framer."""
+import argparse
+import os
+import pty
+import select
+import time
+from contextlib import contextmanager
+from threading import Thread
+from typing import Callable, Dict, Iterator
+from unittest.mock import patch
+
+from serial import Serial
+
+from proglove_streams.bench.payloads import encode, scan_event
+from proglove_streams.framing import LineFramer, read_available
+
+
+@contextmanager
+def _count_syscalls() -> Iterator[Dict[str, int]]:
+    counts = {"read": 0, "select": 0}
+    real_read = os.read
+    real_select = select.select
+
+    def counting_read(fd: int, size: int) -> bytes:
+        counts["read"] += 1
+        return real_read(fd, size)
+
+    def counting_select(*args: object) -> object:
+        counts["select"] += 1
+        return real_select(*args)  # type: ignore
+
+    with patch.object(os, "read", counting_read), patch.object(
+        select, "select", counting_select
+    ):
+        yield counts
+
+
+def _read_with_readline(serial: Serial, count: int) -> None:
+    received = 0
+    while received < count:
+        if serial.readline():
+            received += 1
+
+
+def _read_with_framer(serial: Serial, count: int) -> None:
+    framer = LineFramer()
+    received = 0
+    while received < count:
+        received += len(framer.feed(read_available(serial)))
+
+
+def _measure(
+    reader: Callable[[Serial, int], None], count: int, burst: int
+) -> Dict[str, float]:
+    master, slave = pty.openpty()
+    serial = Serial(os.ttyname(slave), timeout=0.1)
+    burst_data = b"".join(encode(scan_event()) for _ in range(burst))
+
+    def write() -> None:
+        for _ in range(count // burst):
+            os.write(master, burst_data)
+
+    writer = Thread(target=write, daemon=True)
+    with _count_syscalls() as counts:
+        writer.start()
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        reader(serial, count // burst * burst)
+        cpu = time.thread_time() - cpu_start
+        elapsed = time.perf_counter() - start
+    writer.join()
+
+    serial.close()
+    os.close(master)
+    os.close(slave)
+
+    events = count // burst * burst
+    return {
+        "events/s": events / elapsed,
+        "syscalls/event": (counts["read"] + counts["select"]) / events,
+        "CPU us/event": cpu * 1e6 / events,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the benchmark arguments."""
+    parser.add_argument("-n", "--events", type=int, default=20000)
+    parser.add_argument("-b", "--burst", type=int, default=10)
+
+
+def run(args: argparse.Namespace) -> None:
+    """Run the benchmark."""
+    print(f"{args.events} scan events in bursts of {args.burst}")
+    for name, reader in (
+        ("readline", _read_with_readline),
+        ("framer", _read_with_framer),
+    ):
+        result = _measure(reader, args.events, args.burst)
+        print(
+            f"{name:>10}: "
+            + ", ".join(f"{value:10.1f} {key}" for key, value in result.items())
+        )
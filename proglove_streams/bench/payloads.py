@@ -0,0 +1,99 @@
+"""Representative Streams API payloads used by the benchmarks."""
+import json
+import time
+import uuid
+from typing import Any, Dict
+
+
+def scan_event(device_serial: str = "M2MR111100928") -> Dict[str, Any]:
+    """Create a scan event."""
+    return {
+        "api_version": "1.0",
+        "event_type": "scan",
+        "event_id": str(uuid.uuid4()),
+        "time_created": int(time.time() * 1000),
+        "gateway_serial": "PGGW000000042",
+        "device_serial": device_serial,
+        "device_model": "MARK_2_MR",
+        "scan_code": "0123456789012\r",
+        "device_bluetooth_mac_address": "AA:BB:CC:DD:EE:FF",
+        "symbology": "EAN13",
+    }
+
+
+def button_pressed_event(device_serial: str = "M2MR111100928") -> Dict[str, Any]:
+    """Create a button pressed event."""
+    return {
+        "api_version": "1.0",
+        "event_type": "button_pressed",
+        "event_id": str(uuid.uuid4()),
+        "time_created": int(time.time() * 1000),
+        "gateway_serial": "PGGW000000042",
+        "device_serial": device_serial,
+        "trigger_gesture": "TRIGGER_DOUBLE_CLICK",
+    }
+
+
+def scanner_state_event(
+    device_serial: str = "M2MR111100928", connected: bool = True
+) -> Dict[str, Any]:
+    """Create a scanner state event."""
+    return {
+        "api_version": "1.0",
+        "event_type": "scanner_state",
+        "event_id": str(uuid.uuid4()),
+        "time_created": int(time.time() * 1000),
+        "gateway_serial": "PGGW000000042",
+        "device_serial": device_serial,
+        "device_connected_state": (
+            "STATE_CONNECTED" if connected else "STATE_DISCONNECTED"
+        ),
+    }
+
+
+def gateway_state_event(device_serial: str = "M2MR111100928") -> Dict[str, Any]:
+    """Create a Gateway state event."""
+    return {
+        "api_version": "1.0",
+        "event_type": "gateway_state",
+        "event_id": str(uuid.uuid4()),
+        "time_created": int(time.time() * 1000),
+        "gateway_serial": "PGGW000000042",
+        "gateway_app_version": "1.2.3",
+        "device_connected_list": [{"device_serial": device_serial}],
+    }
+
+
+def display_command(device_serial: str = "M2MR111100928") -> Dict[str, Any]:
+    """Create a display command."""
+    return {
+        "api_version": "1.0",
+        "event_type": "display!",
+        "event_id": str(uuid.uuid4()),
+        "time_created": int(time.time() * 1000),
+        "device_serial": device_serial,
+        "display_template_id": "PG3",
+        "display_refresh_type": "DEFAULT",
+        "display_fields": [
+            {
+                "display_field_id": 1,
+                "display_field_header": "Storage Unit",
+                "display_field_text": "R15",
+            },
+            {
+                "display_field_id": 2,
+                "display_field_header": "Item",
+                "display_field_text": "Engine 12",
+            },
+            {
+                "display_field_id": 3,
+                "display_field_header": "Quantity",
+                "display_field_text": "10",
+            },
+        ],
+    }
+
+
+def encode(event: Dict[str, Any]) -> bytes:
+    """Encode an event as sent over the serial port."""
+    return json.dumps(event).encode() + b"\n"
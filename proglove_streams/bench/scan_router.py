@@ -0,0 +1,98 @@
+"""Compare the ScanRouter with a linear list of routing rules."""
+import argparse
+import random
+import re
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from proglove_streams.scan_router import ScanCallback, ScanRouter
+
+# kind of rule, value compared with the scan code, callback
+Rule = Tuple[str, Any, ScanCallback]
+
+
+def _callback(_client: Any, _event: Any) -> None:
+    pass
+
+
+def _rules(exact: int, prefixes: int, patterns: int, rng: random.Random) -> List[Rule]:
+    rules: List[Rule] = []
+    for i in range(exact):
+        rules.append(("exact", f"LOC-{i:06d}", _callback))
+    for i in range(prefixes):
+        rules.append(("prefix", f"{rng.randrange(10**6):06d}-", _callback))
+    for i in range(patterns):
+        rules.append(("pattern", re.compile(f"P{i}[A-Z]{{2}}\\d{{4,8}}"), _callback))
+    return rules
+
+
+def _linear_route(rules: List[Rule], scan_code: str) -> Optional[ScanCallback]:
+    scan_code = scan_code.split("\r", 1)[0]
+    for kind, value, callback in rules:
+        if kind == "exact" and scan_code == value:
+            return callback
+        if kind == "prefix" and scan_code.startswith(value):
+            return callback
+        if kind == "pattern" and value.fullmatch(scan_code):
+            return callback
+    return None
+
+
+def _scan_codes(rules: List[Rule], count: int, rng: random.Random) -> List[str]:
+    codes = []
+    for _ in range(count):
+        kind, value, _ = rng.choice(rules)
+        if kind == "exact":
+            codes.append(value)
+        elif kind == "prefix":
+            codes.append(value + f"{rng.randrange(10**8):08d}")
+        else:
+            codes.append(
+                value.pattern.split("[", 1)[0] + f"XY{rng.randrange(10**6):06d}"
+            )
+    # scan codes matching no rule
+    codes.extend(f"UNKNOWN-{i}" for i in range(count // 10))
+    rng.shuffle(codes)
+    return codes
+
+
+def _measure(route: Callable[[str], Any], codes: List[str]) -> float:
+    start = time.perf_counter()
+    for code in codes:
+        route(code)
+    return len(codes) / (time.perf_counter() - start)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the benchmark arguments."""
+    parser.add_argument("-n", "--scans", type=int, default=20000)
+    parser.add_argument("--exact", type=int, default=2000)
+    parser.add_argument("--prefixes", type=int, default=2000)
+    parser.add_argument("--patterns", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def run(args: argparse.Namespace) -> None:
+    """Run the benchmark."""
+    rng = random.Random(args.seed)
+    rules = _rules(args.exact, args.prefixes, args.patterns, rng)
+    codes = _scan_codes(rules, args.scans, rng)
+
+    router = ScanRouter()
+    for kind, value, callback in rules:
+        getattr(router, kind)(value, callback)
+    router.route("")
+
+    # both dispatchers agree, the linear one picking the first rule
+    for code in codes[:1000]:
+        assert (router.route(code) is None) == (_linear_route(rules, code) is None)
+
+    print(
+        f"{len(codes)} scan codes, {args.exact} exact codes, "
+        f"{args.prefixes} prefixes, {args.patterns} patterns"
+    )
+    for name, route in (
+        ("linear", lambda code: _linear_route(rules, code)),
+        ("router", router.route),
+    ):
+        print(f"{name:>10}: {_measure(route, codes):12.1f} scans/s")
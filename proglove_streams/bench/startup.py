@@ -0,0 +1,108 @@
+"""Measure the startup time of many Gateways.
+
+Every Gateway services the slave side of its own pty, on which a backlog
+of events is waiting to be discarded by the start. The Gateways are
+started one after the other, then in parallel with :func:`start_gateways`.
+With ``--legacy``, the former flush reading the port ten times until the
+read timeout is measured as well.
+
+"""
+import argparse
+import os
+import pty
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from serial import serial_for_url
+
+from proglove_streams.bench.payloads import encode, scan_event
+from proglove_streams.gateway import Gateway, GatewayMessageHandler, start_gateways
+
+
+def _legacy_start(port: str) -> None:
+    serial = serial_for_url(port, 115200, timeout=0.1)
+    for _ in range(10):
+        _ = serial.readall()
+    serial.close()
+
+
+def _sequential_start(gateways: List[Gateway]) -> None:
+    for gateway in gateways:
+        gateway.start()
+
+
+def _parallel_start(gateways: List[Gateway]) -> None:
+    errors = start_gateways(gateways)
+    if errors:
+        raise RuntimeError(f"could not start: {errors}")
+
+
+def _measure(
+    ports: List[Tuple[int, int]],
+    backlog: bytes,
+    start: Callable[[List[Gateway]], None],
+) -> float:
+    for master, _ in ports:
+        os.write(master, backlog)
+
+    gateways = [
+        Gateway(GatewayMessageHandler(), os.ttyname(slave)) for _, slave in ports
+    ]
+    begin = time.perf_counter()
+    start(gateways)
+    elapsed = time.perf_counter() - begin
+
+    for gateway in gateways:
+        gateway.stop()
+    return elapsed
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the benchmark arguments."""
+    parser.add_argument("-p", "--ports", type=int, default=8)
+    parser.add_argument(
+        "--backlog", type=int, default=20, help="events waiting on each port"
+    )
+    parser.add_argument(
+        "--legacy", action="store_true", help="measure the former flush as well"
+    )
+    parser.add_argument(
+        "--max-ms", type=float, help="fail above this parallel startup time in ms"
+    )
+
+
+def run(args: argparse.Namespace) -> None:
+    """Run the benchmark."""
+    print(f"{args.ports} Gateways, {args.backlog} events waiting on each port")
+
+    ports = [pty.openpty() for _ in range(args.ports)]
+    backlog = b"".join(
+        encode(scan_event(f"M2MR{index:09d}")) for index in range(args.backlog)
+    )
+
+    results: Dict[str, float] = {}
+    try:
+        if args.legacy:
+            begin = time.perf_counter()
+            for master, slave in ports:
+                os.write(master, backlog)
+                _legacy_start(os.ttyname(slave))
+            results["legacy"] = time.perf_counter() - begin
+        results["sequential"] = _measure(ports, backlog, _sequential_start)
+        results["parallel"] = _measure(ports, backlog, _parallel_start)
+    finally:
+        for master, slave in ports:
+            os.close(master)
+            os.close(slave)
+
+    print(f"{'':>10}  {'total ms':>10}  {'ms/gateway':>10}")
+    for name, elapsed in results.items():
+        print(
+            f"{name:>10}  {elapsed * 1000:10.2f}  "
+            f"{elapsed * 1000 / args.ports:10.2f}"
+        )
+
+    if args.max_ms is not None and results["parallel"] * 1000 > args.max_ms:
+        print(f"parallel startup above {args.max_ms} ms")
+        sys.exit(1)
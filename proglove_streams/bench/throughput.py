@@ -0,0 +1,235 @@
+"""Measure the event throughput of a Gateway fed through a pty.
+
+Synthetic scan, button and state streams are written at a configurable
+rate to the master side of a pty while a :class:`Gateway` services the
+slave side. The time between writing an event and its callback being
+called is the end-to-end latency. The CPU time and the RSS are those of
+the whole process, the pty feeder included.
+
+"""
+import argparse
+import os
+import pty
+import resource
+import sys
+import time
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, List, Optional
+
+from proglove_streams.bench.payloads import (
+    button_pressed_event,
+    encode,
+    gateway_state_event,
+    scan_event,
+    scanner_state_event,
+)
+from proglove_streams.codec import get_codec
+from proglove_streams.gateway import Gateway, GatewayMessageHandler
+from proglove_streams.validation import VALIDATION_FULL, VALIDATION_MODES
+from proglove_streams.workers import WorkerDispatcher
+
+STREAMS: Dict[str, Callable[[str], Dict[str, Any]]] = {
+    "scan": scan_event,
+    "button": button_pressed_event,
+    "state": scanner_state_event,
+    "gateway_state": gateway_state_event,
+}
+
+
+class _Recorder:
+    """Record the latency of the events reaching the callbacks."""
+
+    def __init__(self, expected: int):
+        self.sent: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self.last_received = 0.0
+        self.done = Event()
+        self._expected = expected
+        self._lock = Lock()
+
+    def on_event(self, _client: Any, event: Any) -> None:
+        now = time.perf_counter()
+        sent = self.sent.pop(event.event_id, None)
+        with self._lock:
+            if sent is not None:
+                self.latencies.append(now - sent)
+            self.last_received = now
+            if len(self.latencies) >= self._expected:
+                self.done.set()
+
+
+def _parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in STREAMS:
+            raise argparse.ArgumentTypeError(f"unknown stream: {name}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def _events(count: int, mix: Dict[str, int], devices: int) -> List[Dict[str, Any]]:
+    cycle = [name for name, weight in mix.items() for _ in range(weight)]
+    return [
+        STREAMS[cycle[index % len(cycle)]](f"M2MR{index % devices:09d}")
+        for index in range(count)
+    ]
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _feed(
+    master: int,
+    events: List[Dict[str, Any]],
+    recorder: _Recorder,
+    rate: float,
+    burst: int,
+) -> float:
+    """Write the events in bursts, at the requested rate if any.
+
+    Returns:
+        The time the first burst was written.
+
+    """
+    bursts = [
+        (
+            [event["event_id"] for event in events[index : index + burst]],
+            b"".join(encode(event) for event in events[index : index + burst]),
+        )
+        for index in range(0, len(events), burst)
+    ]
+
+    start = time.perf_counter()
+    for index, (event_ids, data) in enumerate(bursts):
+        if rate:
+            delay = start + index * burst / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        now = time.perf_counter()
+        for event_id in event_ids:
+            recorder.sent[event_id] = now
+
+        view = memoryview(data)
+        while view:
+            view = view[os.write(master, view) :]
+    return start
+
+
+def _measure(args: argparse.Namespace) -> Dict[str, float]:
+    events = _events(args.events, args.mix, args.devices)
+    recorder = _Recorder(len(events))
+
+    handler = GatewayMessageHandler(
+        on_scan=recorder.on_event,
+        on_button_pressed=recorder.on_event,
+        on_scanner_connected=recorder.on_event,
+        on_scanner_disconnected=recorder.on_event,
+        on_gateway_state_event=recorder.on_event,
+        validation=args.validation,
+    )
+    dispatcher: Optional[WorkerDispatcher] = (
+        WorkerDispatcher(args.workers) if args.workers else None
+    )
+
+    master, slave = pty.openpty()
+    gateway = Gateway(
+        handler,
+        os.ttyname(slave),
+        codec=get_codec(args.codec),
+        dispatcher=dispatcher,
+    )
+    gateway.start(flush_input=False)
+
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    result: List[float] = []
+    feeder = Thread(
+        target=lambda: result.append(
+            _feed(master, events, recorder, args.rate, args.burst)
+        ),
+        daemon=True,
+    )
+    feeder.start()
+    completed = recorder.done.wait(args.timeout)
+    feeder.join()
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+
+    gateway.stop()
+    os.close(master)
+    os.close(slave)
+
+    received = len(recorder.latencies)
+    elapsed = max(recorder.last_received - result[0], 1e-9) if received else 0.0
+    cpu = (usage_end.ru_utime - usage_start.ru_utime) + (
+        usage_end.ru_stime - usage_start.ru_stime
+    )
+    latencies = sorted(recorder.latencies)
+
+    if not completed:
+        print(f"timeout: {received} of {len(events)} events received")
+
+    return {
+        "events/s": received / elapsed if elapsed else 0.0,
+        "p50 ms": _percentile(latencies, 50) * 1000,
+        "p99 ms": _percentile(latencies, 99) * 1000,
+        "CPU %": cpu * 100 / elapsed if elapsed else 0.0,
+        "CPU us/event": cpu * 1e6 / received if received else 0.0,
+        # kilobytes on Linux
+        "max RSS MiB": usage_end.ru_maxrss / 1024,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the benchmark arguments."""
+    parser.add_argument("-n", "--events", type=int, default=20000)
+    parser.add_argument(
+        "-r", "--rate", type=float, default=0, help="events/s, 0 for no limit"
+    )
+    parser.add_argument("-b", "--burst", type=int, default=1)
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default="scan=8,button=1,state=1",
+        help="weighted streams, among " + ", ".join(STREAMS),
+    )
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--codec", choices=("orjson", "msgspec", "ujson", "json"))
+    parser.add_argument(
+        "--validation", choices=VALIDATION_MODES, default=VALIDATION_FULL
+    )
+    parser.add_argument(
+        "--workers", type=int, default=0, help="worker threads, 0 for none"
+    )
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument(
+        "--min-rate", type=float, help="fail below this number of events/s"
+    )
+    parser.add_argument(
+        "--max-p99", type=float, help="fail above this p99 latency in ms"
+    )
+
+
+def run(args: argparse.Namespace) -> None:
+    """Run the benchmark."""
+    mix = ", ".join(f"{name}={weight}" for name, weight in args.mix.items())
+    print(
+        f"{args.events} events ({mix}) from {args.devices} devices, "
+        f"rate {args.rate or 'unlimited'}, bursts of {args.burst}, "
+        f"{args.validation} validation, {args.workers} workers"
+    )
+    result = _measure(args)
+    print("\n".join(f"{key:>13}: {value:10.2f}" for key, value in result.items()))
+
+    failed = False
+    if args.min_rate is not None and result["events/s"] < args.min_rate:
+        print(f"events/s below {args.min_rate}")
+        failed = True
+    if args.max_p99 is not None and not result["p99 ms"] <= args.max_p99:
+        print(f"p99 latency above {args.max_p99} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,31 @@
+"""Compare the event rate of the handler validation modes."""
+import argparse
+import time
+from typing import Any
+
+from proglove_streams.bench.payloads import scan_event
+from proglove_streams.gateway import GatewayMessageHandler
+from proglove_streams.validation import VALIDATION_MODES
+
+
+def _on_scan(_client: Any, event: Any) -> None:
+    _ = event.device_serial, event.scan_code
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the benchmark arguments."""
+    parser.add_argument("-n", "--events", type=int, default=50000)
+
+
+def run(args: argparse.Namespace) -> None:
+    """Run the benchmark."""
+    events = [scan_event(f"M2MR{index:09d}") for index in range(args.events)]
+
+    print(f"{args.events} scan events, on_scan reading two fields")
+    for validation in VALIDATION_MODES:
+        handler = GatewayMessageHandler(on_scan=_on_scan, validation=validation)
+        start = time.perf_counter()
+        for event in events:
+            handler.handle(None, event)
+        elapsed = time.perf_counter() - start
+        print(f"{validation:>5}: {args.events / elapsed:10.0f} events/s")
@@ -0,0 +1,480 @@
+"""Capture of the lines received from a Gateway, and their replay.
+
+A Gateway created with a :class:`CaptureRecorder` appends every line read
+from the serial port, with the time it was read, to a capture file. The
+capture is replayed offline with :func:`replay`, at the recorded pace, a
+multiple of it, or as fast as the handler goes.
+
+A capture file is a sequence of:
+
+- session headers, ``PGSCAP1\\n`` followed by the wall-clock time the
+  recording started, in nanoseconds since the epoch, as a little-endian
+  signed 64-bit integer,
+- records, the time the line was read, in nanoseconds since the start of
+  the session, as a little-endian unsigned 64-bit integer, the length of
+  the line as a little-endian unsigned 32-bit integer, then the line
+  without its newline.
+
+Every file starts with a session header, a recorder appending to an
+existing file writing a new one. The files ending with ``.gz`` are
+compressed with gzip.
+
+"""
+import gzip
+import io
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import Future
+from dataclasses import dataclass
+from threading import Lock
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from proglove_streams.codec import Codec, get_codec
+from proglove_streams.exception import ProgloveStreamsException
+from proglove_streams.handler import Handler
+
+if TYPE_CHECKING:  # pragma: no cover
+    from proglove_streams.commands import CommandBatch
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PGSCAP1\n"
+_HEADER = struct.Struct("<q")
+_RECORD = struct.Struct("<QI")
+# size of the chunks of the compressed files decompressed at once
+_CHUNK_SIZE = 1 << 20
+
+
+def rotated_path(path: str, index: int) -> str:
+    """Get the path of a capture file rotated ``index`` times.
+
+    The index is inserted before the extensions: ``shift.pgcap.gz`` is
+    followed by ``shift.1.pgcap.gz``, ``shift.2.pgcap.gz``...
+
+    """
+    if index == 0:
+        return path
+    directory, name = os.path.split(path)
+    stem, dot, extensions = name.partition(".")
+    return os.path.join(directory, f"{stem}.{index}{dot}{extensions}")
+
+
+def capture_files(path: str) -> List[str]:
+    """List a capture file and its rotated files, in recording order."""
+    paths: List[str] = []
+    while os.path.exists(rotated_path(path, len(paths))):
+        paths.append(rotated_path(path, len(paths)))
+    return paths
+
+
+class CaptureRecorder:
+    """Append the received lines to a capture file.
+
+    Arguments:
+        path: The path of the capture file, compressed with gzip when
+            ending with ``.gz``.
+        max_bytes: Continue in a new file, named by :func:`rotated_path`,
+            once this number of bytes is recorded in the file. The
+            uncompressed size is used for the compressed files. By default
+            the file grows indefinitely.
+
+    Attributes:
+        lines: The number of lines recorded.
+        errors: The number of failures to write the file. The recording
+            stops at the first one, the Gateway going on without it.
+
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None):
+        """Initialize the class."""
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("the maximum capture file size must be positive")
+
+        self._path = path
+        self._max_bytes = max_bytes
+        self._lock = Lock()
+        self._start = time.monotonic_ns()
+        self._header = MAGIC + _HEADER.pack(time.time_ns())
+        self._file: Optional[io.BufferedIOBase] = None
+        self._index = 0
+        self._size = 0
+        self.lines = 0
+        self.errors = 0
+
+        if max_bytes is not None:
+            # continue after the files rotated by a previous recording
+            self._index = max(len(capture_files(path)) - 1, 0)
+        self._open()
+
+    @property
+    def path(self) -> str:
+        """Get the path of the file being recorded."""
+        return rotated_path(self._path, self._index)
+
+    @property
+    def is_recording(self) -> bool:
+        """Tell whether the lines are recorded, until closed or failed."""
+        return self._file is not None
+
+    def record(self, lines: Iterable[bytes]) -> None:
+        """Append lines read at once from the Gateway.
+
+        The errors are logged and stop the recording, they are not raised.
+
+        """
+        timestamp = time.monotonic_ns() - self._start
+        data = bytearray()
+        count = 0
+        for line in lines:
+            data += _RECORD.pack(timestamp, len(line))
+            data += line
+            count += 1
+        if not data:
+            return
+
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(data)
+                self._size += len(data)
+                self.lines += count
+                if self._max_bytes is not None and self._size >= self._max_bytes:
+                    self._file.close()
+                    self._file = None
+                    self._index += 1
+                    self._open()
+            except (OSError, ProgloveStreamsException) as e:
+                self._fail(e)
+
+    def flush(self) -> None:
+        """Write the buffered records to the file."""
+        with self._lock:
+            if self._file is not None:
+                try:
+                    self._file.flush()
+                except OSError as e:
+                    self._fail(e)
+
+    def close(self) -> None:
+        """Close the capture file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self) -> None:
+        path = self.path
+        file: io.BufferedIOBase
+        try:
+            # pylint: disable=consider-using-with
+            if path.endswith(".gz"):
+                file = gzip.open(path, "ab")
+            else:
+                file = open(path, "ab")
+        except OSError as e:
+            raise ProgloveStreamsException(f"could not open {path}: {e}") from e
+
+        logger.debug("record the received lines in %s", path)
+        file.write(self._header)
+        self._file = file
+        self._size = len(self._header)
+
+    def _fail(self, error: Exception) -> None:
+        """Stop recording after a write failure, called with the lock held."""
+        logger.error("stop recording in %s: %s", self.path, error)
+        self.errors += 1
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def __enter__(self) -> "CaptureRecorder":
+        """Use context manager."""
+        return self
+
+    def __exit__(self, _exc_type: Any, _exc_val: Any, _exc_tb: Any) -> None:
+        """Close context manager."""
+        self.close()
+
+
+def _records(
+    data: Union[bytes, mmap.mmap], path: str
+) -> Iterator[Tuple[int, int, bytes]]:
+    """Iterate over the session start, time and line of the records."""
+    if data[: len(MAGIC)] != MAGIC:
+        raise ProgloveStreamsException(f"{path} is not a capture file")
+
+    session = 0
+    offset = 0
+    size = len(data)
+    while offset < size:
+        if data[offset : offset + len(MAGIC)] == MAGIC:
+            if offset + len(MAGIC) + _HEADER.size > size:
+                break
+            offset += len(MAGIC)
+            (session,) = _HEADER.unpack_from(data, offset)
+            offset += _HEADER.size
+            continue
+
+        if offset + _RECORD.size > size:
+            break
+        timestamp, length = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        if start + length > size:
+            break
+        yield session, timestamp, data[start : start + length]
+        offset = start + length
+
+    if offset < size:
+        logger.warning("%s: truncated record at offset %u", path, offset)
+
+
+def _decompress(file: BinaryIO, path: str) -> bytes:
+    """Decompress a gzip capture file, up to where it is truncated.
+
+    A file not closed by its recorder ends with a gzip member without
+    trailer, the lines flushed to it are still returned.
+
+    """
+    chunks = []
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    started = False
+    while True:
+        data = file.read(_CHUNK_SIZE)
+        if not data:
+            break
+        while data:
+            try:
+                chunks.append(decompressor.decompress(data))
+            except zlib.error as e:
+                raise ProgloveStreamsException(f"could not read {path}: {e}") from e
+            started = True
+            if not decompressor.eof:
+                break
+            # the next member, written by a recorder appending to the file
+            data = decompressor.unused_data
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            started = False
+
+    if started:
+        chunks.append(decompressor.flush())
+        logger.warning("%s: truncated gzip stream, the file was not closed", path)
+    return b"".join(chunks)
+
+
+def read_capture(paths: Union[str, Sequence[str]]) -> Iterator[Tuple[int, bytes]]:
+    """Iterate over the lines of capture files.
+
+    The uncompressed files are memory-mapped, the compressed ones read in
+    memory. The records of a truncated file are read up to the truncation.
+
+    Arguments:
+        paths: The capture file, or the files in recording order.
+
+    Returns:
+        The time each line was read, in nanoseconds since the first line,
+        and the line. The time does not advance between the sessions.
+
+    Raises:
+        ProgloveStreamsException: If a file cannot be read.
+
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+
+    session = None
+    base = first = last = 0
+    for path in paths:
+        try:
+            with open(path, "rb") as file:
+                if path.endswith(".gz"):
+                    data: Union[bytes, mmap.mmap] = _decompress(file, path)
+                elif os.fstat(file.fileno()).st_size == 0:
+                    data = b""
+                else:
+                    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, EOFError) as e:
+            raise ProgloveStreamsException(f"could not read {path}: {e}") from e
+
+        try:
+            for record_session, timestamp, line in _records(data, path):
+                if record_session != session:
+                    # a new recording continues where the previous stopped
+                    if session is None:
+                        first = timestamp
+                    else:
+                        base = last - timestamp
+                    session = record_session
+                last = base + timestamp
+                yield last - first, line
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+
+class ReplayClient:
+    """Client the replayed events are handled with.
+
+    The commands sent by the callbacks are not sent to a Gateway but
+    recorded in :attr:`commands`; their futures are resolved at once.
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize the class."""
+        self.commands: List[Dict[str, Any]] = []
+
+    def get_gateway_state(self) -> "Future[Any]":
+        """Fail the Gateway state command, no Gateway is replayed."""
+        future: "Future[Any]" = Future()
+        future.set_exception(
+            ProgloveStreamsException("no Gateway state while replaying")
+        )
+        return future
+
+    def send_feedback(
+        self, device_serial: str, feedback_action_id: str
+    ) -> "Future[None]":
+        """Record a feedback command."""
+        # pylint: disable=import-outside-toplevel
+        from proglove_streams.commands import feedback_command
+
+        return self._record(feedback_command(device_serial, feedback_action_id))
+
+    def set_display(self, *args: Any, **kwargs: Any) -> "Future[None]":
+        """Record a display command, see :meth:`Gateway.set_display`."""
+        # pylint: disable=import-outside-toplevel
+        from proglove_streams.commands import display_command
+
+        return self._record(display_command(*args, **kwargs))
+
+    def set_trigger_block(self, *args: Any, **kwargs: Any) -> "Future[None]":
+        """Record a trigger block command, see :meth:`Gateway.set_trigger_block`."""
+        # pylint: disable=import-outside-toplevel
+        from proglove_streams.commands import trigger_block_command
+
+        return self._record(trigger_block_command(*args, **kwargs))
+
+    def new_batch(self) -> "CommandBatch":
+        """Create a batch of commands to send with :meth:`send_batch`."""
+        # pylint: disable=import-outside-toplevel
+        from proglove_streams.commands import CommandBatch
+
+        return CommandBatch()
+
+    def send_batch(
+        self, commands: Union["CommandBatch", Iterable[Dict[str, Any]]]
+    ) -> List[str]:
+        """Record many commands, see :meth:`Gateway.send_batch`."""
+        # pylint: disable=import-outside-toplevel
+        from proglove_streams.commands import CommandBatch
+
+        if isinstance(commands, CommandBatch):
+            codec = get_codec()
+            commands = [codec.decode(line) for line in commands.encode().splitlines()]
+        else:
+            commands = list(commands)
+        self.commands.extend(commands)
+        return [command["event_id"] for command in commands]
+
+    def _record(self, command: Dict[str, Any]) -> "Future[None]":
+        self.commands.append(command)
+        future: "Future[None]" = Future()
+        future.set_result(None)
+        return future
+
+
+@dataclass
+class ReplayStats:
+    """Counters of a replay.
+
+    Attributes:
+        events: The number of events handled.
+        malformed_lines: The number of lines which are not valid JSON.
+        capture_seconds: The time spanned by the replayed lines.
+        seconds: The time the replay took.
+
+    """
+
+    events: int = 0
+    malformed_lines: int = 0
+    capture_seconds: float = 0.0
+    seconds: float = 0.0
+
+
+def replay(
+    paths: Union[str, Sequence[str]],
+    handler: Handler,
+    speed: Optional[float] = 1.0,
+    client: Any = None,
+    codec: Optional[Codec] = None,
+) -> ReplayStats:
+    """Hand the lines of capture files over to a handler.
+
+    Arguments:
+        paths: The capture file, or the files in recording order, see
+            :func:`capture_files`.
+        handler: The handler of the replayed events, such as a
+            :class:`GatewayMessageHandler`.
+        speed: The replay speed, 2 replaying twice faster than recorded.
+            ``None`` replays the lines as fast as they are handled.
+        client: The client the handler is called with, by default a
+            :class:`ReplayClient`.
+        codec: The JSON codec, by default the fastest one installed.
+
+    Returns:
+        The replay counters.
+
+    Raises:
+        ProgloveStreamsException: If a file cannot be read.
+
+    """
+    if speed is not None and speed <= 0:
+        raise ValueError("the replay speed must be positive")
+
+    codec = codec or get_codec()
+    client = client if client is not None else ReplayClient()
+    decode = codec.decode
+    decode_errors = codec.decode_errors
+    stats = ReplayStats()
+    timestamp = 0
+
+    start = time.monotonic()
+    for timestamp, line in read_capture(paths):
+        if speed is not None:
+            delay = timestamp / 1e9 / speed - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        try:
+            event = decode(line)
+        except decode_errors:
+            stats.malformed_lines += 1
+            continue
+
+        handler.handle(client, event)
+        stats.events += 1
+
+    stats.capture_seconds = timestamp / 1e9
+    stats.seconds = time.monotonic() - start
+    logger.info("replayed %s", stats)
+    return stats
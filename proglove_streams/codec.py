@@ -0,0 +1,118 @@
+"""JSON codec module.
+
+The Gateways decode every received line and encode every command sent. The
+fastest JSON library installed is used for that: ``orjson``, ``msgspec`` or
+``ujson``, falling back to the standard library ``json`` module. All the
+codecs decode from and encode to ``bytes`` directly.
+
+"""
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from proglove_streams.exception import ProgloveStreamsException
+
+
+@dataclass(frozen=True)
+class Codec:
+    """JSON codec.
+
+    Attributes:
+        name: The name of the JSON library.
+        decode: Decode a JSON document from bytes.
+        encode: Encode an object to JSON bytes.
+        decode_errors: The exceptions raised on malformed JSON.
+
+    """
+
+    name: str
+    decode: Callable[[bytes], Any]
+    encode: Callable[[Any], bytes]
+    decode_errors: Tuple[Type[Exception], ...]
+
+
+def _orjson() -> Codec:
+    import orjson  # pylint: disable=import-outside-toplevel
+
+    return Codec("orjson", orjson.loads, orjson.dumps, (orjson.JSONDecodeError,))
+
+
+def _msgspec() -> Codec:
+    import msgspec  # pylint: disable=import-outside-toplevel
+
+    return Codec(
+        "msgspec",
+        msgspec.json.decode,
+        msgspec.json.encode,
+        (msgspec.DecodeError,),
+    )
+
+
+def _ujson() -> Codec:
+    import ujson  # pylint: disable=import-outside-toplevel
+
+    def encode(obj: Any) -> bytes:
+        return ujson.dumps(obj, escape_forward_slashes=False).encode()
+
+    return Codec("ujson", ujson.loads, encode, (ValueError,))
+
+
+def _json() -> Codec:
+    def encode(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+    return Codec("json", json.loads, encode, (json.JSONDecodeError,))
+
+
+CODECS: Dict[str, Callable[[], Codec]] = {
+    "orjson": _orjson,
+    "msgspec": _msgspec,
+    "ujson": _ujson,
+    "json": _json,
+}
+
+_default_codec: Optional[Codec] = None
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """Get a JSON codec.
+
+    Arguments:
+        name: The name of the JSON library to use, by default the fastest
+            one installed.
+
+    Raises:
+        ProgloveStreamsException: if the requested library is not available.
+
+    """
+    global _default_codec  # pylint: disable=global-statement
+
+    if name is not None:
+        if name not in CODECS:
+            raise ProgloveStreamsException(f"unknown JSON codec: {name}")
+        try:
+            return CODECS[name]()
+        except ImportError as e:
+            raise ProgloveStreamsException(f"JSON codec {name} not installed") from e
+
+    if _default_codec is None:
+        for factory in CODECS.values():
+            try:
+                _default_codec = factory()
+                break
+            except ImportError:
+                continue
+
+    # the standard library codec is always available
+    return _default_codec or _json()
+
+
+def available_codecs() -> Dict[str, Codec]:
+    """Get all the installed JSON codecs."""
+    codecs = {}
+    for name, factory in CODECS.items():
+        try:
+            codecs[name] = factory()
+        except ImportError:
+            continue
+    return codecs
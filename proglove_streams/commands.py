@@ -0,0 +1,400 @@
+"""Commands module.
+
+The functions build the Streams API commands, and a :class:`CommandBatch`
+prepares many commands to be written at once. The :class:`CommandTracker`
+does the bookkeeping shared by the :class:`~proglove_streams.gateway.Gateway`
+and the :class:`~proglove_streams.async_gateway.AsyncGateway` around the
+commands they send: logging and counting them, registering them until their
+reply, and not sending the displays already shown.
+
+"""
+import logging
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from proglove_streams.codec import Codec, get_codec
+from proglove_streams.devices import DeviceRegistry
+from proglove_streams.display_cache import DisplayCache
+from proglove_streams.logging import log_sampled
+from proglove_streams.metrics import Metrics
+from proglove_streams.pending import PendingRequests
+
+logger = logging.getLogger(__name__)
+
+
+def new_command(event_type: str, **fields: Any) -> Dict[str, Any]:
+    """Create a Streams API command with a fresh event ID and timestamp."""
+    command: Dict[str, Any] = {
+        "api_version": "1.0",
+        "event_type": event_type,
+        "event_id": str(uuid.uuid4()),
+        "time_created": int(time.time() * 1000),
+    }
+    command.update(fields)
+    return command
+
+
+def feedback_command(device_serial: str, feedback_action_id: str) -> Dict[str, Any]:
+    """Create a feedback command."""
+    return new_command(
+        "feedback!",
+        device_serial=device_serial,
+        feedback_action_id=feedback_action_id,
+    )
+
+
+# pylint: disable=too-many-arguments
+def display_command(
+    device_serial: str,
+    display_template_id: str,
+    display_fields: List[Dict[str, Union[int, str]]],
+    display_refresh_type: str = "DEFAULT",
+    time_validity_duration: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Create a display command."""
+    command = new_command(
+        "display!",
+        device_serial=device_serial,
+        display_template_id=display_template_id,
+        display_refresh_type=display_refresh_type,
+        display_fields=display_fields,
+    )
+
+    if time_validity_duration is not None:
+        command["time_validity_duration"] = time_validity_duration
+
+    return command
+
+
+# pylint: disable=too-many-arguments
+def trigger_block_command(
+    device_serial: str,
+    trigger_block_state: bool,
+    trigger_block_gesture_list: List[str],
+    trigger_unblock_gesture_list: List[str],
+    time_validity_duration: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Create a trigger block command."""
+    command = new_command(
+        "trigger_block!",
+        device_serial=device_serial,
+        trigger_block_gesture_list=trigger_block_gesture_list,
+        trigger_unblock_gesture_list=trigger_unblock_gesture_list,
+        trigger_block_state=trigger_block_state,
+    )
+
+    if time_validity_duration is not None:
+        command["time_validity_duration"] = time_validity_duration
+
+    return command
+
+
+class CommandBatch:
+    """Commands prepared to be sent at once with :meth:`Gateway.send_batch`.
+
+    The methods prepare the same command for many devices: the fields common
+    to all the devices are serialized only once and the resulting lines
+    share the creation time of the batch.
+
+    Arguments:
+        codec: The JSON codec, by default the fastest one installed.
+
+    """
+
+    def __init__(self, codec: Optional[Codec] = None):
+        """Initialize the class."""
+        self._codec = codec or get_codec()
+        self._time_created = int(time.time() * 1000)
+        self._lines: List[bytes] = []
+        self._event_ids: List[str] = []
+        self._displays: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        """Get the number of commands of the batch."""
+        return len(self._lines)
+
+    @property
+    def event_ids(self) -> List[str]:
+        """Get the event IDs of the commands of the batch."""
+        return list(self._event_ids)
+
+    @property
+    def displays(self) -> List[Dict[str, Any]]:
+        """Get the display commands of the batch."""
+        return list(self._displays)
+
+    def add(self, command: Dict[str, Any]) -> str:
+        """Add a command built with one of the ``*_command`` functions.
+
+        Returns:
+            The event ID of the command.
+
+        """
+        self._lines.append(self._codec.encode(command))
+        self._event_ids.append(command["event_id"])
+        if command.get("event_type") == "display!":
+            self._displays.append(command)
+        return str(command["event_id"])
+
+    def send_feedback(
+        self, device_serials: Iterable[str], feedback_action_id: str
+    ) -> List[str]:
+        """Add a feedback command for each device.
+
+        Returns:
+            The event IDs of the commands.
+
+        """
+        return self._add_for_devices(
+            "feedback!", device_serials, {"feedback_action_id": feedback_action_id}
+        )
+
+    # pylint: disable=too-many-arguments
+    def set_display(
+        self,
+        device_serials: Iterable[str],
+        display_template_id: str,
+        display_fields: List[Dict[str, Union[int, str]]],
+        display_refresh_type: str = "DEFAULT",
+        time_validity_duration: Optional[int] = None,
+    ) -> List[str]:
+        """Add a display command for each device.
+
+        Returns:
+            The event IDs of the commands.
+
+        """
+        fields: Dict[str, Any] = {
+            "display_template_id": display_template_id,
+            "display_refresh_type": display_refresh_type,
+            "display_fields": display_fields,
+        }
+        if time_validity_duration is not None:
+            fields["time_validity_duration"] = time_validity_duration
+
+        return self._add_for_devices("display!", device_serials, fields)
+
+    # pylint: disable=too-many-arguments
+    def set_trigger_block(
+        self,
+        device_serials: Iterable[str],
+        trigger_block_state: bool,
+        trigger_block_gesture_list: List[str],
+        trigger_unblock_gesture_list: List[str],
+        time_validity_duration: Optional[int] = None,
+    ) -> List[str]:
+        """Add a trigger block command for each device.
+
+        Returns:
+            The event IDs of the commands.
+
+        """
+        fields: Dict[str, Any] = {
+            "trigger_block_gesture_list": trigger_block_gesture_list,
+            "trigger_unblock_gesture_list": trigger_unblock_gesture_list,
+            "trigger_block_state": trigger_block_state,
+        }
+        if time_validity_duration is not None:
+            fields["time_validity_duration"] = time_validity_duration
+
+        return self._add_for_devices("trigger_block!", device_serials, fields)
+
+    def encode(self) -> bytes:
+        """Serialize the batch, one command per line."""
+        if not self._lines:
+            return b""
+        return b"\n".join(self._lines) + b"\n"
+
+    def _add_for_devices(
+        self, event_type: str, device_serials: Iterable[str], fields: Dict[str, Any]
+    ) -> List[str]:
+        encode = self._codec.encode
+
+        # fragments shared by all the lines, in the key order of new_command
+        head = encode({"api_version": "1.0", "event_type": event_type})[:-1]
+        head += b',"event_id":"'
+        middle = b'","time_created":%d,"device_serial":' % self._time_created
+        tail = encode(fields)[1:]
+        if tail != b"}":
+            tail = b"," + tail
+
+        event_ids = []
+        for device_serial in device_serials:
+            event_id = str(uuid.uuid4())
+            self._lines.append(
+                head + event_id.encode() + middle + encode(device_serial) + tail
+            )
+            event_ids.append(event_id)
+            if event_type == "display!":
+                # recorded as the last display of the device once sent
+                self._displays.append(
+                    {
+                        "api_version": "1.0",
+                        "event_type": event_type,
+                        "event_id": event_id,
+                        "time_created": self._time_created,
+                        "device_serial": device_serial,
+                        **fields,
+                    }
+                )
+
+        self._event_ids.extend(event_ids)
+        return event_ids
+
+
+class CommandTracker:
+    """Bookkeeping of the commands sent by a Gateway.
+
+    Arguments:
+        codec: The JSON codec the commands are encoded with.
+        pending: The commands waiting for their reply.
+        devices: The state of the devices, the displays sent are recorded in.
+        display_cache: Do not send the displays this cache tells are shown.
+        metrics: The registry counting the commands sent, if any.
+
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        codec: Codec,
+        pending: PendingRequests,
+        devices: DeviceRegistry,
+        display_cache: Optional[DisplayCache] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        """Initialize the class."""
+        self._codec = codec
+        self._pending = pending
+        self._devices = devices
+        self._display_cache = display_cache
+        self._metrics = metrics
+
+    def prepare(self, command: Dict[str, Any]) -> bool:
+        """Log and count a command about to be sent.
+
+        Returns:
+            False if the command is a display already shown, not to be sent.
+
+        """
+        event_type = command["event_type"]
+        cache = self._display_cache
+        if event_type == "display!" and cache is not None and cache.is_shown(command):
+            log_sampled(
+                logger, logging.DEBUG, None, "display already shown", event=command
+            )
+            if self._metrics is not None:
+                self._metrics.counter("displays_suppressed").inc()
+            return False
+
+        log_sampled(
+            logger,
+            logging.INFO,
+            event_type,
+            "send a %s command",
+            event_type,
+            event=command,
+        )
+        log_sampled(
+            logger, logging.DEBUG, event_type, "send command %s", command, event=command
+        )
+
+        if self._metrics is not None:
+            self._metrics.counter("commands_sent", event_type=event_type).inc()
+        return True
+
+    def register(
+        self, command: Dict[str, Any], future: Any, data: Optional[bytes] = None
+    ) -> None:
+        """Register a command until its reply, before writing it.
+
+        Arguments:
+            command: The command.
+            future: The future resolved by the reply.
+            data: The encoded command, to send it again after a reconnection.
+
+        """
+        event_type = command["event_type"]
+        self._pending.add(
+            command["event_id"],
+            event_type,
+            future,
+            event_type != "gateway_state!",
+            data=data,
+            device_serial=command.get("device_serial"),
+        )
+
+    def delivered(self, command: Dict[str, Any]) -> None:
+        """Record a registered command written, not to send it again."""
+        self._pending.delivered(command["event_id"])
+
+    def discard(self, command: Dict[str, Any]) -> None:
+        """Unregister a command which could not be written."""
+        self._pending.discard(command["event_id"])
+
+    def sent(self, command: Dict[str, Any]) -> None:
+        """Record a command written to the Gateway."""
+        if command["event_type"] != "display!":
+            return
+        self._devices.record_display(command)
+        if self._display_cache is not None:
+            self._display_cache.store(command)
+
+    def sent_batch(self, commands: CommandBatch) -> None:
+        """Record a batch of commands written to the Gateway."""
+        for command in commands.displays:
+            self.sent(command)
+
+    def received(self, event: Any) -> None:
+        """Forget the displays a raw received event may have changed.
+
+        Called before the event is correlated with the pending commands: the
+        device of an ``errors`` event is the one of the command it refers to.
+
+        """
+        cache = self._display_cache
+        if cache is None:
+            return
+
+        cache.update(event)
+        if not isinstance(event, dict) or event.get("event_type") != "errors":
+            return
+        event_reference_id = event.get("event_reference_id")
+        if isinstance(event_reference_id, str):
+            device_serial = self._pending.device_serial(event_reference_id)
+            if device_serial is not None:
+                cache.invalidate(device_serial)
+
+    def reset(self) -> None:
+        """Forget the displays, the devices may have been reset since sent."""
+        if self._display_cache is not None:
+            self._display_cache.invalidate()
+
+    def batch(
+        self, commands: Union[CommandBatch, Iterable[Dict[str, Any]]]
+    ) -> CommandBatch:
+        """Log and count a batch of commands about to be sent.
+
+        Arguments:
+            commands: A batch, or commands built with the ``*_command``
+                functions.
+
+        Returns:
+            The batch of the commands.
+
+        """
+        if not isinstance(commands, CommandBatch):
+            batch = CommandBatch(self._codec)
+            for command in commands:
+                batch.add(command)
+            commands = batch
+
+        log_sampled(
+            logger, logging.INFO, "batch", "send a batch of %u commands", len(commands)
+        )
+        if self._metrics is not None and commands:
+            self._metrics.counter("commands_sent", event_type="batch").inc(
+                len(commands)
+            )
+        return commands
@@ -0,0 +1,86 @@
+"""De-duplication of the scans repeated by a device.
+
+A handler created with a :class:`ScanDeduplicator` drops a ``scan`` event
+when the same device scanned the same code less than ``window`` seconds
+before, as happens when an operator double-triggers. A repeated scan does
+not extend the window: a code scanned continuously is handled once per
+window.
+
+The last scans are kept in a time-ordered dictionary bounded to
+``max_entries``, the expired ones being removed as new scans arrive, so
+the memory stays flat whatever the number of devices and the duration of
+the shift.
+
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Tuple
+
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class ScanDeduplicator:
+    """Last scans of the devices within a time window.
+
+    Arguments:
+        window: The time, in seconds, a scan of a device drops the same
+            scan code from the same device.
+        max_entries: The number of scans remembered, the oldest being
+            forgotten first.
+
+    Attributes:
+        suppressed: The number of scans dropped.
+
+    """
+
+    def __init__(self, window: float, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """Initialize the class."""
+        if window <= 0:
+            raise ValueError("the de-duplication window must be positive")
+        if max_entries <= 0:
+            raise ValueError("the number of scans remembered must be positive")
+
+        self._window = window
+        self._max_entries = max_entries
+        # expiry of the last scans, in expiry order
+        self._scans: "OrderedDict[Tuple[Any, Any], float]" = OrderedDict()
+        self._lock = Lock()
+        self.suppressed = 0
+
+    def __len__(self) -> int:
+        """Get the number of scans remembered."""
+        return len(self._scans)
+
+    def is_duplicate(self, event: Any) -> bool:
+        """Tell whether a raw scan event repeats a scan within the window.
+
+        The scan is remembered otherwise, and counted as suppressed if it
+        is a duplicate.
+
+        """
+        if not isinstance(event, dict):
+            return False
+        key = (event.get("device_serial"), event.get("scan_code"))
+        now = time.monotonic()
+
+        with self._lock:
+            scans = self._scans
+            expiry = scans.get(key)
+            if expiry is not None and now < expiry:
+                self.suppressed += 1
+                return True
+
+            scans[key] = now + self._window
+            scans.move_to_end(key)
+            while scans:
+                oldest_key, oldest_expiry = next(iter(scans.items()))
+                if oldest_expiry > now and len(scans) <= self._max_entries:
+                    break
+                del scans[oldest_key]
+            return False
+
+    def clear(self) -> None:
+        """Forget all the scans."""
+        with self._lock:
+            self._scans.clear()
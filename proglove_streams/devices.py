@@ -0,0 +1,177 @@
+"""Registry of the devices connected to a Gateway.
+
+The Gateways keep a :class:`DeviceRegistry` up to date from the received
+events, before the callbacks are called:
+
+- ``scanner_state`` events connect and disconnect the devices,
+- ``scan`` and ``button_pressed`` events mark their device connected,
+  the ``scan`` events recording the last scan of the device,
+- ``gateway_state`` events set the connected devices to the listed ones,
+
+and from the display commands sent. The connectivity of a device is then
+known without a ``gateway_state!`` round trip.
+
+"""
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+
+class DeviceState:
+    """State of a device.
+
+    Attributes:
+        device_serial: The serial number of the device.
+        connected: Whether the device is connected to the Gateway.
+        last_event_time: The ``time_created`` of the last event of the
+            device, in milliseconds since the epoch.
+        last_scan_code: The scan code of the last scan.
+        last_scan_time: The ``time_created`` of the last scan.
+        last_display: The last display command sent to the device.
+
+    """
+
+    __slots__ = (
+        "device_serial",
+        "connected",
+        "last_event_time",
+        "last_scan_code",
+        "last_scan_time",
+        "last_display",
+    )
+
+    def __init__(self, device_serial: str):
+        """Initialize the class."""
+        self.device_serial = device_serial
+        self.connected = False
+        self.last_event_time: Optional[int] = None
+        self.last_scan_code: Optional[str] = None
+        self.last_scan_time: Optional[int] = None
+        self.last_display: Optional[Dict[str, Any]] = None
+
+    def copy(self) -> "DeviceState":
+        """Get a copy of the state."""
+        state = DeviceState(self.device_serial)
+        state.connected = self.connected
+        state.last_event_time = self.last_event_time
+        state.last_scan_code = self.last_scan_code
+        state.last_scan_time = self.last_scan_time
+        state.last_display = self.last_display
+        return state
+
+    def __repr__(self) -> str:
+        """Represent the state."""
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({fields})"
+
+
+class DeviceRegistry:
+    """Thread-safe state of the devices, keyed by device serial number."""
+
+    def __init__(self) -> None:
+        """Initialize the class."""
+        self._devices: Dict[str, DeviceState] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        """Get the number of known devices, connected or not."""
+        return len(self._devices)
+
+    def __contains__(self, device_serial: object) -> bool:
+        """Tell whether a device is known."""
+        return device_serial in self._devices
+
+    def is_connected(self, device_serial: str) -> bool:
+        """Tell whether a device is connected."""
+        state = self._devices.get(device_serial)
+        return state is not None and state.connected
+
+    def get(self, device_serial: str) -> Optional[DeviceState]:
+        """Get a copy of the state of a device, if known."""
+        with self._lock:
+            state = self._devices.get(device_serial)
+            return state.copy() if state is not None else None
+
+    def connected(self) -> List[str]:
+        """Get the serial numbers of the connected devices."""
+        with self._lock:
+            return [
+                device_serial
+                for device_serial, state in self._devices.items()
+                if state.connected
+            ]
+
+    def snapshot(self) -> Dict[str, DeviceState]:
+        """Get a copy of the state of all the known devices."""
+        with self._lock:
+            return {
+                device_serial: state.copy()
+                for device_serial, state in self._devices.items()
+            }
+
+    def update(self, event: Any) -> None:
+        """Update the devices from a raw received event."""
+        if not isinstance(event, dict):
+            return
+
+        event_type = event.get("event_type")
+        if event_type == "gateway_state":
+            self._set_connected(event.get("device_connected_list"))
+            return
+
+        if event_type == "scanner_state":
+            connected = event.get("device_connected_state") == "STATE_CONNECTED"
+        elif event_type in ("scan", "button_pressed"):
+            connected = True
+        else:
+            return
+
+        device_serial = event.get("device_serial")
+        if not isinstance(device_serial, str):
+            return
+
+        time_created = event.get("time_created")
+        with self._lock:
+            state = self._devices.get(device_serial)
+            if state is None:
+                state = self._devices[device_serial] = DeviceState(device_serial)
+            state.connected = connected
+            state.last_event_time = time_created
+            if event_type == "scan":
+                state.last_scan_code = event.get("scan_code")
+                state.last_scan_time = time_created
+
+    def record_display(self, command: Dict[str, Any]) -> None:
+        """Record a display command sent to a device."""
+        device_serial = command.get("device_serial")
+        if not isinstance(device_serial, str):
+            return
+
+        with self._lock:
+            state = self._devices.get(device_serial)
+            if state is None:
+                state = self._devices[device_serial] = DeviceState(device_serial)
+            state.last_display = command
+
+    def clear(self) -> None:
+        """Forget all the devices."""
+        with self._lock:
+            self._devices.clear()
+
+    def _set_connected(self, devices: Any) -> None:
+        if not isinstance(devices, list):
+            return
+
+        connected = set()
+        for device in devices:
+            device_serial = (
+                device.get("device_serial") if isinstance(device, dict) else None
+            )
+            if isinstance(device_serial, str):
+                connected.add(device_serial)
+
+        with self._lock:
+            for device_serial, state in self._devices.items():
+                state.connected = device_serial in connected
+            for device_serial in connected - self._devices.keys():
+                state = self._devices[device_serial] = DeviceState(device_serial)
+                state.connected = True
@@ -0,0 +1,134 @@
+"""Cache of the last display sent to every device.
+
+A Gateway created with a ``display_cache_ttl`` does not send a
+``display!`` command showing what the device already displays: same
+template, fields, refresh type and validity duration as the last display
+command sent to it, within the time to live of the cache. The
+display of a device is forgotten when:
+
+- the time to live, or the validity duration of the display, elapsed,
+- the device connects or disconnects, or is not listed in a
+  ``gateway_state`` event,
+- an ``errors`` event is received for the device, or replies to a
+  command sent to it.
+
+"""
+import time
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+# template, fields, refresh type and validity duration of a display
+_Display = Tuple[Any, Any, Any, Any]
+
+
+def _display(command: Dict[str, Any]) -> _Display:
+    return (
+        command.get("display_template_id"),
+        command.get("display_fields"),
+        command.get("display_refresh_type"),
+        command.get("time_validity_duration"),
+    )
+
+
+class DisplayCache:
+    """Last display sent to every device.
+
+    Arguments:
+        ttl: The time, in seconds, a display is assumed to stay shown.
+
+    """
+
+    def __init__(self, ttl: float):
+        """Initialize the class."""
+        if ttl <= 0:
+            raise ValueError("the display cache time to live must be positive")
+
+        self._ttl = ttl
+        self._displays: Dict[str, Tuple[_Display, float]] = {}
+        self._lock = Lock()
+        self.suppressed = 0
+
+    def __len__(self) -> int:
+        """Get the number of cached displays."""
+        return len(self._displays)
+
+    def is_shown(self, command: Dict[str, Any]) -> bool:
+        """Tell whether a display command would show the displayed content.
+
+        The command is then counted as suppressed.
+
+        """
+        device_serial = command.get("device_serial")
+        if not isinstance(device_serial, str):
+            return False
+
+        with self._lock:
+            cached = self._displays.get(device_serial)
+            if cached is None:
+                return False
+            display, expiry = cached
+            if time.monotonic() >= expiry:
+                del self._displays[device_serial]
+                return False
+            if display != _display(command):
+                return False
+            self.suppressed += 1
+            return True
+
+    def store(self, command: Dict[str, Any]) -> None:
+        """Record a display command sent to a device."""
+        device_serial = command.get("device_serial")
+        if not isinstance(device_serial, str):
+            return
+
+        ttl = self._ttl
+        validity = command.get("time_validity_duration")
+        if validity:
+            # milliseconds, the device clears the display once elapsed
+            ttl = min(ttl, validity / 1000)
+
+        display = _display(command)
+        # the fields are copied, the caller may modify them afterwards
+        fields = display[1]
+        if isinstance(fields, list):
+            display = (
+                display[0],
+                [dict(field) if isinstance(field, dict) else field for field in fields],
+                display[2],
+                display[3],
+            )
+
+        with self._lock:
+            self._displays[device_serial] = (display, time.monotonic() + ttl)
+
+    def invalidate(self, device_serial: Optional[str] = None) -> None:
+        """Forget the display of a device, or of all of them."""
+        with self._lock:
+            if device_serial is None:
+                self._displays.clear()
+            else:
+                self._displays.pop(device_serial, None)
+
+    def update(self, event: Any) -> None:
+        """Forget the displays a raw received event may have changed."""
+        if not self._displays or not isinstance(event, dict):
+            return
+
+        event_type = event.get("event_type")
+        if event_type in ("scanner_state", "errors"):
+            device_serial = event.get("device_serial")
+            if isinstance(device_serial, str):
+                self.invalidate(device_serial)
+        elif event_type == "gateway_state":
+            devices = event.get("device_connected_list")
+            if not isinstance(devices, list):
+                return
+            connected = {
+                device.get("device_serial")
+                for device in devices
+                if isinstance(device, dict)
+            }
+            with self._lock:
+                for device_serial in list(self._displays):
+                    if device_serial not in connected:
+                        del self._displays[device_serial]
@@ -0,0 +1,109 @@
+"""Filter of the received events applied before decoding them.
+
+A Gateway created with an :class:`EventFilter` reads the ``event_type``
+and ``device_serial`` fields of every received line with a regular
+expression on the raw bytes, and drops the events the application is not
+subscribed to without decoding their JSON nor parsing their model.
+
+The filter is conservative: a line whose fields cannot be read this way,
+such as a field with escaped characters, is decoded as usual. The
+``device_serial`` lists do not apply to the ``gateway_state`` events,
+which list the devices rather than being about one.
+
+The filtered events do not update the device registry nor the display
+cache of the Gateway: filtering out the ``scanner_state`` events leaves
+them unaware of the connections and disconnections.
+
+"""
+import re
+from typing import Dict, Iterable, Optional
+
+_EVENT_TYPE = re.compile(rb'"event_type"\s*:\s*"([^"\\]*)"')
+_DEVICE_SERIAL = re.compile(rb'"device_serial"\s*:\s*"([^"\\]*)"')
+
+# the events which may reply to a command
+REPLY_EVENT_TYPES = frozenset((b"errors", b"gateway_state"))
+
+
+def _encode(values: Optional[Iterable[str]]) -> Optional[frozenset]:
+    return None if values is None else frozenset(value.encode() for value in values)
+
+
+class EventFilter:
+    """Subscription of a Gateway to event types and devices.
+
+    Arguments:
+        event_types: Keep only the events of these types.
+        exclude_event_types: Drop the events of these types.
+        device_serials: Keep only the events of these devices.
+        exclude_device_serials: Drop the events of these devices.
+
+    Attributes:
+        passed: The number of lines kept.
+
+    """
+
+    def __init__(
+        self,
+        event_types: Optional[Iterable[str]] = None,
+        exclude_event_types: Optional[Iterable[str]] = None,
+        device_serials: Optional[Iterable[str]] = None,
+        exclude_device_serials: Optional[Iterable[str]] = None,
+    ):
+        """Initialize the class."""
+        self._event_types = _encode(event_types)
+        self._exclude_event_types = _encode(exclude_event_types) or frozenset()
+        self._device_serials = _encode(device_serials)
+        self._exclude_device_serials = _encode(exclude_device_serials) or frozenset()
+        self._filters_devices = bool(
+            self._device_serials is not None or self._exclude_device_serials
+        )
+        self._filtered: Dict[bytes, int] = {}
+        self.passed = 0
+
+    @property
+    def filtered(self) -> Dict[str, int]:
+        """Get the number of events dropped, by event type."""
+        return {
+            event_type.decode(errors="replace"): count
+            for event_type, count in self._filtered.items()
+        }
+
+    def accepts(self, line: bytes, replies: bool = False) -> bool:
+        """Tell whether a received line is to be decoded, and count it.
+
+        Arguments:
+            line: The raw received line.
+            replies: Keep the events which may reply to a command, the
+                ``errors`` and ``gateway_state`` events, whatever the filter.
+
+        """
+        match = _EVENT_TYPE.search(line)
+        if match is None:
+            self.passed += 1
+            return True
+        event_type = match.group(1)
+
+        if not (replies and event_type in REPLY_EVENT_TYPES) and (
+            event_type in self._exclude_event_types
+            or (self._event_types is not None and event_type not in self._event_types)
+            or (
+                self._filters_devices
+                and event_type != b"gateway_state"
+                and not self._accepts_device(line)
+            )
+        ):
+            self._filtered[event_type] = self._filtered.get(event_type, 0) + 1
+            return False
+
+        self.passed += 1
+        return True
+
+    def _accepts_device(self, line: bytes) -> bool:
+        match = _DEVICE_SERIAL.search(line)
+        if match is None:
+            return True
+        device_serial = match.group(1)
+        return device_serial not in self._exclude_device_serials and (
+            self._device_serials is None or device_serial in self._device_serials
+        )
@@ -1,5 +1,26 @@
 """Exception module."""
+from typing import Any, Dict, Optional
 
 
 class ProgloveStreamsException(Exception):
     """Main ProGlove Streams exception."""
+
+
+class CommandError(ProgloveStreamsException):
+    """Error replied by the Gateway to a command.
+
+    Attributes:
+        error_code: The code of the error.
+        error_severity: The severity of the error.
+        event: The raw ``errors`` event.
+
+    """
+
+    def __init__(self, event: Dict[str, Any]):
+        """Initialize the class."""
+        self.error_code: Optional[str] = event.get("error_code")
+        self.error_severity: Optional[str] = event.get("error_severity")
+        self.event = event
+        super().__init__(
+            f"command {event.get('event_reference_id')} failed: {self.error_code}"
+        )
@@ -0,0 +1,131 @@
+"""Line framing module.
+
+The Gateway sends one JSON event per line. Reading the serial port line by
+line with ``Serial.readline`` costs one ``read`` system call per byte, so the
+transports read whatever is available in large chunks instead and use a
+:class:`LineFramer` to cut the received data into lines.
+
+"""
+import logging
+from typing import List, Optional
+
+from serial import Serial
+
+logger = logging.getLogger(__name__)
+
+MAX_LINE_LENGTH = 64 * 1024
+
+
+class LineFramer:
+    """Split a byte stream into newline terminated lines.
+
+    Partial lines are kept until the rest of the line is received. Lines
+    longer than ``max_line_length`` are dropped and counted in
+    :attr:`overflows`.
+
+    Arguments:
+        max_line_length: The maximum length of a line, without the newline.
+
+    """
+
+    def __init__(self, max_line_length: int = MAX_LINE_LENGTH):
+        """Initialize the class."""
+        self._max_line_length = max_line_length
+        self._buffer = bytearray()
+        self._discarding = False
+        self.overflows = 0
+
+    @property
+    def pending(self) -> int:
+        """Get the number of buffered bytes of the current partial line."""
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Add received data and get the lines it completes.
+
+        Arguments:
+            data: The received data.
+
+        Returns:
+            The complete lines, without their newline. Empty lines are
+            skipped.
+
+        """
+        buffer = self._buffer
+        search_from = len(buffer)
+        buffer += data
+
+        lines = []
+        start = 0
+        with memoryview(buffer) as view:
+            while True:
+                end = buffer.find(b"\n", search_from)
+                if end < 0:
+                    break
+
+                if self._discarding:
+                    self._discarding = False
+                elif end - start > self._max_line_length:
+                    self._overflow()
+                elif end > start:
+                    lines.append(bytes(view[start:end]))
+
+                start = search_from = end + 1
+
+        del buffer[:start]
+
+        if self._discarding:
+            buffer.clear()
+        elif len(buffer) > self._max_line_length:
+            self._overflow()
+            self._discarding = True
+            buffer.clear()
+
+        return lines
+
+    def flush(self) -> Optional[bytes]:
+        """Get the pending partial line, if any, and clear the buffer."""
+        line = bytes(self._buffer) if self._buffer else None
+        self.clear()
+        return line
+
+    def clear(self) -> None:
+        """Drop the pending partial line."""
+        self._buffer.clear()
+        self._discarding = False
+
+    def _overflow(self) -> None:
+        self.overflows += 1
+        logger.warning("line longer than %u bytes dropped", self._max_line_length)
+
+
+def read_available(serial: Serial) -> bytes:
+    """Wait for data and read everything the port has received.
+
+    The first byte is waited for with the port timeout, the rest of the
+    received data is then read at once.
+
+    """
+    data = serial.read(1)
+    if data:
+        waiting = serial.in_waiting
+        if waiting:
+            data += serial.read(waiting)
+    return data
+
+
+def discard_input(serial: Serial) -> int:
+    """Discard the data received before the port was serviced.
+
+    The input buffer is reset, then the data received meanwhile, as
+    reported by ``in_waiting``, is read without waiting for more.
+
+    Returns:
+        The number of bytes drained after the reset.
+
+    """
+    serial.reset_input_buffer()
+    waiting = serial.in_waiting
+    if not waiting:
+        return 0
+    return len(serial.read(waiting))
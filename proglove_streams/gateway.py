@@ -1,108 +1,175 @@
 """Gateway module."""
-import json
 import logging
 import time
-import uuid
-from threading import Event, Thread
-from typing import Any, Dict, List, Optional, Union
-
-from serial import Serial, SerialException
-from streams_api.customer_integrations.button_pressed.model import ButtonPressedStream
-from streams_api.customer_integrations.errors.model import ErrorsStream
-from streams_api.customer_integrations.gateway_state_event.model import (
-    GatewayStateEventStream,
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from threading import Event, Lock, Thread
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Union,
 )
-from streams_api.customer_integrations.handler import get_stream
-from streams_api.customer_integrations.scan.model import ScanStream
-from streams_api.customer_integrations.scanner_state.model import ScannerStateStream
+
+from serial import Serial, SerialException, serial_for_url
 
 from proglove_streams.client import Client
+from proglove_streams.codec import Codec, get_codec
+from proglove_streams.commands import (
+    CommandBatch,
+    CommandTracker,
+    display_command,
+    feedback_command,
+    new_command,
+    trigger_block_command,
+)
+from proglove_streams.devices import DeviceRegistry
+from proglove_streams.display_cache import DisplayCache
+from proglove_streams.event_filter import EventFilter
 from proglove_streams.exception import ProgloveStreamsException
-from proglove_streams.handler import Handler
+from proglove_streams.framing import LineFramer, discard_input, read_available
+from proglove_streams.handler import (
+    EventRouter,
+    Handler,
+    event_type_label,
+    parse_gateway_state,
+)
+from proglove_streams.logging import log_sampled
+from proglove_streams.metrics import Metrics
+from proglove_streams.pending import PendingRequests
+from proglove_streams.reconnect import ReconnectPolicy, find_port, port_serial_number
+from proglove_streams.workers import WorkerDispatcher
+from proglove_streams.writer import CommandWriter, WriterStats
+
+if TYPE_CHECKING:
+    from streams_api.customer_integrations.gateway_state_event.model import (
+        GatewayStateEventStream,
+    )
+
+    from proglove_streams.capture import CaptureRecorder
 
 logger = logging.getLogger(__name__)
 
+# buckets of the reconnection time, in seconds
+RECONNECT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
 
 # pylint: disable=too-few-public-methods
-class GatewayMessageHandler(Handler):
+class GatewayMessageHandler(EventRouter, Handler):
     """Default Gateway message handler."""
 
     def handle(self, client: Client, event: Dict) -> None:
         """Handle the events."""
-        logger.debug("event received: %s", event)
-
-        if "event_type" not in event:
-            logger.warning("event_type field not found")
+        resolved = self.resolve(event)
+        if resolved is None:
             return
 
-        event_type = event["event_type"]
-        try:
-            stream = get_stream(event)
-        except ValueError:
+        callback, stream = resolved
+        if self._metrics is None:
+            callback(client, stream)
             return
 
-        if isinstance(stream, ScanStream):
-            self._handle_scan(client, stream)
-        elif isinstance(stream, ScannerStateStream):
-            self._handle_scanner_state(client, stream)
-        elif isinstance(stream, ErrorsStream):
-            self._handle_error(client, stream)
-        elif isinstance(stream, GatewayStateEventStream):
-            self._handle_gateway_state(client, stream)
-        elif isinstance(stream, ButtonPressedStream):
-            self._handle_button_pressed(client, stream)
-        else:
-            logger.warning('could not find a handler for event "%s"', event_type)
-
-    def _handle_button_pressed(
-        self, client: Client, event: ButtonPressedStream
-    ) -> None:
-        """Handle a button pressed."""
-        if self.on_button_pressed is not None:
-            self.on_button_pressed(client, event)
-
-    def _handle_scan(self, client: Client, event: ScanStream) -> None:
-        """Handle a scan."""
-
-        if self.on_scan is not None:
-            self.on_scan(client, event)
-
-    def _handle_scanner_state(self, client: Client, event: ScannerStateStream) -> None:
-        """Handle a scanner state event."""
-
-        if event.device_connected_state == "STATE_CONNECTED":
-            if self.on_scanner_connected is not None:
-                self.on_scanner_connected(client, event)
-        else:
-            if self.on_scanner_disconnected is not None:
-                self.on_scanner_disconnected(client, event)
-
-    def _handle_error(self, client: Client, event: ErrorsStream) -> None:
-        """Handle an error event."""
-
-        if self.on_error is not None:
-            self.on_error(client, event)
-
-    def _handle_gateway_state(
-        self, client: Client, event: GatewayStateEventStream
-    ) -> None:
-        """Handle a Gateway state event."""
-        if self.on_gateway_state_event is not None:
-            self.on_gateway_state_event(client, event)
+        start = time.perf_counter()
+        try:
+            callback(client, stream)
+        finally:
+            self._observe_callback(event, start)
 
 
+# pylint: disable=too-many-instance-attributes
 class Gateway:
     """Gateway class."""
 
-    def __init__(self, handler: Handler, port: str, baudrate: int = 115200):
-        """Initialize the class."""
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        handler: Handler,
+        port: str,
+        baudrate: int = 115200,
+        codec: Optional[Codec] = None,
+        dispatcher: Optional[WorkerDispatcher] = None,
+        coalesce_writes: bool = False,
+        command_timeout: float = 5.0,
+        metrics: Optional[Metrics] = None,
+        reconnect: Optional[ReconnectPolicy] = None,
+        usb_serial_number: Optional[str] = None,
+        display_cache_ttl: Optional[float] = None,
+        recorder: Optional["CaptureRecorder"] = None,
+        event_filter: Optional[EventFilter] = None,
+    ):
+        """Initialize the class.
+
+        Arguments:
+            handler: The handler of the received events.
+            port: The serial port path, or a pyserial URL such as
+                ``socket://host:port``.
+            baudrate: The serial port baudrate.
+            codec: The JSON codec, by default the fastest one installed.
+            dispatcher: The worker threads running the handler, by default
+                the handler runs on the reading thread.
+            coalesce_writes: Write the commands from a dedicated thread,
+                coalescing the commands sent meanwhile into a single write.
+                By default the commands are written by the calling thread.
+            command_timeout: The time, in seconds, to wait for the reply to
+                a command before resolving its future.
+            metrics: The registry recording the traffic, decoding, dispatch
+                and write metrics, none by default.
+            reconnect: Reopen the serial port with this policy when reading
+                fails, by default the Gateway stops. The commands sent
+                while reconnecting, or whose write failed, are sent once
+                reconnected; the ones already written are not sent again.
+            usb_serial_number: The USB serial number the port is looked up
+                by when reconnecting, by default the one of the port when
+                it is first opened.
+            display_cache_ttl: Do not send the display commands showing what
+                the device displays since less than this time, in seconds.
+                By default all the display commands are sent.
+            recorder: Record the received lines in a capture file, to
+                replay them with :func:`proglove_streams.capture.replay`.
+                The recorder is flushed when the Gateway stops, but not
+                closed.
+            event_filter: Drop the events the filter does not accept before
+                decoding them. The replies to the pending commands are
+                always kept.
+
+        """
         self._input_thread: Optional[Thread] = None
         self._is_running = Event()
         self._port = port
         self._baudrate = baudrate
         self._handler = handler
+        self._codec = codec or get_codec()
+        self._dispatcher = dispatcher
 
         self._serial: Optional[Serial] = None
+        self._framer = LineFramer()
+        self._write_lock = Lock()
+        self._writer = (
+            CommandWriter(self._write, on_error=self._on_write_error)
+            if coalesce_writes
+            else None
+        )
+        self._pending = PendingRequests(command_timeout)
+        self._devices = DeviceRegistry()
+        self._display_cache = (
+            DisplayCache(display_cache_ttl) if display_cache_ttl is not None else None
+        )
+        self._metrics = metrics
+        self._commands = CommandTracker(
+            self._codec, self._pending, self._devices, self._display_cache, metrics
+        )
+        self._recorder = recorder
+        self._event_filter = event_filter
+
+        self._reconnect = reconnect
+        self._usb_serial_number = usb_serial_number
+        self._is_reconnecting = False
+        self._reconnect_lock = Lock()
+        self._stop_requested = Event()
 
     def start(self, flush_input: bool = True) -> None:
         """Start servicing the wrapped connection."""
@@ -111,23 +178,17 @@ class Gateway:
 
         logger.info("start the Gateway client")
 
-        if self._serial is not None:
-            self._serial.close()
-            self._serial = None
-
-        try:
-            logger.debug(
-                "open serial port %s with baudrate %u", self._port, self._baudrate
-            )
-            self._serial = Serial(self._port, self._baudrate, timeout=0.1)
-
-            if flush_input:
-                for _ in range(10):
-                    _ = self._serial.readall()
+        self._stop_requested.clear()
+        self._open(flush_input)
+        if (
+            self._reconnect is not None
+            and self._usb_serial_number is None
+            and self._serial is not None
+        ):
+            self._usb_serial_number = port_serial_number(self._port)
 
-        except SerialException as e:
-            logger.error("could not open serial connection: %s", e)
-            raise ProgloveStreamsException(str(e)) from e
+        if self._dispatcher is not None:
+            self._dispatcher.start()
 
         logger.debug("start the input thread")
         self._input_thread = Thread(target=self._input_loop, daemon=True)
@@ -142,48 +203,44 @@ class Gateway:
 
         if self._input_thread is not None:
             logger.debug("stop the input thread")
+            self._stop_requested.set()
             self._is_running.clear()
             self._input_thread.join()
             self._input_thread = None
 
-        if self._serial is not None:
-            logger.debug("close the serial connection")
-            self._serial.close()
-            self._serial = None
+        if self._dispatcher is not None:
+            self._dispatcher.stop()
 
-    def get_gateway_state(self) -> None:
-        """Get the Gateway state command."""
-        logger.info("Get Gateway state")
+        self._close()
+        self._pending.cancel_all()
+        if self._recorder is not None:
+            self._recorder.flush()
 
-        command = {
-            "api_version": "1.0",
-            "event_type": "gateway_state!",
-            "event_id": str(uuid.uuid4()),
-            "time_created": int(time.time() * 1000),
-        }
+    def get_gateway_state(self) -> "Future[GatewayStateEventStream]":
+        """Get the Gateway state command.
 
-        self._send_command(command)
+        Returns:
+            A future resolved with the Gateway state reply.
+
+        """
+        return self._send_command(new_command("gateway_state!"))
 
-    def send_feedback(self, device_serial: str, feedback_action_id: str) -> None:
+    def send_feedback(
+        self, device_serial: str, feedback_action_id: str
+    ) -> "Future[None]":
         """Send a feedback command.
 
         Arguments:
             device_serial: The Mark serial number.
             feedback_action_id: The action ID of the feedback.
 
-        """
-        logger.info("Send a feedback command")
-
-        command = {
-            "api_version": "1.0",
-            "event_type": "feedback!",
-            "event_id": str(uuid.uuid4()),
-            "time_created": int(time.time() * 1000),
-            "device_serial": device_serial,
-            "feedback_action_id": feedback_action_id,
-        }
+        Returns:
+            A future failed with :class:`CommandError` if the Gateway
+            replies with an error, resolved otherwise once the command
+            timeout expired.
 
-        self._send_command(command)
+        """
+        return self._send_command(feedback_command(device_serial, feedback_action_id))
 
     # pylint: disable=too-many-arguments disable=duplicate-code
     def set_display(
@@ -193,7 +250,7 @@ class Gateway:
         display_fields: List[Dict[str, Union[int, str]]],
         display_refresh_type: str = "DEFAULT",
         time_validity_duration: Optional[int] = None,
-    ) -> None:
+    ) -> "Future[None]":
         """Send a display command.
 
         Arguments:
@@ -203,24 +260,19 @@ class Gateway:
             display_refresh_type: The display refresh type.
             time_validity_duration: The time the display should be shown.
 
-        """
-        logger.info("Send a Display command")
+        Returns:
+            A future failed with :class:`CommandError` on error reply.
 
-        command = {
-            "api_version": "1.0",
-            "event_type": "display!",
-            "event_id": str(uuid.uuid4()),
-            "time_created": int(time.time() * 1000),
-            "device_serial": device_serial,
-            "display_template_id": display_template_id,
-            "display_refresh_type": display_refresh_type,
-            "display_fields": display_fields,
-        }
-
-        if time_validity_duration is not None:
-            command["time_validity_duration"] = time_validity_duration
-
-        self._send_command(command)
+        """
+        return self._send_command(
+            display_command(
+                device_serial,
+                display_template_id,
+                display_fields,
+                display_refresh_type,
+                time_validity_duration,
+            )
+        )
 
     # pylint: disable=too-many-arguments disable=duplicate-code
     def set_trigger_block(
@@ -230,7 +282,7 @@ class Gateway:
         trigger_block_gesture_list: List[str],
         trigger_unblock_gesture_list: List[str],
         time_validity_duration: Optional[int] = None,
-    ) -> None:
+    ) -> "Future[None]":
         """Send a trigger block command.
 
         Arguments:
@@ -240,60 +292,452 @@ class Gateway:
             trigger_unblock_gesture_list: A list of trigger that can ublock.
             time_validity_duration: The time the blocking should last.
 
+        Returns:
+            A future failed with :class:`CommandError` on error reply.
+
+        """
+        return self._send_command(
+            trigger_block_command(
+                device_serial,
+                trigger_block_state,
+                trigger_block_gesture_list,
+                trigger_unblock_gesture_list,
+                time_validity_duration,
+            )
+        )
+
+    def new_batch(self) -> CommandBatch:
+        """Create a batch of commands to send with :meth:`send_batch`."""
+        return CommandBatch(self._codec)
+
+    def send_batch(
+        self, commands: Union[CommandBatch, Iterable[Dict[str, Any]]]
+    ) -> List[str]:
+        """Send many commands with a single write.
+
+        Arguments:
+            commands: A batch created with :meth:`new_batch`, or commands
+                built with the ``*_command`` functions.
+
+        Returns:
+            The event IDs of the commands.
+
+        """
+        commands = self._commands.batch(commands)
+        data = commands.encode()
+        if data:
+            self._send_data(data)
+            self._commands.sent_batch(commands)
+        return commands.event_ids
+
+    @property
+    def display_cache(self) -> Optional[DisplayCache]:
+        """Get the cache of the displays sent, if enabled."""
+        return self._display_cache
+
+    @property
+    def event_filter(self) -> Optional[EventFilter]:
+        """Get the filter of the received events, if any."""
+        return self._event_filter
+
+    @property
+    def devices(self) -> DeviceRegistry:
+        """Get the state of the devices, updated from the received events."""
+        return self._devices
+
+    @property
+    def is_running(self) -> bool:
+        """Tell whether the Gateway reads from its port or reconnects."""
+        return self._is_running.is_set()
+
+    @property
+    def port(self) -> str:
+        """Serial port path of the Gateway."""
+        return self._port
+
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        """Get the metrics registry, if any."""
+        return self._metrics
+
+    def writer_stats(self) -> Optional[WriterStats]:
+        """Get the command writer counters, if the writes are coalesced."""
+        return self._writer.stats() if self._writer is not None else None
+
+    def open(self, flush_input: bool = True) -> None:
+        """Open the serial port without starting the input thread.
+
+        The port is then serviced by the caller, as a
+        :class:`~proglove_streams.pool.GatewayPool` does: it waits for
+        :meth:`fileno` to be readable, calls :meth:`read` and hands the
+        received lines over to :meth:`feed`.
+
+        Raises:
+            ProgloveStreamsException: If the port cannot be opened.
+
+        """
+        self._open(flush_input)
+
+    def close(self) -> None:
+        """Close the serial port opened with :meth:`open`."""
+        self._close()
+
+    def fileno(self) -> int:
+        """Get the file descriptor of the serial port.
+
+        Raises:
+            ProgloveStreamsException: If the port is not opened.
+
+        """
+        if self._serial is None:
+            raise ProgloveStreamsException("serial connection not opened")
+        return self._serial.fileno()
+
+    def read(self) -> bytes:
+        """Read the bytes received by the serial port.
+
+        Returns:
+            The bytes waiting, or the first byte received within the read
+            timeout if none is waiting.
+
+        Raises:
+            ProgloveStreamsException: If the port is not opened or cannot be
+                read.
+
+        """
+        serial = self._serial
+        if serial is None:
+            raise ProgloveStreamsException("serial connection not opened")
+
+        try:
+            return serial.read(serial.in_waiting or 1)
+        except (SerialException, OSError) as e:
+            raise ProgloveStreamsException(str(e)) from e
+
+    def feed(self, line: bytes) -> bool:
+        """Decode a line read from the port and hand it over to the handler.
+
+        Returns:
+            ``False`` if the line is not valid JSON.
+
+        """
+        return self._process_line(line)
+
+    def expire_pending(self) -> int:
+        """Expire the commands whose timeout elapsed.
+
+        Returns:
+            The number of expired commands.
+
+        """
+        return self._pending.expire()
+
+    def fail_pending(self, exception: BaseException) -> None:
+        """Fail the commands waiting for a reply, the port being lost."""
+        self._pending.fail_all(exception)
+
+    def cancel_pending(self) -> None:
+        """Cancel the commands waiting for a reply, the port being closed."""
+        self._pending.cancel_all()
+
+    def _open(self, flush_input: bool) -> None:
+        self._close()
+
+        try:
+            logger.debug(
+                "open serial port %s with baudrate %u", self._port, self._baudrate
+            )
+            self._serial = serial_for_url(self._port, self._baudrate, timeout=0.1)
+
+            if flush_input:
+                discarded = discard_input(self._serial)
+                if discarded:
+                    logger.debug("discarded %u bytes received before start", discarded)
+
+        except (SerialException, ValueError) as e:
+            logger.error("could not open serial connection: %s", e)
+            raise ProgloveStreamsException(str(e)) from e
+
+        if self._writer is not None:
+            self._writer.start()
+
+    def _close(self) -> None:
+        if self._writer is not None:
+            self._writer.stop()
+
+        if self._serial is not None:
+            logger.debug("close the serial connection")
+            self._serial.close()
+            self._serial = None
+
+        # the devices may lose their displays until connected again
+        self._commands.reset()
+
+    def _process_line(self, line: bytes) -> bool:
+        """Decode a received line and hand it over to the handler.
+
+        Returns:
+            ``False`` if the line is not valid JSON.
+
         """
-        logger.info("Send a trigger block command")
+        metrics = self._metrics
+        if metrics is not None:
+            metrics.counter("lines_read").inc()
 
-        command = {
-            "api_version": "1.0",
-            "event_type": "trigger_block!",
-            "event_id": str(uuid.uuid4()),
-            "time_created": int(time.time() * 1000),
-            "device_serial": device_serial,
-            "trigger_block_gesture_list": trigger_block_gesture_list,
-            "trigger_unblock_gesture_list": trigger_unblock_gesture_list,
-            "trigger_block_state": trigger_block_state,
-        }
+        event_filter = self._event_filter
+        if event_filter is not None and not event_filter.accepts(
+            line, replies=len(self._pending) > 0
+        ):
+            if metrics is not None:
+                metrics.counter("events_filtered").inc()
+            return True
 
-        if time_validity_duration is not None:
-            command["time_validity_duration"] = time_validity_duration
+        if metrics is not None:
+            start = time.perf_counter()
+
+        try:
+            event = self._codec.decode(line)
+        except self._codec.decode_errors as e:
+            log_sampled(logger, logging.DEBUG, None, "malformed JSON: %s", e)
+            if metrics is not None:
+                metrics.counter("malformed_lines").inc()
+            return False
+
+        if metrics is not None:
+            metrics.histogram("decode_seconds").observe(time.perf_counter() - start)
+
+        self._devices.update(event)
+        self._commands.received(event)
+        self._pending.correlate(event, parse_gateway_state)
+
+        handle = self._handler.handle if metrics is None else self._timed_handle
+        if self._dispatcher is None:
+            handle(self, event)
+        else:
+            # the events of a device are handled in order by the same worker
+            key = event.get("device_serial") if isinstance(event, dict) else None
+            self._dispatcher.submit(key, partial(handle, self, event))
+        return True
 
-        self._send_command(command)
+    def _timed_handle(self, client: Client, event: Any) -> None:
+        start = time.perf_counter()
+        try:
+            self._handler.handle(client, event)
+        finally:
+            if self._metrics is not None:
+                self._metrics.histogram(
+                    "dispatch_seconds",
+                    event_type=event_type_label(event, self._handler),
+                ).observe(time.perf_counter() - start)
 
     def _input_loop(self) -> None:
+        self._framer.clear()
         self._is_running.set()
 
         while self._is_running.is_set():
-            if self._serial is None:
+            serial = self._serial
+            if serial is None:
                 self._is_running.clear()
                 return
 
             try:
-                line = self._serial.readline()
-            except SerialException as e:
+                data = read_available(serial)
+            except (SerialException, OSError) as e:
                 logger.error("could not read from serial: %s", e)
+                if self._reconnect is not None and self._reopen():
+                    continue
+                if self._stop_requested.is_set():
+                    return
                 self._is_running.clear()
+                self._pending.fail_all(ProgloveStreamsException(str(e)))
                 return
 
-            if not line:
+            self._pending.expire()
+
+            if self._metrics is not None and data:
+                self._metrics.counter("bytes_read").inc(len(data))
+
+            if not data:
+                # as with readline, a partial line is used once the read times out
+                line = self._framer.flush()
+                if line is not None:
+                    if self._recorder is not None:
+                        self._recorder.record((line,))
+                    self._process_line(line)
                 continue
+
+            lines = self._framer.feed(data)
+            if self._recorder is not None:
+                self._recorder.record(lines)
+            for line in lines:
+                self._process_line(line)
+
+    def _reopen(self) -> bool:
+        """Reopen the serial port with the reconnection policy.
+
+        Returns:
+            ``False`` if the Gateway is stopped or the attempts exhausted.
+
+        """
+        assert self._reconnect is not None
+        with self._reconnect_lock:
+            self._is_reconnecting = True
+        self._pending.suspend()
+        self._framer.clear()
+        self._close()
+
+        start = time.monotonic()
+        attempt = 0
+        while self._reconnect.max_attempts is None or (
+            attempt < self._reconnect.max_attempts
+        ):
+            if self._stop_requested.wait(self._reconnect.delay(attempt)):
+                break
+            attempt += 1
+            if self._metrics is not None:
+                self._metrics.counter("reconnect_attempts").inc()
+
+            if self._usb_serial_number is not None:
+                port = find_port(self._usb_serial_number)
+                if port is None:
+                    logger.debug("Gateway %s not plugged", self._usb_serial_number)
+                    continue
+                if port != self._port:
+                    logger.info("Gateway moved from %s to %s", self._port, port)
+                    self._port = port
+
             try:
-                event = json.loads(line.strip())
-                self._handler.handle(self, event)
-            except json.decoder.JSONDecodeError as e:
-                logger.debug("malformed JSON: %s", e)
+                self._open(flush_input=False)
+            except ProgloveStreamsException:
+                continue
 
-    def _send_command(self, command: Dict[str, Any]) -> None:
+            self._resume(time.monotonic() - start, attempt)
+            return True
+
+        with self._reconnect_lock:
+            self._is_reconnecting = False
+        logger.error("could not reconnect after %u attempts", attempt)
+        return False
+
+    def _resume(self, duration: float, attempts: int) -> None:
+        """Send again the pending commands once reconnected."""
+        with self._reconnect_lock:
+            self._is_reconnecting = False
+            commands = self._pending.resume()
+        event_ids = list(commands)
+
+        logger.info(
+            "reconnected to %s in %.3f s after %u attempts, send %u commands again",
+            self._port,
+            duration,
+            attempts,
+            len(commands),
+        )
+        if self._metrics is not None:
+            self._metrics.counter("reconnects").inc()
+            self._metrics.counter("commands_reissued").inc(len(commands))
+            self._metrics.histogram(
+                "reconnect_seconds", buckets=RECONNECT_BUCKETS
+            ).observe(duration)
+
+        if commands:
+            try:
+                self._send_data(
+                    b"".join(commands.values()),
+                    partial(self._delivered, event_ids),
+                )
+            except ProgloveStreamsException as e:
+                # the next read fails as well and reconnects again
+                logger.error("could not send the pending commands: %s", e)
+
+    def _send_command(self, command: Dict[str, Any]) -> "Future[Any]":
+        future: "Future[Any]" = Future()
+        if not self._commands.prepare(command):
+            future.set_result(None)
+            return future
+
+        self._write_command(command, future)
+        self._commands.sent(command)
+        return future
+
+    def _write_command(self, command: Dict[str, Any], future: "Future[Any]") -> None:
+        data = self._codec.encode(command) + b"\n"
+
+        if self._is_reconnecting:
+            with self._reconnect_lock:
+                if self._is_reconnecting:
+                    # sent once reconnected
+                    self._commands.register(command, future, data)
+                    return
+
+        # registered before writing, the reply may come before write returns
+        if self._reconnect is None:
+            self._commands.register(command, future)
+            on_written = None
+        else:
+            # kept to be sent again if not written before a disconnection
+            self._commands.register(command, future, data)
+            on_written = partial(self._commands.delivered, command)
+        try:
+            self._send_data(data, on_written)
+        except ProgloveStreamsException:
+            if self._reconnect is not None and self._is_running.is_set():
+                # the reading thread reconnects and sends it again
+                return
+            self._commands.discard(command)
+            raise
+        except Exception:
+            self._commands.discard(command)
+            raise
+
+    def _send_data(
+        self, data: bytes, on_written: Optional[Callable[[], Any]] = None
+    ) -> None:
         if self._serial is None:
             logger.warning("serial connection not opened")
             raise ProgloveStreamsException("serial connection not opened")
 
-        logger.debug("send command %s", command)
+        if self._writer is not None:
+            self._writer.send(data, on_written)
+            return
+
         try:
-            self._serial.write(json.dumps(command).encode())
-            self._serial.write(b"\n")
+            self._write(data)
         except SerialException as e:
             logger.error("could not send data to serial: %s", e)
             raise ProgloveStreamsException(str(e)) from e
+        if on_written is not None:
+            on_written()
+
+    def _delivered(self, event_ids: List[str]) -> None:
+        """Record the commands sent again once reconnected as written."""
+        for event_id in event_ids:
+            self._pending.delivered(event_id)
+
+    def _on_write_error(self, error: Exception) -> None:
+        """Fail the pending commands when the writer thread could not write."""
+        if self._reconnect is not None and self._is_running.is_set():
+            # the reading thread reconnects and sends them again
+            return
+        self._pending.fail_all(ProgloveStreamsException(str(error)))
+
+    def _write(self, data: bytes) -> None:
+        """Write data to the serial port, one thread at a time."""
+        with self._write_lock:
+            serial = self._serial
+            if serial is None:
+                raise ProgloveStreamsException("serial connection not opened")
+
+            if self._metrics is None:
+                serial.write(data)
+                return
+
+            start = time.perf_counter()
+            serial.write(data)
+            self._metrics.histogram("write_seconds").observe(
+                time.perf_counter() - start
+            )
+            self._metrics.counter("bytes_written").inc(len(data))
 
     def __enter__(self) -> "Gateway":
         """Use context manager."""
@@ -303,3 +747,45 @@ class Gateway:
     def __exit__(self, _exc_type: Any, _exc_val: Any, _exc_tb: Any) -> None:
         """Close context manager."""
         self.stop()
+
+
+def start_gateways(
+    gateways: Iterable[Gateway],
+    flush_input: bool = True,
+    max_workers: Optional[int] = None,
+) -> Dict[str, ProgloveStreamsException]:
+    """Start many Gateways in parallel.
+
+    Opening a serial port is mostly waiting, the Gateways are started from
+    a pool of threads so that starting a fleet takes about as long as
+    starting its slowest Gateway.
+
+    Arguments:
+        gateways: The Gateways to start.
+        flush_input: Discard the data received before the start.
+        max_workers: The number of starting threads, by default one per
+            Gateway.
+
+    Returns:
+        The errors of the Gateways which could not be started, keyed by
+        port. The other Gateways are started.
+
+    """
+    gateways = list(gateways)
+    if not gateways:
+        return {}
+
+    errors: Dict[str, ProgloveStreamsException] = {}
+    with ThreadPoolExecutor(
+        max_workers or len(gateways), thread_name_prefix="gateway-start"
+    ) as executor:
+        futures = [
+            (gateway, executor.submit(gateway.start, flush_input))
+            for gateway in gateways
+        ]
+        for gateway, future in futures:
+            try:
+                future.result()
+            except ProgloveStreamsException as e:
+                errors[gateway.port] = e
+    return errors
@@ -1,16 +1,78 @@
-"""Streams API handler protocol."""
-from dataclasses import dataclass
-from typing import Any, Callable, Dict, Optional
-
-from streams_api.customer_integrations.button_pressed.model import ButtonPressedStream
-from streams_api.customer_integrations.errors.model import ErrorsStream
-from streams_api.customer_integrations.gateway_state_event.model import (
-    GatewayStateEventStream,
+"""Streams API handler protocol.
+
+The Streams API models are imported the first time an event of their type
+is parsed, so that importing the package and handling only some event
+types does not load the models of the others.
+
+"""
+import importlib
+import logging
+import time
+from dataclasses import dataclass, replace
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    Tuple,
+    Type,
+    Union,
 )
-from streams_api.customer_integrations.scan.model import ScanStream
-from streams_api.customer_integrations.scanner_state.model import ScannerStateStream
 
 from proglove_streams.client import Client
+from proglove_streams.dedup import ScanDeduplicator
+from proglove_streams.logging import log_sampled
+from proglove_streams.metrics import Metrics
+from proglove_streams.validation import VALIDATION_FULL, VALIDATION_MODES, parse_event
+
+if TYPE_CHECKING:
+    from streams_api.customer_integrations.button_pressed.model import (
+        ButtonPressedStream,
+    )
+    from streams_api.customer_integrations.errors.model import ErrorsStream
+    from streams_api.customer_integrations.gateway_state_event.model import (
+        GatewayStateEventStream,
+    )
+    from streams_api.customer_integrations.scan.model import ScanStream
+    from streams_api.customer_integrations.scanner_state.model import (
+        ScannerStateStream,
+    )
+
+logger = logging.getLogger(__name__)
+
+# import paths of the models of the Streams API events
+EVENT_MODELS: Dict[str, str] = {
+    "scan": "streams_api.customer_integrations.scan.model:ScanStream",
+    "scanner_state": (
+        "streams_api.customer_integrations.scanner_state.model:ScannerStateStream"
+    ),
+    "errors": "streams_api.customer_integrations.errors.model:ErrorsStream",
+    "gateway_state": (
+        "streams_api.customer_integrations.gateway_state_event.model"
+        ":GatewayStateEventStream"
+    ),
+    "button_pressed": (
+        "streams_api.customer_integrations.button_pressed.model:ButtonPressedStream"
+    ),
+}
+
+
+def load_model(path: str) -> Type[Any]:
+    """Import a model from its ``module:name`` import path."""
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def parse_gateway_state(event: Dict[str, Any]) -> "GatewayStateEventStream":
+    """Parse a ``gateway_state`` event into its model.
+
+    Raises:
+        ValueError: if the event is invalid.
+
+    """
+    return load_model(EVENT_MODELS["gateway_state"]).parse_obj(event)
 
 
 @dataclass
@@ -22,16 +84,269 @@ class Handler:
 
     """
 
-    on_scan: Optional[Callable[[Client, ScanStream], None]] = None
-    on_scanner_connected: Optional[Callable[[Client, ScannerStateStream], None]] = None
+    on_scan: Optional[Callable[[Client, "ScanStream"], None]] = None
+    on_scanner_connected: Optional[
+        Callable[[Client, "ScannerStateStream"], None]
+    ] = None
     on_scanner_disconnected: Optional[
-        Callable[[Client, ScannerStateStream], None]
+        Callable[[Client, "ScannerStateStream"], None]
     ] = None
-    on_error: Optional[Callable[[Client, ErrorsStream], None]] = None
+    on_error: Optional[Callable[[Client, "ErrorsStream"], None]] = None
     on_gateway_state_event: Optional[
-        Callable[[Client, GatewayStateEventStream], None]
+        Callable[[Client, "GatewayStateEventStream"], None]
     ] = None
-    on_button_pressed: Optional[Callable[[Client, ButtonPressedStream], None]] = None
+    on_button_pressed: Optional[Callable[[Client, "ButtonPressedStream"], None]] = None
 
     def handle(self, _client: Client, _event: Dict[str, Any]) -> None:
         """Handle the events."""
+
+
+@dataclass
+class AsyncHandler:
+    """Streams API asynchronous message handler.
+
+    Same as :class:`Handler` but the callbacks are coroutine functions
+    awaited from the event loop servicing the connection.
+
+    """
+
+    on_scan: Optional[Callable[[Client, "ScanStream"], Awaitable[None]]] = None
+    on_scanner_connected: Optional[
+        Callable[[Client, "ScannerStateStream"], Awaitable[None]]
+    ] = None
+    on_scanner_disconnected: Optional[
+        Callable[[Client, "ScannerStateStream"], Awaitable[None]]
+    ] = None
+    on_error: Optional[Callable[[Client, "ErrorsStream"], Awaitable[None]]] = None
+    on_gateway_state_event: Optional[
+        Callable[[Client, "GatewayStateEventStream"], Awaitable[None]]
+    ] = None
+    on_button_pressed: Optional[
+        Callable[[Client, "ButtonPressedStream"], Awaitable[None]]
+    ] = None
+
+    async def handle(self, _client: Client, _event: Dict[str, Any]) -> None:
+        """Handle the events."""
+
+
+@dataclass(frozen=True)
+class EventRoute:
+    """Route of an event type to the callback handling it.
+
+    Attributes:
+        select: Get the callback of a handler for a raw event, or ``None``
+            when the handler does not handle it.
+        model: The model the event is parsed into before calling the
+            callback, or its ``module:name`` import path to import it on
+            first use, or ``None`` to pass the raw event dictionary.
+
+    """
+
+    select: Callable[[Any, Dict[str, Any]], Optional[Callable[..., Any]]]
+    model: Optional[Union[Type[Any], str]] = None
+
+
+def _callback(name: str) -> Callable[[Any, Dict[str, Any]], Any]:
+    return lambda handler, _event: getattr(handler, name)
+
+
+def _scanner_state_callback(handler: Any, event: Dict[str, Any]) -> Any:
+    if event.get("device_connected_state") == "STATE_CONNECTED":
+        return handler.on_scanner_connected
+    return handler.on_scanner_disconnected
+
+
+EVENT_ROUTES: Dict[str, EventRoute] = {
+    "scan": EventRoute(_callback("on_scan"), EVENT_MODELS["scan"]),
+    "scanner_state": EventRoute(_scanner_state_callback, EVENT_MODELS["scanner_state"]),
+    "errors": EventRoute(_callback("on_error"), EVENT_MODELS["errors"]),
+    "gateway_state": EventRoute(
+        _callback("on_gateway_state_event"), EVENT_MODELS["gateway_state"]
+    ),
+    "button_pressed": EventRoute(
+        _callback("on_button_pressed"), EVENT_MODELS["button_pressed"]
+    ),
+}
+
+
+# metric label shared by the event types neither known nor routed
+UNKNOWN_EVENT_TYPE = "unknown"
+
+
+def event_type_label(event: Any, handler: Any = None) -> str:
+    """Get the metric label of the event type of a raw event.
+
+    The event types of the Streams API and the ones routed by the handler,
+    if it is an :class:`EventRouter`, are their own label. The others share
+    the ``unknown`` label, so that a device cannot create unbounded series.
+
+    """
+    event_type = event.get("event_type") if isinstance(event, dict) else None
+    if not isinstance(event_type, str):
+        return UNKNOWN_EVENT_TYPE
+    if event_type in EVENT_ROUTES:
+        return event_type
+    if isinstance(handler, EventRouter) and handler.routes(event_type):
+        return event_type
+    return UNKNOWN_EVENT_TYPE
+
+
+class EventRouter:
+    """Dispatch table routing events to callbacks by their ``event_type``.
+
+    The route of an event is looked up from its raw ``event_type`` before it
+    is parsed, so events without a callback set are dropped without building
+    their model.
+
+    Arguments:
+        validation: The validation mode of the events, see
+            :mod:`proglove_streams.validation`.
+        metrics: The registry recording the validation and callback times
+            per event type, none by default.
+        scan_dedup: Drop the ``scan`` events the de-duplicator finds
+            repeated, by default all the scans are handled.
+
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        validation: str = VALIDATION_FULL,
+        metrics: Optional[Metrics] = None,
+        scan_dedup: Optional[ScanDeduplicator] = None,
+        **kwargs: Any,
+    ):
+        """Initialize the dispatch table with the Streams API events."""
+        if validation not in VALIDATION_MODES:
+            raise ValueError(f"unknown validation mode: {validation}")
+
+        super().__init__(*args, **kwargs)
+        self._routes = dict(EVENT_ROUTES)
+        self._validation = validation
+        self._metrics = metrics
+        self._scan_dedup = scan_dedup
+
+    @property
+    def validation(self) -> str:
+        """Get the validation mode of the events."""
+        return self._validation
+
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        """Get the metrics registry, if any."""
+        return self._metrics
+
+    @property
+    def scan_dedup(self) -> Optional[ScanDeduplicator]:
+        """Get the de-duplicator of the scans, if any."""
+        return self._scan_dedup
+
+    def register(
+        self,
+        event_type: str,
+        callback: Callable[[Client, Any], Any],
+        model: Optional[Type[Any]] = None,
+    ) -> None:
+        """Register a callback for an event type.
+
+        This replaces the route of the event type, if any.
+
+        Arguments:
+            event_type: The ``event_type`` of the events.
+            callback: The callback called with the client and the event.
+            model: The model the event is parsed into, by default the
+                callback receives the raw event dictionary.
+
+        """
+        self._routes[event_type] = EventRoute(lambda _handler, _event: callback, model)
+
+    def unregister(self, event_type: str) -> None:
+        """Remove the route of an event type."""
+        self._routes.pop(event_type, None)
+
+    def routes(self, event_type: str) -> bool:
+        """Tell whether a route is set for an event type."""
+        return event_type in self._routes
+
+    def resolve(
+        self, event: Dict[str, Any]
+    ) -> Optional[Tuple[Callable[..., Any], Any]]:
+        """Find the callback of an event and parse it.
+
+        Arguments:
+            event: The decoded JSON event.
+
+        Returns:
+            The callback and the parsed event, or ``None`` when the event
+            is invalid or no callback is set for it.
+
+        """
+        fields = event if isinstance(event, dict) else None
+        event_type = None if fields is None else fields.get("event_type")
+        if not isinstance(event_type, str):
+            event_type = None
+        log_sampled(
+            logger,
+            logging.DEBUG,
+            event_type,
+            "event received: %s",
+            event,
+            event=fields,
+        )
+
+        if event_type is None:
+            log_sampled(logger, logging.WARNING, None, "event_type field not found")
+            return None
+
+        route = self._routes.get(event_type)
+        if route is None:
+            log_sampled(
+                logger,
+                logging.WARNING,
+                event_type,
+                'could not find a handler for event "%s"',
+                event_type,
+                event=fields,
+            )
+            return None
+
+        callback = route.select(self, event)
+        if callback is None:
+            return None
+
+        if (
+            event_type == "scan"
+            and self._scan_dedup is not None
+            and self._scan_dedup.is_duplicate(event)
+        ):
+            log_sampled(
+                logger, logging.DEBUG, event_type, "scan repeated", event=fields
+            )
+            if self._metrics is not None:
+                self._metrics.counter("scans_suppressed").inc()
+            return None
+
+        model = route.model
+        if model is None:
+            return callback, event
+        if isinstance(model, str):
+            model = load_model(model)
+            self._routes[event_type] = replace(route, model=model)
+
+        metrics = self._metrics
+        start = time.perf_counter() if metrics is not None else 0.0
+        try:
+            return callback, parse_event(model, event, self._validation)
+        except ValueError:
+            return None
+        finally:
+            if metrics is not None:
+                metrics.histogram(
+                    "validation_seconds", event_type=str(event_type)
+                ).observe(time.perf_counter() - start)
+
+    def _observe_callback(self, event: Dict[str, Any], start: float) -> None:
+        if self._metrics is not None:
+            self._metrics.histogram(
+                "callback_seconds", event_type=str(event.get("event_type"))
+            ).observe(time.perf_counter() - start)
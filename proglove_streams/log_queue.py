@@ -0,0 +1,51 @@
+"""Queue handler and listener of the queued logging.
+
+Imported by :func:`proglove_streams.logging.init_logging` only when the
+records are queued, ``logging.handlers`` being slow to import.
+
+"""
+import copy
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue the records without formatting them.
+
+    The standard QueueHandler formats the record in the logging thread. The
+    message is only rendered instead, so that the arguments changed after
+    the call do not change it, and the record is formatted by the listener
+    thread. When the queue is full, the record is dropped and counted.
+
+    """
+
+    def __init__(self, records: "queue.Queue[Any]"):
+        """Initialize the class."""
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Prepare a record for queuing."""
+        # copied, the record is passed to the other handlers as well
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Queue a record, or drop it if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # emit is serialized by the handler lock
+            self.dropped += 1
+
+
+class Listener(QueueListener):
+    """Listener waiting for room in a full queue to stop."""
+
+    def enqueue_sentinel(self) -> None:
+        """Queue the stop sentinel once the queued records are written."""
+        self.queue.put(self._sentinel)  # type: ignore[attr-defined]
@@ -1,20 +1,268 @@
-"""Logging abstraction to facade systemd journal."""
+"""Logging abstraction to facade systemd journal.
+
+The records logged for every event or command go through
+:func:`log_sampled`. With a ``sample_rate``, at most ``sample_rate``
+records per second are emitted for each kind of record and event type,
+the others are counted and reported with the next emitted record.
+
+With ``init_logging(queued=True)`` the records are put in a queue and
+formatted and written by a dedicated thread, so the serial reading thread
+never formats or writes a log record. The queue is bounded: when the
+writing thread falls behind, the records are dropped and counted instead
+of blocking, see :func:`dropped_records`.
+
+With ``init_logging(json_format=True)`` the records are written as JSON
+lines, with the ``device_serial``, ``event_type`` and ``event_id`` fields
+of the event or command the record is about.
+
+"""
+import atexit
+import json
 import logging
+import queue
 import sys
+import time
+from datetime import datetime, timezone
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Dict, Hashable, List, Optional
+
+if TYPE_CHECKING:  # pragma: no cover
+    from proglove_streams.log_queue import DeferredQueueHandler, Listener
+
+_formatter: Optional[logging.Formatter] = None
+
+
+def _colored_formatter() -> logging.Formatter:
+    """Create the colored formatter on first use, colorlog is slow to import."""
+    global _formatter  # pylint: disable=global-statement
+    if _formatter is None:
+        # pylint: disable=import-outside-toplevel
+        from colorlog import ColoredFormatter
+
+        _formatter = ColoredFormatter(
+            "[%(asctime)s]" + " %(log_color)s%(message)s%(reset)s", datefmt="%H:%M:%S"
+        )
+    return _formatter
+
+
+def __getattr__(name: str) -> Any:
+    """Get the lazily created ``FORMATTER``."""
+    if name == "FORMATTER":
+        return _colored_formatter()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# sample rate of the production logging of the example application
+PRODUCTION_SAMPLE_RATE = 10.0
+
+# records buffered for the logging thread before dropping the new ones
+DEFAULT_QUEUE_SIZE = 10000
+
+# fields of an event or command copied to its records
+EVENT_FIELDS = ("device_serial", "event_type", "event_id")
+
+
+class JsonFormatter(logging.Formatter):
+    """Format the records as JSON lines.
+
+    Every line has the ``time``, ``level``, ``logger`` and ``message``
+    fields, the ``device_serial``, ``event_type`` and ``event_id`` fields
+    when the record is about an event or a command, and the ``exception``
+    field when the record has an exception.
+
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a record as a JSON object on a single line."""
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in EVENT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+JSON_FORMATTER = JsonFormatter()
+
+
+class LogSampler:
+    """Rate limit records per key.
+
+    Arguments:
+        rate: The number of records allowed per second and per key, or 0
+            to allow all the records.
+
+    """
+
+    def __init__(self, rate: float = 0.0):
+        """Initialize the class."""
+        self.rate = rate
+        self._windows: Dict[Hashable, List[float]] = {}
+        self._lock = Lock()
+
+    def allow(self, key: Hashable) -> Optional[int]:
+        """Tell whether a record is allowed.
+
+        Returns:
+            ``None`` if the record is suppressed, otherwise the number of
+            records suppressed since the previous allowed one.
 
-from colorlog import ColoredFormatter
+        """
+        if not self.rate:
+            return 0
 
-FORMATTER = ColoredFormatter(
-    "[%(asctime)s]" + " %(log_color)s%(message)s%(reset)s", datefmt="%H:%M:%S"
-)
+        now = time.monotonic()
+        with self._lock:
+            # window start, records allowed and records suppressed
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 1.0:
+                suppressed = 0 if window is None else int(window[2])
+                self._windows[key] = [now, 1, 0]
+                return suppressed
+            if window[1] < self.rate:
+                window[1] += 1
+                suppressed, window[2] = int(window[2]), 0
+                return suppressed
+            window[2] += 1
+            return None
 
 
-def init_logging(logging_level: int = logging.DEBUG) -> None:
-    """Initialize the logging."""
+_sampler = LogSampler()
+
+
+def log_sampled(
+    logger: logging.Logger,
+    level: int,
+    key: Hashable,
+    msg: str,
+    *args: Any,
+    event: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Log a hot path record, sampled per message and key.
+
+    Arguments:
+        logger: The logger of the record.
+        level: The level of the record.
+        key: The key the record is sampled by, like the event type.
+        msg: The message format.
+        args: The message arguments.
+        event: The event or command the record is about, its
+            ``device_serial``, ``event_type`` and ``event_id`` fields are
+            added to the record.
+
+    """
+    if not logger.isEnabledFor(level):
+        return
+
+    suppressed = _sampler.allow((logger.name, msg, key))
+    if suppressed is None:
+        return
+    if suppressed:
+        msg += " (%u similar records suppressed)"
+        args += (suppressed,)
+    if event is None:
+        logger.log(level, msg, *args)
+    else:
+        extra = {name: event.get(name) for name in EVENT_FIELDS}
+        logger.log(level, msg, *args, extra=extra)
+
+
+# the queue listeners and handlers, see proglove_streams.log_queue
+_listeners: List["Listener"] = []
+_queue_handlers: List["DeferredQueueHandler"] = []
+# records dropped by the removed queue handlers
+_dropped = 0
+
+
+# pylint: disable=too-many-arguments
+def init_logging(
+    logging_level: int = logging.DEBUG,
+    queued: bool = False,
+    sample_rate: float = 0.0,
+    json_format: bool = False,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> None:
+    """Initialize the logging.
+
+    Arguments:
+        logging_level: The logging level.
+        queued: Format and write the records from a dedicated thread.
+        sample_rate: The number of hot path records emitted per second
+            for each kind of record, by default all of them.
+        json_format: Write the records as JSON lines.
+        queue_size: The number of queued records before dropping the new
+            ones, or 0 for no limit.
+
+    Raises:
+        ValueError: If the queue size is negative.
+
+    """
+    if queue_size < 0:
+        raise ValueError("the queue size must not be negative")
+
     handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(FORMATTER)
+    handler.setFormatter(JSON_FORMATTER if json_format else _colored_formatter())
     handler.setLevel(logging_level)
 
+    _sampler.rate = sample_rate
+
     logger = logging.getLogger()
     logger.setLevel(logging_level)
-    logger.addHandler(handler)
+
+    if not queued:
+        logger.addHandler(handler)
+        return
+
+    # pylint: disable=import-outside-toplevel
+    from proglove_streams.log_queue import DeferredQueueHandler, Listener
+
+    records: "queue.Queue[Any]" = queue.Queue(queue_size)
+    listener = Listener(records, handler, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    queue_handler = DeferredQueueHandler(records)
+    _queue_handlers.append(queue_handler)
+    logger.addHandler(queue_handler)
+
+
+def dropped_records() -> int:
+    """Get the number of records dropped because the logging queue was full."""
+    return _dropped + sum(handler.dropped for handler in _queue_handlers)
+
+
+def stop_logging() -> None:
+    """Write the queued records and stop the logging threads.
+
+    The queue handlers are removed from the root logger, the records logged
+    afterwards are not queued anymore.
+
+    """
+    global _dropped  # pylint: disable=global-statement
+
+    root = logging.getLogger()
+    dropped = 0
+    while _queue_handlers:
+        queue_handler = _queue_handlers.pop()
+        root.removeHandler(queue_handler)
+        dropped += queue_handler.dropped
+
+    while _listeners:
+        _listeners.pop().stop()
+
+    _dropped += dropped
+    if dropped:
+        sys.stderr.write(f"{dropped} log records dropped, the queue was full\n")
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,292 @@
+"""Runtime metrics module.
+
+A :class:`Metrics` registry collects counters and histograms from the
+Gateway and its handler when it is passed to them: lines and bytes read,
+malformed lines, JSON decoding time, dispatch and callback time per event
+type, commands sent and write latency. Without registry, the only cost on
+the hot path is a ``None`` check.
+
+The metrics are read with :meth:`Metrics.snapshot`, or exposed in the
+Prometheus text format with :meth:`Metrics.prometheus` and
+:meth:`Metrics.serve`.
+
+"""
+import bisect
+import logging
+from dataclasses import dataclass
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "proglove_streams_"
+
+# upper bounds, in seconds, from 10 microseconds to 1 second
+DEFAULT_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+
+HELP = {
+    "bytes_read": "Bytes read from the serial port.",
+    "lines_read": "Lines read from the serial port.",
+    "malformed_lines": "Lines which are not valid JSON.",
+    "events_filtered": "Events dropped by the event filter before decoding.",
+    "decode_seconds": "Time to decode the JSON of a line.",
+    "dispatch_seconds": "Time to handle an event, callback included.",
+    "validation_seconds": "Time to parse an event into its model.",
+    "callback_seconds": "Time spent in the callback of an event.",
+    "commands_sent": "Commands sent to the Gateway.",
+    "bytes_written": "Bytes written to the serial port.",
+    "write_seconds": "Time to write to the serial port.",
+    "reconnects": "Serial port reconnections.",
+    "reconnect_attempts": "Attempts to reopen the serial port.",
+    "reconnect_seconds": "Time to reopen the serial port after a failure.",
+    "commands_reissued": "Pending commands sent again after a reconnection.",
+    "scans_suppressed": "Scans dropped, repeated by their device.",
+    "displays_suppressed": "Display commands not sent, the display being shown.",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+    """Monotonic counter."""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock: Lock):
+        """Initialize the class."""
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, amount: int = 1) -> None:
+        """Increment the counter."""
+        with self._lock:
+            self.value += amount
+
+
+@dataclass
+class HistogramSnapshot:
+    """Snapshot of a :class:`Histogram`.
+
+    Attributes:
+        count: The number of observations.
+        sum: The sum of the observed values.
+        buckets: The number of observations lower or equal to each bucket
+            upper bound.
+
+    """
+
+    count: int
+    sum: float
+    buckets: Dict[float, int]
+
+    @property
+    def mean(self) -> float:
+        """Get the mean observed value."""
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of its bucket."""
+        rank = q * self.count
+        for bound, count in self.buckets.items():
+            if count >= rank:
+                return bound
+        return float("inf")
+
+
+class Histogram:
+    """Distribution of observed values in fixed buckets."""
+
+    __slots__ = ("bounds", "counts", "count", "sum", "_lock")
+
+    def __init__(self, bounds: Sequence[float], lock: Lock):
+        """Initialize the class."""
+        self.bounds = tuple(bounds)
+        # one more bucket for the values above the last bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = lock
+
+    def observe(self, value: float) -> None:
+        """Record a value."""
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> HistogramSnapshot:
+        """Get a snapshot of the histogram."""
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+
+        buckets = {}
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds, counts):
+            cumulative += bucket_count
+            buckets[bound] = cumulative
+        return HistogramSnapshot(count, total, buckets)
+
+
+class Metrics:
+    """Registry of counters and histograms.
+
+    Arguments:
+        buckets: The upper bounds of the histogram buckets, in seconds.
+
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """Initialize the class."""
+        self._buckets = tuple(sorted(buckets))
+        self._lock = Lock()
+        self._counters: Dict[Tuple[str, Labels], Counter] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        """Get a counter, created on first use."""
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter(self._lock))
+        return counter
+
+    def histogram(
+        self, name: str, buckets: Optional[Sequence[float]] = None, **labels: str
+    ) -> Histogram:
+        """Get a histogram, created on first use.
+
+        Arguments:
+            name: The name of the histogram.
+            buckets: The upper bounds of the buckets, by default the ones of
+                the registry. Only used when the histogram is created.
+            labels: The labels of the histogram.
+
+        """
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            bounds = self._buckets if buckets is None else tuple(sorted(buckets))
+            with self._lock:
+                histogram = self._histograms.setdefault(
+                    key, Histogram(bounds, self._lock)
+                )
+        return histogram
+
+    def snapshot(self) -> Dict[str, Union[int, HistogramSnapshot]]:
+        """Get the value of every metric.
+
+        Returns:
+            The values keyed by metric name and labels, for example
+            ``dispatch_seconds{event_type="scan"}``.
+
+        """
+        values: Dict[str, Union[int, HistogramSnapshot]] = {}
+        for (name, labels), counter in list(self._counters.items()):
+            values[name + _format_labels(labels)] = counter.value
+        for (name, labels), histogram in list(self._histograms.items()):
+            values[name + _format_labels(labels)] = histogram.snapshot()
+        return values
+
+    def prometheus(self) -> str:
+        """Format the metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        for name, series in _by_name(self._counters).items():
+            metric = f"{PREFIX}{name}_total"
+            _header(lines, metric, name, "counter")
+            for labels, counter in series:
+                lines.append(f"{metric}{_format_labels(labels)} {counter.value}")
+
+        for name, series in _by_name(self._histograms).items():
+            metric = PREFIX + name
+            _header(lines, metric, name, "histogram")
+            for labels, histogram in series:
+                snapshot = histogram.snapshot()
+                for bound, count in snapshot.buckets.items():
+                    bucket_labels = labels + (("le", repr(bound)),)
+                    lines.append(
+                        f"{metric}_bucket{_format_labels(bucket_labels)} {count}"
+                    )
+                inf_labels = labels + (("le", "+Inf"),)
+                lines.append(
+                    f"{metric}_bucket{_format_labels(inf_labels)} {snapshot.count}"
+                )
+                lines.append(f"{metric}_sum{_format_labels(labels)} {snapshot.sum}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {snapshot.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "") -> "ThreadingHTTPServer":
+        """Serve the metrics over HTTP for Prometheus, from a daemon thread.
+
+        Returns:
+            The HTTP server, to ``shutdown`` once done.
+
+        """
+        # pylint: disable=import-outside-toplevel
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class _MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args: Any) -> None:
+                pass
+
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        logger.info("serve the metrics on port %u", server.server_address[1])
+        return server
+
+
+def _by_name(metrics: Dict[Tuple[str, Labels], Any]) -> Dict[str, List[Any]]:
+    by_name: Dict[str, List[Any]] = {}
+    for (name, labels), metric in sorted(list(metrics.items())):
+        by_name.setdefault(name, []).append((labels, metric))
+    return by_name
+
+
+def _header(lines: List[str], metric: str, name: str, metric_type: str) -> None:
+    if name in HELP:
+        lines.append(f"# HELP {metric} {HELP[name]}")
+    lines.append(f"# TYPE {metric} {metric_type}")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
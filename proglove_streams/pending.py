@@ -0,0 +1,378 @@
+"""Pending commands module.
+
+The commands sent to a Gateway are correlated with the events replying to
+them through a :class:`PendingRequests` index keyed on the ``event_id`` of
+the commands:
+
+- an ``errors`` event fails the command its ``event_reference_id`` refers
+  to with a :class:`~proglove_streams.exception.CommandError`,
+- a ``gateway_state`` event resolves the pending ``gateway_state!``
+  commands with the Gateway state.
+
+The other commands have no success reply: their future resolves with
+``None`` once the timeout expired without error. A ``gateway_state!``
+command without reply fails with :class:`TimeoutError`. The pending commands
+are cancelled when the Gateway stops.
+
+While the Gateway reconnects, the index is suspended: the commands do not
+expire, and :meth:`PendingRequests.resume` returns the commands to send
+again once reconnected: the ones queued while disconnected or whose write
+failed, not the ones already delivered.
+
+"""
+import heapq
+import itertools
+import logging
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple
+
+from proglove_streams.exception import CommandError
+
+logger = logging.getLogger(__name__)
+
+# maximum time between two checks of the command timeouts
+EXPIRE_INTERVAL = 0.1
+
+
+class _Future(Protocol):
+    """Future API shared by the concurrent and asyncio futures."""
+
+    def done(self) -> bool:
+        """Tell whether the future is done."""
+
+    def set_result(self, result: Any) -> None:
+        """Resolve the future."""
+
+    def set_exception(self, exception: BaseException) -> None:
+        """Fail the future."""
+
+    def cancel(self) -> bool:
+        """Cancel the future."""
+
+
+class _Pending:
+    """Pending command."""
+
+    __slots__ = (
+        "future",
+        "event_type",
+        "deadline",
+        "succeed_on_timeout",
+        "data",
+        "device_serial",
+    )
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        future: _Future,
+        event_type: str,
+        deadline: float,
+        succeed_on_timeout: bool,
+        data: Optional[bytes],
+        device_serial: Optional[str],
+    ):
+        self.future = future
+        self.event_type = event_type
+        self.deadline = deadline
+        self.succeed_on_timeout = succeed_on_timeout
+        self.data = data
+        self.device_serial = device_serial
+
+
+class PendingRequests:
+    """Index of the commands waiting for a reply.
+
+    Arguments:
+        timeout: The default time, in seconds, to wait for a reply.
+        max_pending: The maximum number of pending commands. When it is
+            reached, the oldest command expires.
+
+    """
+
+    def __init__(self, timeout: float = 5.0, max_pending: int = 10000):
+        """Initialize the class."""
+        self._timeout = timeout
+        self._max_pending = max_pending
+        self._pending: Dict[str, _Pending] = {}
+        self._by_type: Dict[str, Dict[str, None]] = {}
+        self._deadlines: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+        self._lock = Lock()
+        self._suspended = False
+        self.expired = 0
+
+    def __len__(self) -> int:
+        """Get the number of pending commands."""
+        return len(self._pending)
+
+    def __contains__(self, event_id: object) -> bool:
+        """Tell whether a command is pending."""
+        return event_id in self._pending
+
+    # pylint: disable=too-many-arguments
+    def add(
+        self,
+        event_id: str,
+        event_type: str,
+        future: _Future,
+        succeed_on_timeout: bool,
+        timeout: Optional[float] = None,
+        data: Optional[bytes] = None,
+        device_serial: Optional[str] = None,
+    ) -> None:
+        """Add a pending command.
+
+        Arguments:
+            event_id: The event ID of the command.
+            event_type: The event type of the command.
+            future: The future resolved by the reply.
+            succeed_on_timeout: Resolve the future with ``None`` instead of
+                failing it when the timeout expires.
+            timeout: The time to wait for a reply, by default the timeout of
+                the index.
+            data: The encoded command, sent again by :meth:`resume` unless
+                :meth:`delivered` is called first.
+            device_serial: The device the command is sent to, if any.
+
+        """
+        self.expire()
+
+        deadline = time.monotonic() + (self._timeout if timeout is None else timeout)
+        with self._lock:
+            evicted = []
+            while self._pending and len(self._pending) >= self._max_pending:
+                evicted.append(self._pop(next(iter(self._pending))))
+
+            self._pending[event_id] = _Pending(
+                future, event_type, deadline, succeed_on_timeout, data, device_serial
+            )
+            self._by_type.setdefault(event_type, {})[event_id] = None
+            heapq.heappush(self._deadlines, (deadline, next(self._sequence), event_id))
+
+            # drop the deadlines of the commands resolved in the meantime
+            if len(self._deadlines) > 2 * len(self._pending) + 64:
+                self._deadlines = [
+                    entry
+                    for entry in self._deadlines
+                    if entry[2] in self._pending
+                    and self._pending[entry[2]].deadline == entry[0]
+                ]
+                heapq.heapify(self._deadlines)
+
+        self._expire_all(evicted)
+
+    def delivered(self, event_id: str) -> None:
+        """Forget the encoded command once written, not to send it again."""
+        with self._lock:
+            pending = self._pending.get(event_id)
+            if pending is not None:
+                pending.data = None
+
+    def device_serial(self, event_id: str) -> Optional[str]:
+        """Get the device a pending command is sent to, if any."""
+        with self._lock:
+            pending = self._pending.get(event_id)
+            return pending.device_serial if pending is not None else None
+
+    def discard(self, event_id: str) -> None:
+        """Remove a pending command without resolving it."""
+        with self._lock:
+            if event_id in self._pending:
+                self._pop(event_id)
+
+    def resolve(self, event_id: str, result: Any = None) -> bool:
+        """Resolve a pending command.
+
+        Returns:
+            ``False`` if the command is not pending.
+
+        """
+        with self._lock:
+            if event_id not in self._pending:
+                return False
+            pending = self._pop(event_id)
+
+        _set_result(pending.future, result)
+        return True
+
+    def resolve_event_type(self, event_type: str, result: Any = None) -> int:
+        """Resolve all the pending commands of an event type.
+
+        Returns:
+            The number of resolved commands.
+
+        """
+        with self._lock:
+            event_ids = list(self._by_type.get(event_type, ()))
+            resolved = [self._pop(event_id) for event_id in event_ids]
+
+        for pending in resolved:
+            _set_result(pending.future, result)
+        return len(resolved)
+
+    def fail(self, event_id: str, exception: BaseException) -> bool:
+        """Fail a pending command.
+
+        Returns:
+            ``False`` if the command is not pending.
+
+        """
+        with self._lock:
+            if event_id not in self._pending:
+                return False
+            pending = self._pop(event_id)
+
+        _set_exception(pending.future, exception)
+        return True
+
+    def fail_all(self, exception: BaseException) -> None:
+        """Fail all the pending commands."""
+        with self._lock:
+            self._suspended = False
+            failed = [self._pop(event_id) for event_id in list(self._pending)]
+
+        for pending in failed:
+            _set_exception(pending.future, exception)
+
+    def correlate(
+        self, event: Any, parse_state: Callable[[Dict[str, Any]], Any]
+    ) -> None:
+        """Resolve or fail the pending commands a received event replies to.
+
+        Arguments:
+            event: The raw received event.
+            parse_state: Parse a ``gateway_state`` event into the result of
+                the ``gateway_state!`` commands.
+
+        """
+        if not self._pending or not isinstance(event, dict):
+            return
+
+        event_type = event.get("event_type")
+        if event_type == "errors":
+            event_id = event.get("event_reference_id")
+            if isinstance(event_id, str):
+                self.fail(event_id, CommandError(event))
+        elif event_type == "gateway_state" and "gateway_state!" in self._by_type:
+            try:
+                state = parse_state(event)
+            except ValueError as e:
+                logger.debug("invalid Gateway state reply: %s", e)
+                return
+            self.resolve_event_type("gateway_state!", state)
+
+    def cancel_all(self) -> None:
+        """Cancel all the pending commands."""
+        with self._lock:
+            self._suspended = False
+            cancelled = [self._pop(event_id) for event_id in list(self._pending)]
+
+        for pending in cancelled:
+            pending.future.cancel()
+
+    def suspend(self) -> None:
+        """Stop expiring the commands until :meth:`resume`."""
+        self._suspended = True
+
+    def resume(self) -> Dict[str, bytes]:
+        """Restart the timeout of the pending commands.
+
+        Returns:
+            The encoded pending commands not delivered, by event ID, in the
+            order they were added.
+
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._suspended = False
+            resent = {}
+            for event_id, pending in self._pending.items():
+                pending.deadline = now + self._timeout
+                heapq.heappush(
+                    self._deadlines, (pending.deadline, next(self._sequence), event_id)
+                )
+                if pending.data is not None:
+                    resent[event_id] = pending.data
+        return resent
+
+    def expire(self) -> int:
+        """Expire the commands whose timeout elapsed.
+
+        Returns:
+            The number of expired commands.
+
+        """
+        if self._suspended:
+            return 0
+
+        now = time.monotonic()
+        try:
+            # unlocked peek, the commands are mostly resolved before expiring
+            if self._deadlines[0][0] > now:
+                return 0
+        except IndexError:
+            return 0
+
+        with self._lock:
+            expired = []
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline, _, event_id = heapq.heappop(self._deadlines)
+                pending = self._pending.get(event_id)
+                if pending is not None and pending.deadline == deadline:
+                    expired.append(self._pop(event_id))
+
+        self._expire_all(expired)
+        return len(expired)
+
+    def next_deadline(self) -> Optional[float]:
+        """Get the time the next pending command expires.
+
+        Returns:
+            The deadline, on the :func:`time.monotonic` clock, or ``None`` if
+            no command is pending or the index is suspended.
+
+        """
+        if self._suspended:
+            return None
+
+        with self._lock:
+            deadlines = self._deadlines
+            while deadlines:
+                deadline, _, event_id = deadlines[0]
+                pending = self._pending.get(event_id)
+                if pending is not None and pending.deadline == deadline:
+                    return deadline
+                # resolved in the meantime
+                heapq.heappop(deadlines)
+        return None
+
+    def _expire_all(self, expired: List[_Pending]) -> None:
+        for pending in expired:
+            self.expired += 1
+            if pending.succeed_on_timeout:
+                _set_result(pending.future, None)
+            else:
+                _set_exception(
+                    pending.future,
+                    TimeoutError(f"no reply to the {pending.event_type} command"),
+                )
+
+    def _pop(self, event_id: str) -> _Pending:
+        pending = self._pending.pop(event_id)
+        same_type = self._by_type[pending.event_type]
+        del same_type[event_id]
+        if not same_type:
+            del self._by_type[pending.event_type]
+        return pending
+
+
+def _set_result(future: _Future, result: Any) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: _Future, exception: BaseException) -> None:
+    if not future.done():
+        future.set_exception(exception)
@@ -0,0 +1,280 @@
+"""Gateway pool module.
+
+A :class:`GatewayPool` services many Gateways from a single thread: the file
+descriptors of all serial ports are registered with one ``selectors``
+selector (epoll on Linux) and the received lines are dispatched, per port, to
+a shared handler. Each port is exposed as a regular :class:`Gateway` so the
+handler callbacks can send commands back to the Gateway an event came from.
+
+"""
+import logging
+import os
+import selectors
+import time
+from dataclasses import dataclass, replace
+from threading import Lock, Thread
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from proglove_streams.codec import Codec, get_codec
+from proglove_streams.exception import ProgloveStreamsException
+from proglove_streams.framing import LineFramer
+from proglove_streams.gateway import Gateway
+from proglove_streams.handler import Handler
+from proglove_streams.metrics import Metrics
+from proglove_streams.pending import EXPIRE_INTERVAL
+from proglove_streams.workers import WorkerDispatcher
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PortHealth:
+    """Health of a serial port serviced by a :class:`GatewayPool`."""
+
+    port: str
+    connected: bool = False
+    bytes_read: int = 0
+    lines_read: int = 0
+    malformed_lines: int = 0
+    last_event_time: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class _PortState:
+    """Per port bookkeeping of the pool loop."""
+
+    def __init__(self, gateway: Gateway):
+        self.gateway = gateway
+        self.framer = LineFramer()
+        self.health = PortHealth(gateway.port)
+        # the file descriptor registered with the selector
+        self.fd: Optional[int] = None
+
+
+class GatewayPool:
+    """Service several Gateways from one selector loop.
+
+    Arguments:
+        handler: The handler shared by all the Gateways.
+        ports: The serial port paths of the Gateways.
+        baudrate: The baudrate used for all the serial ports.
+        codec: The JSON codec, by default the fastest one installed.
+        dispatcher: The worker threads running the handler, by default the
+            handler runs on the pool thread.
+        coalesce_writes: Write the commands of each Gateway from a dedicated
+            thread, see :class:`Gateway`.
+        command_timeout: The time, in seconds, to wait for the reply to a
+            command, see :class:`Gateway`.
+        metrics: The registry recording the metrics of all the Gateways,
+            none by default.
+
+    """
+
+    def __init__(
+        self,
+        handler: Handler,
+        ports: Iterable[str],
+        baudrate: int = 115200,
+        codec: Optional[Codec] = None,
+        dispatcher: Optional[WorkerDispatcher] = None,
+        coalesce_writes: bool = False,
+        command_timeout: float = 5.0,
+        metrics: Optional[Metrics] = None,
+    ):
+        """Initialize the class."""
+        codec = codec or get_codec()
+        self._states = {
+            port: _PortState(
+                Gateway(
+                    handler,
+                    port,
+                    baudrate,
+                    codec,
+                    dispatcher,
+                    coalesce_writes,
+                    command_timeout,
+                    metrics,
+                )
+            )
+            for port in ports
+        }
+        self._dispatcher = dispatcher
+        self._metrics = metrics
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._loop_thread: Optional[Thread] = None
+        self._wakeup_r: Optional[int] = None
+        self._wakeup_w: Optional[int] = None
+        self._lock = Lock()
+
+    def __getitem__(self, port: str) -> Gateway:
+        """Get the Gateway servicing a port."""
+        return self._states[port].gateway
+
+    def __iter__(self) -> Iterator[Gateway]:
+        """Iterate over the Gateways of the pool."""
+        return (state.gateway for state in self._states.values())
+
+    def __len__(self) -> int:
+        """Get the number of Gateways of the pool."""
+        return len(self._states)
+
+    @property
+    def is_running(self) -> bool:
+        """Tell whether the pool loop is running."""
+        return self._loop_thread is not None
+
+    def start(self, flush_input: bool = True) -> None:
+        """Open all the serial ports and start the pool loop.
+
+        Ports that cannot be opened are reported in :meth:`health`, an
+        exception is only raised when none of them could be opened.
+
+        """
+        if self.is_running:
+            return
+
+        logger.info("start the Gateway pool (%u ports)", len(self._states))
+
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+        for state in self._states.values():
+            try:
+                state.gateway.open(flush_input)
+            except ProgloveStreamsException as e:
+                self._set_error(state, str(e))
+                continue
+
+            self._register(state)
+
+        if not any(state.health.connected for state in self._states.values()):
+            self._close()
+            raise ProgloveStreamsException("could not open any serial port")
+
+        if self._dispatcher is not None:
+            self._dispatcher.start()
+
+        logger.debug("start the pool thread")
+        self._loop_thread = Thread(target=self._loop, daemon=True)
+        self._loop_thread.start()
+        logger.info("Gateway pool started")
+
+    def stop(self) -> None:
+        """Stop the pool loop and close all the serial ports."""
+        logger.info("stop the Gateway pool")
+
+        if self._loop_thread is not None:
+            logger.debug("stop the pool thread")
+            if self._wakeup_w is not None:
+                os.write(self._wakeup_w, b"\0")
+            self._loop_thread.join()
+            self._loop_thread = None
+
+        if self._dispatcher is not None:
+            self._dispatcher.stop()
+
+        self._close()
+
+    def health(self) -> Dict[str, PortHealth]:
+        """Get a snapshot of the health of every port."""
+        with self._lock:
+            return {port: replace(state.health) for port, state in self._states.items()}
+
+    def _register(self, state: _PortState) -> None:
+        if self._selector is None:
+            return
+
+        state.fd = state.gateway.fileno()
+        self._selector.register(state.fd, selectors.EVENT_READ, state)
+        with self._lock:
+            state.health.connected = True
+            state.health.last_error = None
+
+    def _set_error(self, state: _PortState, error: str) -> None:
+        logger.error("port %s: %s", state.gateway.port, error)
+        with self._lock:
+            state.health.connected = False
+            state.health.last_error = error
+
+    def _disconnect(self, state: _PortState, error: str) -> None:
+        if state.fd is not None and self._selector is not None:
+            self._selector.unregister(state.fd)
+        state.fd = None
+        state.gateway.close()
+        state.gateway.fail_pending(ProgloveStreamsException(error))
+        state.framer.clear()
+        self._set_error(state, error)
+
+    def _close(self) -> None:
+        for state in self._states.values():
+            state.fd = None
+            state.gateway.close()
+            state.gateway.cancel_pending()
+            with self._lock:
+                state.health.connected = False
+            state.framer.clear()
+
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+
+        for fd in (self._wakeup_r, self._wakeup_w):
+            if fd is not None:
+                os.close(fd)
+        self._wakeup_r = self._wakeup_w = None
+
+    def _loop(self) -> None:
+        selector = self._selector
+        if selector is None:
+            return
+
+        while True:
+            for key, _ in selector.select(EXPIRE_INTERVAL):
+                if key.data is None:
+                    return
+                self._read(key.data)
+
+            for state in self._states.values():
+                state.gateway.expire_pending()
+
+    def _read(self, state: _PortState) -> None:
+        try:
+            data = state.gateway.read()
+        except ProgloveStreamsException as e:
+            self._disconnect(state, str(e))
+            return
+
+        if self._metrics is not None:
+            self._metrics.counter("bytes_read").inc(len(data))
+
+        lines = 0
+        malformed = 0
+        for line in state.framer.feed(data):
+            lines += 1
+            if not self._dispatch(state, line):
+                malformed += 1
+
+        with self._lock:
+            state.health.bytes_read += len(data)
+            state.health.lines_read += lines
+            state.health.malformed_lines += malformed
+            if lines:
+                state.health.last_event_time = time.time()
+
+    @staticmethod
+    def _dispatch(state: _PortState, line: bytes) -> bool:
+        try:
+            return state.gateway.feed(line)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("handler failed on port %s", state.gateway.port)
+            return True
+
+    def __enter__(self) -> "GatewayPool":
+        """Use context manager."""
+        self.start()
+        return self
+
+    def __exit__(self, _exc_type: Any, _exc_val: Any, _exc_tb: Any) -> None:
+        """Close context manager."""
+        self.stop()
@@ -0,0 +1,90 @@
+"""Reconnection module.
+
+A Gateway given a :class:`ReconnectPolicy` reopens its serial port when
+reading fails instead of stopping, waiting longer after every failed
+attempt. A Gateway plugged again may show up on another port, like
+``/dev/ttyACM1`` instead of ``/dev/ttyACM0``: the port is looked up again
+by the USB serial number of the Gateway before each attempt.
+
+"""
+import logging
+import random
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ReconnectPolicy:
+    """Exponential backoff between the reconnection attempts.
+
+    Attributes:
+        initial_delay: The time, in seconds, before the first attempt.
+        max_delay: The maximum time between two attempts.
+        multiplier: The factor applied to the delay after every attempt.
+        jitter: The maximum relative deviation from the delay, spreading
+            the attempts of many Gateways.
+        max_attempts: The number of attempts before giving up, by default
+            no limit.
+
+    """
+
+    initial_delay: float = 0.1
+    max_delay: float = 10.0
+    multiplier: float = 2.0
+    jitter: float = 0.1
+    max_attempts: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        """Check the policy."""
+        if self.initial_delay < 0 or self.max_delay < self.initial_delay:
+            raise ValueError("the delays must be positive and ordered")
+        if self.multiplier < 1:
+            raise ValueError("the multiplier must be at least 1")
+        if not 0 <= self.jitter < 1:
+            raise ValueError("the jitter must be between 0 and 1")
+
+    def delay(self, attempt: int) -> float:
+        """Get the time to wait before an attempt, counted from 0."""
+        # the exponent is bounded, the delay is capped long before
+        exponent = min(attempt, 64)
+        delay = min(self.initial_delay * self.multiplier**exponent, self.max_delay)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+def port_serial_number(port: str) -> Optional[str]:
+    """Get the USB serial number of the device behind a serial port.
+
+    Returns:
+        The serial number, or ``None`` if the port is not a USB device.
+
+    """
+    for info in _comports():
+        if info.device == port:
+            return info.serial_number
+    return None
+
+
+def find_port(serial_number: str) -> Optional[str]:
+    """Find the serial port of a USB device.
+
+    Arguments:
+        serial_number: The USB serial number of the device.
+
+    Returns:
+        The serial port path, or ``None`` if the device is not plugged.
+
+    """
+    for info in _comports():
+        if info.serial_number == serial_number:
+            return info.device
+    return None
+
+
+def _comports() -> List[Any]:
+    # only imported when reconnecting, the port enumeration is slow to import
+    # pylint: disable=import-outside-toplevel
+    from serial.tools.list_ports import comports
+
+    return list(comports())
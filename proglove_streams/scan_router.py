@@ -0,0 +1,204 @@
+"""Routing of the scans to callbacks by their scan code.
+
+A :class:`ScanRouter` is registered as the ``on_scan`` callback and calls
+the callback of the first rule matching the scan code, looked up in this
+order:
+
+- the exact scan codes, in a dictionary,
+- the longest matching prefix, in a trie walked once along the code,
+- the regular expressions, in the order they were added, combined into a
+  single alternation matched once,
+- the default callback.
+
+A regular expression which cannot be combined with the previous ones, such
+as one reusing a group name, is matched on its own, after the previous
+ones and before the next ones.
+
+The rules are compiled on the first scan routed after a change, so the
+routing does not depend on the number of rules but on the length of the
+scan code.
+
+"""
+import logging
+import re
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Pattern, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+ScanCallback = Callable[[Any, Any], Any]
+
+_FLAGS = (
+    (re.ASCII, "a"),
+    (re.IGNORECASE, "i"),
+    (re.MULTILINE, "m"),
+    (re.DOTALL, "s"),
+    (re.VERBOSE, "x"),
+)
+
+# inline flags at the start of a pattern, applying to the whole pattern
+_GLOBAL_FLAGS = re.compile(r"(?:\(\?[aiLmsux]+\))+")
+
+# key of the callback of a trie node, the other keys being characters
+_CALLBACK = ""
+
+
+def _alternative(compiled: Pattern[str]) -> Optional[str]:
+    """Wrap a pattern in a group to combine it with others, if it can be."""
+    pattern = compiled.pattern
+    match = _GLOBAL_FLAGS.match(pattern)
+    if match is not None:
+        pattern = pattern[match.end() :]
+
+    # the flags of a pattern only apply to its alternative
+    flags = "".join(letter for flag, letter in _FLAGS if compiled.flags & flag)
+    if flags:
+        pattern = f"(?{flags}:{pattern})"
+    alternative = f"({pattern})"
+
+    try:
+        re.compile(alternative)
+    except re.error:
+        return None
+    return alternative
+
+
+class ScanRouter:
+    """Dispatcher of the scans to callbacks by their scan code.
+
+    Arguments:
+        default: The callback of the scans matching no rule, by default
+            they are ignored.
+        terminator: The scan code is cut at the first occurrence of it,
+            ``None`` keeping the whole code.
+
+    """
+
+    def __init__(
+        self, default: Optional[ScanCallback] = None, terminator: Optional[str] = "\r"
+    ):
+        """Initialize the class."""
+        self._default = default
+        self._terminator = terminator
+        self._exact: Dict[str, ScanCallback] = {}
+        self._trie: Dict[str, Any] = {}
+        self._patterns: List[Tuple[Pattern[str], Optional[str], ScanCallback]] = []
+        self._lock = Lock()
+        # the patterns matched in turn, with the callbacks by group number
+        self._combined: List[Tuple[Pattern[str], Dict[int, ScanCallback]]] = []
+        self._compiled = True
+
+    def exact(self, scan_code: str, callback: ScanCallback) -> None:
+        """Route a scan code to a callback, replacing its previous route."""
+        self._exact[scan_code] = callback
+
+    def prefix(self, prefix: str, callback: ScanCallback) -> None:
+        """Route the scan codes starting with a prefix to a callback.
+
+        The longest prefix matching a scan code wins.
+
+        """
+        if not prefix:
+            raise ValueError("the prefix must not be empty, use the default")
+
+        with self._lock:
+            node = self._trie
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node[_CALLBACK] = callback
+
+    def pattern(
+        self, pattern: Union[str, Pattern[str]], callback: ScanCallback
+    ) -> None:
+        """Route the scan codes fully matching a regular expression.
+
+        The patterns are tried in the order they were added. They must not
+        refer to their groups by number, the groups being renumbered once
+        combined.
+
+        Raises:
+            re.error: If the pattern is not a valid regular expression.
+
+        """
+        compiled = re.compile(pattern)
+        alternative = _alternative(compiled)
+        if alternative is None:
+            logger.debug("pattern %r matched on its own", compiled.pattern)
+        with self._lock:
+            self._patterns.append((compiled, alternative, callback))
+            self._compiled = False
+
+    def route(self, scan_code: str) -> Optional[ScanCallback]:
+        """Get the callback of a scan code, if any."""
+        if self._terminator is not None:
+            scan_code = scan_code.split(self._terminator, 1)[0]
+
+        callback = self._exact.get(scan_code)
+        if callback is not None:
+            return callback
+
+        node = self._trie
+        for char in scan_code:
+            child = node.get(char)
+            if child is None:
+                break
+            node = child
+            callback = node.get(_CALLBACK, callback)
+        if callback is not None:
+            return callback
+
+        if not self._compiled:
+            self._compile()
+        for combined, group_callbacks in self._combined:
+            match = combined.fullmatch(scan_code)
+            if match is not None:
+                return group_callbacks[match.lastindex or 0]
+
+        return self._default
+
+    def __call__(self, client: Any, event: Any) -> Any:
+        """Call the callback of a scan event, as the ``on_scan`` callback."""
+        scan_code = (
+            event.get("scan_code")
+            if isinstance(event, dict)
+            else getattr(event, "scan_code", None)
+        )
+        callback = (
+            self.route(str(scan_code)) if scan_code is not None else self._default
+        )
+        return None if callback is None else callback(client, event)
+
+    def _compile(self) -> None:
+        with self._lock:
+            combined: List[Tuple[Pattern[str], Dict[int, ScanCallback]]] = []
+            # each pattern is wrapped in a group, whose number identifies it
+            alternatives: List[str] = []
+            group_callbacks: Dict[int, ScanCallback] = {}
+            group_names: Set[str] = set()
+            group = 1
+            for compiled, alternative, callback in self._patterns:
+                names = set(compiled.groupindex)
+                if alternatives and (
+                    alternative is None or not names.isdisjoint(group_names)
+                ):
+                    combined.append(
+                        (re.compile("|".join(alternatives)), group_callbacks)
+                    )
+                    alternatives, group_callbacks, group_names = [], {}, set()
+                    group = 1
+
+                if alternative is None:
+                    # matched alone, whatever its last group
+                    callbacks = dict.fromkeys(range(compiled.groups + 1), callback)
+                    combined.append((compiled, callbacks))
+                    continue
+
+                alternatives.append(alternative)
+                group_callbacks[group] = callback
+                group_names |= names
+                group += compiled.groups + 1
+
+            if alternatives:
+                combined.append((re.compile("|".join(alternatives)), group_callbacks))
+            self._combined = combined
+            self._compiled = True
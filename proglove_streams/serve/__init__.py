@@ -0,0 +1,6 @@
+"""Fan-out server sharing one Gateway with many local subscribers.
+
+Run it with ``python -m proglove_streams.serve`` and connect the
+subscribers to the printed addresses.
+
+"""
@@ -0,0 +1,95 @@
+"""Fan-out server entry point."""
+import argparse
+import logging
+import platform
+import time
+
+from proglove_streams.exception import ProgloveStreamsException
+from proglove_streams.logging import init_logging
+from proglove_streams.reconnect import ReconnectPolicy
+from proglove_streams.serve.server import DEFAULT_BUFFER_SIZE, FanOutServer
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    """Run the fan-out server."""
+    parser = argparse.ArgumentParser(
+        "proglove_streams.serve",
+        description="share a Streams API Gateway with many subscribers",
+    )
+    parser.add_argument(
+        "-L",
+        "--logging-level",
+        help="set the logging level (default is INFO)",
+        metavar="LEVEL",
+        choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+        default="INFO",
+    )
+    parser.add_argument(
+        "-p",
+        "--port",
+        help="set the serial port of the Gateway",
+        default="COM1" if platform.system() == "Windows" else "/dev/ttyACM0",
+    )
+    parser.add_argument(
+        "-b", "--baudrate", type=int, default=115200, help="set the baudrate"
+    )
+    parser.add_argument(
+        "--tcp",
+        metavar="HOST:PORT",
+        help="listen on a TCP socket (default is localhost:7000 without --unix)",
+    )
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket")
+    parser.add_argument(
+        "--buffer-size",
+        type=int,
+        default=DEFAULT_BUFFER_SIZE // 1024,
+        help="KiB buffered for a subscriber before disconnecting it",
+    )
+    parser.add_argument(
+        "--report-interval", type=float, default=60, help="seconds between reports"
+    )
+    args = parser.parse_args()
+
+    init_logging(getattr(logging, args.logging_level))
+
+    tcp = None
+    if args.tcp or not args.unix:
+        host, _, port = (args.tcp or "localhost:7000").rpartition(":")
+        tcp = (host or "localhost", int(port))
+
+    server = FanOutServer(
+        args.port,
+        tcp=tcp,
+        unix=args.unix,
+        buffer_size=args.buffer_size * 1024,
+        baudrate=args.baudrate,
+        reconnect=ReconnectPolicy(),
+    )
+
+    try:
+        server.start()
+    except ProgloveStreamsException as e:
+        logger.error("%s", e)
+        return
+
+    # printed rather than logged, to be usable from scripts
+    for address in server.addresses:
+        print(address if isinstance(address, str) else "%s:%u" % address, flush=True)
+    logger.info("serving the Gateway, press Ctrl-C to exit")
+
+    try:
+        while server.gateway.is_running:
+            time.sleep(args.report_interval)
+            logger.info("serve: %s", server.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+    logger.info("serve: %s", server.stats())
+
+
+if __name__ == "__main__":
+    main()
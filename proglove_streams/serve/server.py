@@ -0,0 +1,443 @@
+"""Fan-out of the events of one Gateway to many subscribers.
+
+A :class:`FanOutServer` owns the serial port of a Gateway and listens on
+TCP and Unix sockets. Every received event is serialized once, as a JSON
+line, and sent to all the connected subscribers. A subscriber sends
+commands as JSON lines, which are multiplexed onto the serial port of the
+Gateway; the replies are events sent to all the subscribers.
+
+The events are sent from the thread reading the serial port without
+blocking it: what a subscriber cannot receive at once is buffered, and a
+subscriber whose buffer exceeds ``buffer_size`` is disconnected.
+
+"""
+import logging
+import os
+import selectors
+import socket
+import stat
+import time
+import uuid
+from dataclasses import dataclass, replace
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from proglove_streams.client import Client
+from proglove_streams.codec import Codec, get_codec
+from proglove_streams.exception import ProgloveStreamsException
+from proglove_streams.framing import LineFramer
+from proglove_streams.gateway import Gateway
+from proglove_streams.handler import Handler
+
+logger = logging.getLogger(__name__)
+
+# bytes buffered for a subscriber before disconnecting it
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+READ_SIZE = 64 * 1024
+
+
+@dataclass
+class ServeStats:
+    """Counters of a :class:`FanOutServer`.
+
+    Attributes:
+        subscribers: The number of connected subscribers.
+        connections: The number of subscriber connections accepted.
+        events: The number of events sent to the subscribers.
+        bytes_sent: The number of bytes sent to the subscribers.
+        evictions: The number of subscribers disconnected for being slow.
+        commands: The number of commands sent to the Gateway.
+        malformed_commands: The number of invalid command lines received.
+
+    """
+
+    subscribers: int = 0
+    connections: int = 0
+    events: int = 0
+    bytes_sent: int = 0
+    evictions: int = 0
+    commands: int = 0
+    malformed_commands: int = 0
+
+
+class _Subscriber:
+    """Connection of a subscriber."""
+
+    __slots__ = ("sock", "name", "output", "framer", "writing", "closed")
+
+    def __init__(self, sock: socket.socket, name: str):
+        self.sock = sock
+        self.name = name
+        self.output = bytearray()
+        self.framer = LineFramer()
+        self.writing = False
+        # disconnected, the socket being closed by the server thread
+        self.closed = False
+
+
+class _FanOutHandler(Handler):
+    """Handler publishing the raw events to the subscribers."""
+
+    def __init__(self, server: "FanOutServer"):
+        super().__init__()
+        self._server = server
+
+    def handle(self, _client: Client, event: Dict[str, Any]) -> None:
+        """Publish an event."""
+        self._server.publish(event)
+
+
+# pylint: disable=too-many-instance-attributes
+class FanOutServer:
+    """Share the events and the serial port of a Gateway.
+
+    Arguments:
+        port: The serial port of the Gateway, or a pyserial URL.
+        tcp: The address of the TCP socket to listen on, as ``(host,
+            port)``, port 0 picking a free one.
+        unix: The path of the Unix socket to listen on.
+        buffer_size: The number of bytes buffered for a subscriber before
+            disconnecting it.
+        codec: The JSON codec, by default the fastest one installed.
+        gateway_options: The other arguments of the :class:`Gateway`.
+
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        port: str,
+        tcp: Optional[Tuple[str, int]] = None,
+        unix: Optional[str] = None,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        codec: Optional[Codec] = None,
+        **gateway_options: Any,
+    ):
+        """Initialize the class."""
+        if tcp is None and unix is None:
+            raise ValueError("a TCP address or a Unix socket path is required")
+        if buffer_size <= 0:
+            raise ValueError("the buffer size must be positive")
+
+        self._tcp = tcp
+        self._unix = unix
+        self._buffer_size = buffer_size
+        self._codec = codec or get_codec()
+        self._gateway = Gateway(
+            _FanOutHandler(self), port, codec=self._codec, **gateway_options
+        )
+
+        self._lock = Lock()
+        self._subscribers: Dict[socket.socket, _Subscriber] = {}
+        self._evicted: List[_Subscriber] = []
+        self._listeners: List[socket.socket] = []
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._wakeup_r = -1
+        self._wakeup_w = -1
+        self._thread: Optional[Thread] = None
+        self._is_running = False
+        self._stats = ServeStats()
+
+    @property
+    def gateway(self) -> Gateway:
+        """Get the Gateway whose events are shared."""
+        return self._gateway
+
+    @property
+    def addresses(self) -> List[Union[str, Tuple[str, int]]]:
+        """Get the addresses listened on, once started."""
+        addresses: List[Union[str, Tuple[str, int]]] = []
+        for listener in self._listeners:
+            address = listener.getsockname()
+            # the IPv6 addresses also have a flow info and a scope ID
+            addresses.append(address if isinstance(address, str) else address[:2])
+        return addresses
+
+    def stats(self) -> ServeStats:
+        """Get a snapshot of the server counters."""
+        with self._lock:
+            return replace(self._stats, subscribers=len(self._subscribers))
+
+    def start(self) -> None:
+        """Listen for subscribers and start the Gateway."""
+        if self._is_running:
+            return
+
+        logger.info("start the fan-out server")
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+        try:
+            if self._tcp is not None:
+                self._listen(socket.create_server(self._tcp))
+            if self._unix is not None:
+                self._listen(self._unix_server(self._unix))
+            self._gateway.start()
+        except (OSError, ProgloveStreamsException) as e:
+            self._close()
+            raise ProgloveStreamsException(f"could not start the server: {e}") from e
+
+        self._is_running = True
+        self._thread = Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        logger.info("serve the Gateway on %s", self.addresses)
+
+    def stop(self) -> None:
+        """Stop the Gateway and disconnect the subscribers."""
+        logger.info("stop the fan-out server")
+        self._gateway.stop()
+
+        if self._thread is not None:
+            self._is_running = False
+            self._wakeup()
+            self._thread.join()
+            self._thread = None
+
+        self._close()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Send an event to all the subscribers.
+
+        The event is serialized once. What a subscriber cannot receive at
+        once is buffered and sent from the server thread.
+
+        """
+        data = self._codec.encode(event) + b"\n"
+        backlogged = False
+        with self._lock:
+            self._stats.events += 1
+            for subscriber in self._subscribers.values():
+                if not subscriber.output:
+                    try:
+                        sent = subscriber.sock.send(data)
+                    except BlockingIOError:
+                        sent = 0
+                    except OSError as e:
+                        self._evict(subscriber, str(e))
+                        continue
+                    self._stats.bytes_sent += sent
+                    if sent == len(data):
+                        continue
+                    chunk = data[sent:]
+                else:
+                    chunk = data
+
+                if len(subscriber.output) + len(chunk) > self._buffer_size:
+                    self._evict(subscriber, "too slow")
+                    continue
+                subscriber.output += chunk
+                backlogged = True
+
+            if self._evicted:
+                backlogged = True
+            for subscriber in self._evicted:
+                self._subscribers.pop(subscriber.sock, None)
+
+        if backlogged:
+            self._wakeup()
+
+    def _listen(self, listener: socket.socket) -> None:
+        listener.setblocking(False)
+        self._listeners.append(listener)
+        assert self._selector is not None
+        self._selector.register(listener, selectors.EVENT_READ, listener)
+
+    @staticmethod
+    def _unix_server(path: str) -> socket.socket:
+        # remove the socket left by a previous server
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen()
+        return listener
+
+    def _wakeup(self) -> None:
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except BlockingIOError:
+            # the pipe is full, the loop wakes up anyway
+            pass
+
+    def _loop(self) -> None:
+        assert self._selector is not None
+        while self._is_running:
+            for key, mask in self._selector.select():
+                if key.data is None:
+                    os.read(self._wakeup_r, 4096)
+                elif isinstance(key.data, socket.socket):
+                    self._accept(key.data)
+                else:
+                    if mask & selectors.EVENT_READ:
+                        self._read(key.data)
+                    if mask & selectors.EVENT_WRITE and not key.data.closed:
+                        self._flush(key.data)
+            self._update()
+
+    def _accept(self, listener: socket.socket) -> None:
+        try:
+            sock, address = listener.accept()
+        except BlockingIOError:
+            return
+
+        sock.setblocking(False)
+        if sock.family != socket.AF_UNIX:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        name = str(address or listener.getsockname())
+        subscriber = _Subscriber(sock, name)
+
+        with self._lock:
+            self._subscribers[sock] = subscriber
+            self._stats.connections += 1
+        assert self._selector is not None
+        self._selector.register(sock, selectors.EVENT_READ, subscriber)
+        logger.info("subscriber %s connected", name)
+
+    def _read(self, subscriber: _Subscriber) -> None:
+        try:
+            data = subscriber.sock.recv(READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            data = b""
+            logger.info("subscriber %s connection lost: %s", subscriber.name, e)
+
+        if not data:
+            with self._lock:
+                self._evict(subscriber, None)
+                self._subscribers.pop(subscriber.sock, None)
+            return
+
+        commands = []
+        malformed = 0
+        for line in subscriber.framer.feed(data):
+            command = self._parse_command(line)
+            if command is None:
+                malformed += 1
+            else:
+                commands.append(command)
+
+        if commands:
+            try:
+                self._gateway.send_batch(commands)
+            except ProgloveStreamsException as e:
+                logger.error("could not send the commands: %s", e)
+
+        with self._lock:
+            self._stats.commands += len(commands)
+            self._stats.malformed_commands += malformed
+
+    def _parse_command(self, line: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            command = self._codec.decode(line)
+        except self._codec.decode_errors as e:
+            logger.debug("malformed command: %s", e)
+            return None
+
+        if not isinstance(command, dict):
+            return None
+        event_type = command.get("event_type")
+        if not isinstance(event_type, str) or not event_type.endswith("!"):
+            logger.debug("not a command: %s", event_type)
+            return None
+
+        command.setdefault("api_version", "1.0")
+        command.setdefault("event_id", str(uuid.uuid4()))
+        command.setdefault("time_created", int(time.time() * 1000))
+        return command
+
+    def _flush(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            if subscriber.closed or not subscriber.output:
+                return
+            try:
+                sent = subscriber.sock.send(subscriber.output)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                self._evict(subscriber, str(e))
+                self._subscribers.pop(subscriber.sock, None)
+                return
+            del subscriber.output[:sent]
+            self._stats.bytes_sent += sent
+
+    def _update(self) -> None:
+        """Close the evicted subscribers and watch the backlogged ones."""
+        assert self._selector is not None
+        with self._lock:
+            evicted, self._evicted = self._evicted, []
+            for subscriber in self._subscribers.values():
+                writing = bool(subscriber.output)
+                if writing != subscriber.writing:
+                    subscriber.writing = writing
+                    events = selectors.EVENT_READ
+                    if writing:
+                        events |= selectors.EVENT_WRITE
+                    self._selector.modify(subscriber.sock, events, subscriber)
+
+        for subscriber in evicted:
+            self._selector.unregister(subscriber.sock)
+            subscriber.sock.close()
+
+    def _evict(self, subscriber: _Subscriber, reason: Optional[str]) -> None:
+        """Disconnect a subscriber once, called with the lock held.
+
+        Arguments:
+            subscriber: The subscriber, closed by the next :meth:`_update`.
+            reason: Why the subscriber is disconnected, ``None`` when it
+                disconnected itself.
+
+        """
+        if subscriber.closed:
+            return
+        subscriber.closed = True
+        subscriber.output.clear()
+        self._evicted.append(subscriber)
+
+        if reason is None:
+            logger.info("subscriber %s disconnected", subscriber.name)
+            return
+        logger.warning("disconnect subscriber %s: %s", subscriber.name, reason)
+        self._stats.evictions += 1
+
+    def _close(self) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.values()) + self._evicted
+            self._subscribers.clear()
+            self._evicted = []
+
+        for subscriber in subscribers:
+            subscriber.sock.close()
+        for listener in self._listeners:
+            listener.close()
+        self._listeners = []
+
+        if self._unix is not None:
+            try:
+                os.unlink(self._unix)
+            except FileNotFoundError:
+                pass
+
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        for fd in (self._wakeup_r, self._wakeup_w):
+            if fd >= 0:
+                os.close(fd)
+        self._wakeup_r = self._wakeup_w = -1
+
+    def __enter__(self) -> "FanOutServer":
+        """Use context manager."""
+        self.start()
+        return self
+
+    def __exit__(self, _exc_type: Any, _exc_val: Any, _exc_tb: Any) -> None:
+        """Close context manager."""
+        self.stop()
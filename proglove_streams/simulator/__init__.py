@@ -0,0 +1,6 @@
+"""Simulated Gateway for load and soak testing without hardware.
+
+Run it with ``python -m proglove_streams.simulator`` and connect the client
+to the printed port.
+
+"""
@@ -0,0 +1,114 @@
+"""Simulator entry point."""
+import argparse
+import logging
+
+from proglove_streams.logging import init_logging
+from proglove_streams.simulator.engine import EVENT_TYPES, GatewaySimulator
+from proglove_streams.simulator.transport import PtyTransport, TcpTransport, Transport
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_mix(value: str) -> dict:
+    mix = {}
+    for item in value.split(","):
+        event_type, _, weight = item.partition("=")
+        if event_type not in EVENT_TYPES:
+            raise argparse.ArgumentTypeError(f"unknown event type: {event_type}")
+        mix[event_type] = int(weight or 1)
+    return mix
+
+
+def main() -> None:
+    """Run the simulator."""
+    parser = argparse.ArgumentParser(
+        "proglove_streams.simulator", description="simulate a Streams API Gateway"
+    )
+    parser.add_argument(
+        "-L",
+        "--logging-level",
+        help="set the logging level (default is INFO)",
+        metavar="LEVEL",
+        choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+        default="INFO",
+    )
+    parser.add_argument(
+        "--tcp",
+        metavar="HOST:PORT",
+        help="listen on a TCP socket instead of creating a pty",
+    )
+    parser.add_argument("-d", "--devices", type=int, default=1000)
+    parser.add_argument(
+        "-r", "--rate", type=float, default=100, help="events/s, 0 for no limit"
+    )
+    parser.add_argument("-b", "--burst", type=int, default=1)
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default="scan=8,button_pressed=1,scanner_state=1",
+        help="weighted event types, among " + ", ".join(EVENT_TYPES),
+    )
+    parser.add_argument(
+        "--latency", type=float, default=20, help="mean reply latency in ms"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=10, help="reply latency deviation in ms"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="probability to answer a command with an error",
+    )
+    parser.add_argument("--duration", type=float, help="seconds to run")
+    parser.add_argument("-n", "--events", type=int, help="number of events to emit")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument(
+        "--no-announce",
+        action="store_true",
+        help="do not emit the connection of the devices at start",
+    )
+    parser.add_argument(
+        "--report-interval", type=float, default=10, help="seconds between reports"
+    )
+    args = parser.parse_args()
+
+    init_logging(getattr(logging, args.logging_level))
+
+    transport: Transport
+    if args.tcp:
+        host, _, port = args.tcp.rpartition(":")
+        transport = TcpTransport(host or "localhost", int(port))
+    else:
+        transport = PtyTransport()
+
+    simulator = GatewaySimulator(
+        transport,
+        devices=args.devices,
+        rate=args.rate,
+        burst=args.burst,
+        mix=args.mix,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+    # printed rather than logged, to be usable from scripts
+    print(transport.name, flush=True)
+    logger.info("simulating %u devices, press Ctrl-C to exit", args.devices)
+
+    try:
+        if not args.no_announce:
+            simulator.announce()
+        stats = simulator.run(args.duration, args.events, args.report_interval)
+    except KeyboardInterrupt:
+        stats = simulator.stats()
+    finally:
+        transport.close()
+
+    logger.info("simulator: %s", stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""Simulated Gateway speaking the Streams API.
+
+The :class:`GatewaySimulator` emits ``scan``, ``button_pressed``,
+``scanner_state`` and ``gateway_state`` events for many simulated devices
+at a configurable rate, in bursts, and answers the commands it receives:
+
+- ``gateway_state!`` is answered with a ``gateway_state`` event listing
+  the connected devices,
+- a ``feedback!``, ``display!`` or ``trigger_block!`` command to a device
+  which is not connected is answered with an ``errors`` event, the others
+  are only answered when an error is injected.
+
+The replies are sent after a random latency.
+
+"""
+import heapq
+import itertools
+import logging
+import random
+import time
+import uuid
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from proglove_streams.codec import Codec, get_codec
+from proglove_streams.framing import LineFramer
+from proglove_streams.simulator.transport import Transport
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("scan", "button_pressed", "scanner_state", "gateway_state")
+
+DEVICE_COMMANDS = ("feedback!", "display!", "trigger_block!")
+
+ERROR_INJECTED = "ERROR_UNKNOWN"
+ERROR_NOT_CONNECTED = "ERROR_DEVICE_NOT_CONNECTED"
+
+DEFAULT_MIX = {"scan": 8, "button_pressed": 1, "scanner_state": 1}
+
+TRIGGER_GESTURES = ("TRIGGER_SINGLE_CLICK", "TRIGGER_DOUBLE_CLICK")
+
+
+@dataclass
+class SimulatorStats:
+    """Counters of a :class:`GatewaySimulator`."""
+
+    events_sent: int = 0
+    bytes_sent: int = 0
+    commands_received: int = 0
+    malformed_commands: int = 0
+    replies_sent: int = 0
+    errors_sent: int = 0
+    errors_injected: int = 0
+
+
+# pylint: disable=too-many-instance-attributes
+class GatewaySimulator:
+    """Simulate a Gateway with many connected devices.
+
+    Arguments:
+        transport: The transport to the client.
+        devices: The number of simulated devices, all connected at start.
+        rate: The number of events emitted per second, 0 for no limit.
+        burst: The number of events emitted at once.
+        mix: The relative weight of each event type.
+        latency: The mean time, in seconds, before replying to a command.
+        jitter: The maximum deviation from the mean reply latency.
+        error_rate: The probability to answer a command with an error.
+        seed: The seed of the random generator, for reproducible runs.
+        codec: The JSON codec, by default the fastest one installed.
+
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        transport: Transport,
+        devices: int = 1000,
+        rate: float = 100.0,
+        burst: int = 1,
+        mix: Optional[Dict[str, int]] = None,
+        latency: float = 0.02,
+        jitter: float = 0.01,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+        codec: Optional[Codec] = None,
+    ):
+        """Initialize the class."""
+        mix = DEFAULT_MIX if mix is None else mix
+        for event_type in mix:
+            if event_type not in EVENT_TYPES:
+                raise ValueError(f"unknown event type: {event_type}")
+        if devices < 1:
+            raise ValueError("at least one device is required")
+        if burst < 1:
+            raise ValueError("the burst size must be positive")
+        if not 0 <= error_rate <= 1:
+            raise ValueError("the error rate must be between 0 and 1")
+
+        self._transport = transport
+        self._rate = rate
+        self._burst = burst
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._random = random.Random(seed)
+        self._codec = codec or get_codec()
+        self._framer = LineFramer()
+        self._is_running = False
+        self._stats = SimulatorStats()
+
+        self._emitters: Dict[str, Callable[[], Dict[str, Any]]] = {
+            "scan": self._scan,
+            "button_pressed": self._button_pressed,
+            "scanner_state": self._scanner_state,
+            "gateway_state": self._gateway_state,
+        }
+        self._cycle = [
+            event_type for event_type, weight in mix.items() for _ in range(weight)
+        ]
+
+        # connected devices in a list for O(1) random picks and removals
+        self._connected = [f"M2MR{index:09d}" for index in range(devices)]
+        self._positions = {serial: i for i, serial in enumerate(self._connected)}
+        self._disconnected: List[str] = []
+
+        # replies as (due time, sequence, line), the earliest first
+        self._replies: List[Tuple[float, int, bytes]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def transport(self) -> Transport:
+        """Get the transport to the client."""
+        return self._transport
+
+    @property
+    def connected_devices(self) -> List[str]:
+        """Get the serial numbers of the connected devices."""
+        return list(self._connected)
+
+    def stats(self) -> SimulatorStats:
+        """Get a snapshot of the simulator counters."""
+        return replace(self._stats)
+
+    def stop(self) -> None:
+        """Stop :meth:`run`, from a callback or another thread."""
+        self._is_running = False
+
+    def announce(self) -> None:
+        """Emit a connected ``scanner_state`` event for every connected device."""
+        self._write(
+            [
+                self._event(
+                    "scanner_state",
+                    device_serial=device_serial,
+                    device_connected_state="STATE_CONNECTED",
+                )
+                for device_serial in self._connected
+            ]
+        )
+
+    def run(
+        self,
+        duration: Optional[float] = None,
+        events: Optional[int] = None,
+        report_interval: Optional[float] = None,
+    ) -> SimulatorStats:
+        """Emit events and answer the commands until stopped.
+
+        Arguments:
+            duration: The time to run, by default until :meth:`stop`.
+            events: The number of events to emit, by default no limit. The
+                simulator keeps answering the commands once they are sent.
+            report_interval: The time between two logs of the counters.
+
+        Returns:
+            The simulator counters.
+
+        """
+        self._is_running = True
+        now = time.monotonic()
+        end = None if duration is None else now + duration
+        next_burst = now
+        next_report = None if report_interval is None else now + report_interval
+        emitted = 0
+
+        while self._is_running:
+            now = time.monotonic()
+            if end is not None and now >= end:
+                break
+
+            emitting = bool(self._cycle) and (events is None or emitted < events)
+            if emitting and now >= next_burst and self._transport.connected:
+                count = (
+                    self._burst
+                    if events is None
+                    else min(self._burst, events - emitted)
+                )
+                self._emit(count)
+                emitted += count
+                if self._rate:
+                    # do not catch up on the bursts missed while blocked
+                    next_burst = max(next_burst + count / self._rate, now - 1.0)
+
+            self._send_due_replies(now)
+
+            if next_report is not None and now >= next_report:
+                logger.info("simulator: %s", self._stats)
+                next_report = now + (report_interval or 0.0)
+
+            timeout = 0.1
+            if emitting and self._transport.connected:
+                timeout = min(timeout, next_burst - now)
+            if self._replies:
+                timeout = min(timeout, self._replies[0][0] - now)
+            if end is not None:
+                timeout = min(timeout, end - now)
+
+            data = self._transport.read(max(timeout, 0.0))
+            if data is None:
+                self._framer.clear()
+                continue
+
+            for line in self._framer.feed(data):
+                self._handle_command(line)
+
+        self._is_running = False
+        return self.stats()
+
+    def _emit(self, count: int) -> None:
+        events = []
+        for _ in range(count):
+            event_type = self._cycle[self._random.randrange(len(self._cycle))]
+            events.append(self._emitters[event_type]())
+        self._write(events)
+
+    def _write(self, events: List[Dict[str, Any]]) -> None:
+        if not events:
+            return
+        data = b"".join(self._codec.encode(event) + b"\n" for event in events)
+        self._transport.write(data)
+        self._stats.events_sent += len(events)
+        self._stats.bytes_sent += len(data)
+
+    def _event(self, event_type: str, **fields: Any) -> Dict[str, Any]:
+        event: Dict[str, Any] = {
+            "api_version": "1.0",
+            "event_type": event_type,
+            "event_id": str(uuid.uuid4()),
+            "time_created": int(time.time() * 1000),
+            "gateway_serial": "PGGW000000042",
+        }
+        event.update(fields)
+        return event
+
+    def _pick_connected(self) -> Optional[str]:
+        if not self._connected:
+            return None
+        return self._connected[self._random.randrange(len(self._connected))]
+
+    def _scan(self) -> Dict[str, Any]:
+        device_serial = self._pick_connected()
+        if device_serial is None:
+            return self._scanner_state()
+
+        return self._event(
+            "scan",
+            device_serial=device_serial,
+            device_model="MARK_2_MR",
+            scan_code=f"{self._random.randrange(10**13):013d}\r",
+            symbology="EAN13",
+        )
+
+    def _button_pressed(self) -> Dict[str, Any]:
+        device_serial = self._pick_connected()
+        if device_serial is None:
+            return self._scanner_state()
+
+        return self._event(
+            "button_pressed",
+            device_serial=device_serial,
+            trigger_gesture=self._random.choice(TRIGGER_GESTURES),
+        )
+
+    def _scanner_state(self) -> Dict[str, Any]:
+        """Disconnect a connected device or connect a disconnected one."""
+        connect = not self._connected or (
+            bool(self._disconnected) and self._random.random() < 0.5
+        )
+        if connect:
+            device_serial = self._disconnected.pop(
+                self._random.randrange(len(self._disconnected))
+            )
+            self._positions[device_serial] = len(self._connected)
+            self._connected.append(device_serial)
+        else:
+            position = self._random.randrange(len(self._connected))
+            device_serial = self._connected[position]
+            last = self._connected.pop()
+            if last != device_serial:
+                self._connected[position] = last
+                self._positions[last] = position
+            del self._positions[device_serial]
+            self._disconnected.append(device_serial)
+
+        return self._event(
+            "scanner_state",
+            device_serial=device_serial,
+            device_connected_state=(
+                "STATE_CONNECTED" if connect else "STATE_DISCONNECTED"
+            ),
+        )
+
+    def _gateway_state(self) -> Dict[str, Any]:
+        return self._event(
+            "gateway_state",
+            gateway_app_version="1.2.3",
+            device_connected_list=[
+                {"device_serial": device_serial} for device_serial in self._connected
+            ],
+        )
+
+    def _error(self, command: Dict[str, Any], error_code: str) -> Dict[str, Any]:
+        return self._event(
+            "errors",
+            device_serial=command.get("device_serial"),
+            error_code=error_code,
+            event_reference_id=command.get("event_id"),
+            error_severity="CRITICAL",
+        )
+
+    def _handle_command(self, line: bytes) -> None:
+        try:
+            command = self._codec.decode(line)
+        except self._codec.decode_errors as e:
+            logger.debug("malformed command: %s", e)
+            self._stats.malformed_commands += 1
+            return
+
+        if not isinstance(command, dict):
+            self._stats.malformed_commands += 1
+            return
+
+        self._stats.commands_received += 1
+        event_type = command.get("event_type")
+
+        if self._random.random() < self._error_rate:
+            self._stats.errors_injected += 1
+            self._reply(self._error(command, ERROR_INJECTED))
+        elif event_type == "gateway_state!":
+            self._reply(self._gateway_state())
+        elif event_type in DEVICE_COMMANDS:
+            if command.get("device_serial") not in self._positions:
+                self._reply(self._error(command, ERROR_NOT_CONNECTED))
+        else:
+            logger.debug("unknown command: %s", event_type)
+            self._stats.malformed_commands += 1
+
+    def _reply(self, event: Dict[str, Any]) -> None:
+        if event["event_type"] == "errors":
+            self._stats.errors_sent += 1
+
+        delay = self._random.uniform(
+            self._latency - self._jitter, self._latency + self._jitter
+        )
+        due = time.monotonic() + max(delay, 0.0)
+        heapq.heappush(
+            self._replies,
+            (due, next(self._sequence), self._codec.encode(event) + b"\n"),
+        )
+
+    def _send_due_replies(self, now: float) -> None:
+        lines = []
+        while self._replies and self._replies[0][0] <= now:
+            lines.append(heapq.heappop(self._replies)[2])
+        if not lines:
+            return
+
+        data = b"".join(lines)
+        self._transport.write(data)
+        self._stats.replies_sent += len(lines)
+        self._stats.bytes_sent += len(data)
@@ -0,0 +1,162 @@
+"""Transports of the simulated Gateway.
+
+The client connects to the simulator either through the slave side of a
+pty, as it would to the serial port of a real Gateway, or through a TCP
+socket with a ``socket://host:port`` port URL.
+
+"""
+import logging
+import os
+import pty
+import select
+import socket
+import tty
+from typing import Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 4096
+
+
+class Transport(Protocol):
+    """Byte stream between the simulator and its client."""
+
+    @property
+    def name(self) -> str:
+        """Get the port the client connects to."""
+
+    @property
+    def connected(self) -> bool:
+        """Tell whether a client may read the written data."""
+
+    def read(self, timeout: float) -> Optional[bytes]:
+        """Read the available data.
+
+        Returns:
+            The data read, empty if the timeout expired, or ``None`` if
+            the client disconnected.
+
+        """
+
+    def write(self, data: bytes) -> None:
+        """Write data to the client."""
+
+    def close(self) -> None:
+        """Close the transport."""
+
+
+class PtyTransport:
+    """Pty whose slave side is used by the client as a serial port.
+
+    The writes block once the pty buffer is full, until the client reads.
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize the class."""
+        self._master, self._slave = pty.openpty()
+        # no echo of the written events, no line editing
+        tty.setraw(self._slave)
+        self._name = os.ttyname(self._slave)
+
+    @property
+    def name(self) -> str:
+        """Get the path of the slave side of the pty."""
+        return self._name
+
+    @property
+    def connected(self) -> bool:
+        """Tell whether a client may read the written data."""
+        return True
+
+    def read(self, timeout: float) -> Optional[bytes]:
+        """Read the available data."""
+        readable, _, _ = select.select([self._master], [], [], timeout)
+        if not readable:
+            return b""
+        return os.read(self._master, READ_SIZE)
+
+    def write(self, data: bytes) -> None:
+        """Write data to the client."""
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._master, view) :]
+
+    def close(self) -> None:
+        """Close the pty."""
+        os.close(self._master)
+        os.close(self._slave)
+
+
+class TcpTransport:
+    """TCP server accepting one client at a time.
+
+    Arguments:
+        host: The address to listen on.
+        port: The port to listen on, 0 to pick a free one.
+
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 0):
+        """Initialize the class."""
+        self._server = socket.create_server((host, port))
+        self._client: Optional[socket.socket] = None
+
+    @property
+    def name(self) -> str:
+        """Get the pyserial URL of the server."""
+        host, port = self._server.getsockname()[:2]
+        return f"socket://{host}:{port}"
+
+    @property
+    def connected(self) -> bool:
+        """Tell whether a client is connected."""
+        return self._client is not None
+
+    def read(self, timeout: float) -> Optional[bytes]:
+        """Read the available data, accepting a client if none is connected."""
+        if self._client is None:
+            readable, _, _ = select.select([self._server], [], [], timeout)
+            if readable:
+                self._client, address = self._server.accept()
+                self._client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                logger.info("client connected from %s", address)
+            return b""
+
+        readable, _, _ = select.select([self._client], [], [], timeout)
+        if not readable:
+            return b""
+
+        try:
+            data = self._client.recv(READ_SIZE)
+        except OSError as e:
+            logger.info("client connection lost: %s", e)
+            data = b""
+
+        if not data:
+            self._disconnect()
+            return None
+        return data
+
+    def write(self, data: bytes) -> None:
+        """Write data to the client, if any."""
+        if self._client is None:
+            return
+
+        try:
+            self._client.sendall(data)
+        except OSError as e:
+            logger.info("client connection lost: %s", e)
+            self._disconnect()
+
+    def close(self) -> None:
+        """Close the server and the client connection."""
+        if self._client is not None:
+            self._disconnect()
+        self._server.close()
+
+    def _disconnect(self) -> None:
+        if self._client is not None:
+            logger.info("client disconnected")
+            self._client.close()
+            self._client = None
@@ -0,0 +1,33 @@
+"""Test for the example application."""
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from proglove_streams.app_example import app_example
+
+
+def test_help(capsys):
+    """Test the example application prints its usage."""
+    with patch.object(sys, "argv", ["proglove_streams", "-h"]):
+        with pytest.raises(SystemExit) as exit_info:
+            app_example()
+
+    assert exit_info.value.code == 0
+    assert capsys.readouterr().out.startswith("usage: proglove_streams")
+
+
+def test_main_module():
+    """Test the package runs as a module."""
+    result = subprocess.run(
+        [sys.executable, "-m", "proglove_streams", "-h"],
+        capture_output=True,
+        check=False,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.startswith("usage: proglove_streams")
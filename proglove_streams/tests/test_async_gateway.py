@@ -0,0 +1,273 @@
+"""Test for the asyncio Gateway module."""
+import asyncio
+import json
+import os
+import pty
+import time
+import uuid
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from streams_api.customer_integrations.scan.model import DeviceModel, ScanStream
+
+from proglove_streams.async_gateway import (
+    READ_SIZE,
+    AsyncGateway,
+    AsyncGatewayMessageHandler,
+)
+from proglove_streams.codec import get_codec
+from proglove_streams.exception import CommandError, ProgloveStreamsException
+from proglove_streams.metrics import Metrics
+
+
+async def test_scan_event():
+    """Test a scan event is dispatched to the async callback."""
+    master, slave = pty.openpty()
+    slave_name = os.ttyname(slave)
+
+    model = ScanStream(
+        api_version="1.0",
+        event_id=str(uuid.uuid4()),
+        time_created=int(time.time() * 1000),
+        gateway_serial="PGGW000000042",
+        device_serial="123456789",
+        device_model=DeviceModel.m2_mr,
+        scan_code="foo bar baz",
+    )
+
+    received = asyncio.Event()
+    on_scan = AsyncMock(side_effect=lambda *_args: received.set())
+    handler = AsyncGatewayMessageHandler(on_scan=on_scan)
+
+    async with AsyncGateway(handler, port=slave_name) as testee:
+        os.write(master, model.json(exclude_none=True).encode() + b"\n")
+        await asyncio.wait_for(received.wait(), timeout=1)
+
+    on_scan.assert_awaited_with(testee, model)
+
+
+async def test_wrong_events():
+    """Test malformed and unknown events are ignored."""
+    master, slave = pty.openpty()
+    slave_name = os.ttyname(slave)
+
+    on_scan = AsyncMock()
+    handler = AsyncGatewayMessageHandler(on_scan=on_scan)
+
+    async with AsyncGateway(handler, port=slave_name):
+        os.write(master, b'{\n{"foo": "bar"}\n{"event_type": "scan"}\n')
+        await asyncio.sleep(0.1)
+
+    on_scan.assert_not_called()
+
+
+async def test_send_feedback():
+    """Test sending a command."""
+    master, slave = pty.openpty()
+    slave_name = os.ttyname(slave)
+
+    codec = get_codec("json")
+    async with AsyncGateway(Mock(), port=slave_name, codec=codec) as testee:
+        with patch("proglove_streams.commands.time.time") as time_patch, patch(
+            "proglove_streams.commands.uuid.uuid4"
+        ) as uuid4_patch:
+            time_patch.return_value = 1546300800
+            uuid4_patch.return_value = "c6fd7137-055a-4feb-8c32-9dbb9a117f6a"
+            await testee.send_feedback("12345", "FOO")
+
+        expected = json.dumps(
+            {
+                "api_version": "1.0",
+                "event_type": "feedback!",
+                "event_id": "c6fd7137-055a-4feb-8c32-9dbb9a117f6a",
+                "time_created": 1546300800000,
+                "device_serial": "12345",
+                "feedback_action_id": "FOO",
+            }
+        )
+        assert os.read(master, len(expected) + 1).decode() == expected + "\n"
+
+
+async def test_exceptions():
+    """Test the exceptions."""
+    testee = AsyncGateway(Mock(), port="port_that_does_not_exist")
+
+    with pytest.raises(ProgloveStreamsException):
+        await testee.start(flush_input=False)
+
+    with pytest.raises(ProgloveStreamsException):
+        await testee.get_gateway_state()
+
+    await testee.stop()
+
+
+async def test_write_error():
+    """Test a command fails when writing it fails."""
+    master, slave = pty.openpty()
+
+    async with AsyncGateway(Mock(), port=os.ttyname(slave)) as testee:
+        with patch(
+            "proglove_streams.async_gateway.os.write", side_effect=OSError("foo")
+        ):
+            with pytest.raises(ProgloveStreamsException, match="foo"):
+                await testee.send_feedback("123456789", "FOO")
+        # pylint: disable=protected-access
+        assert len(testee._pending) == 0
+
+        await testee.send_feedback("123456789", "FOO")
+        assert json.loads(os.read(master, 1024))["event_type"] == "feedback!"
+
+    os.close(master)
+    os.close(slave)
+
+
+async def test_command_futures():
+    """Test the command futures are resolved by the replies."""
+    master, slave = pty.openpty()
+    slave_name = os.ttyname(slave)
+
+    async with AsyncGateway(Mock(), port=slave_name, command_timeout=0.2) as testee:
+        trigger_block = await testee.set_trigger_block("123456789", True, [], [])
+        command = json.loads(os.read(master, 1024))
+        error = {
+            "api_version": "1.0",
+            "event_type": "errors",
+            "event_id": str(uuid.uuid4()),
+            "time_created": int(time.time() * 1000),
+            "gateway_serial": "PGGW000000042",
+            "device_serial": "123456789",
+            "error_code": "ERROR_UNKNOWN",
+            "event_reference_id": command["event_id"],
+            "error_severity": "CRITICAL",
+        }
+        os.write(master, json.dumps(error).encode() + b"\n")
+        with pytest.raises(CommandError):
+            await asyncio.wait_for(trigger_block, timeout=1)
+
+        feedback = await testee.send_feedback("123456789", "FOO")
+        assert await asyncio.wait_for(feedback, timeout=1) is None
+
+        pending = await testee.send_feedback("123456789", "FOO")
+
+    assert pending.cancelled()
+
+
+async def test_command_expiry():
+    """Test the commands expire on a timer armed for the next deadline."""
+    master, slave = pty.openpty()
+
+    async with AsyncGateway(
+        Mock(), port=os.ttyname(slave), command_timeout=0.5
+    ) as testee:
+        # pylint: disable=protected-access
+        assert testee._expire_handle is None
+
+        first = await testee.send_feedback("123456789", "FOO")
+        handle = testee._expire_handle
+        assert handle is not None
+        second = await testee.send_feedback("123456789", "FOO")
+        assert testee._expire_handle is handle
+
+        assert await asyncio.wait_for(first, timeout=1) is None
+        assert await asyncio.wait_for(second, timeout=1) is None
+        assert testee._expire_handle is None
+
+        await testee.send_feedback("123456789", "FOO")
+        assert testee._expire_handle is not None
+
+    assert testee._expire_handle is None
+    os.close(master)
+    os.close(slave)
+
+
+async def test_display_cache():
+    """Test the displays already shown are not sent again, and counted."""
+    master, slave = pty.openpty()
+    metrics = Metrics()
+    fields = [{"display_field_id": 1, "display_field_text": "A"}]
+
+    async with AsyncGateway(
+        Mock(), port=os.ttyname(slave), display_cache_ttl=60, metrics=metrics
+    ) as testee:
+        await testee.set_display("M2MR111100928", "PG1", fields)
+        assert json.loads(os.read(master, 1024))["event_type"] == "display!"
+
+        suppressed = await testee.set_display("M2MR111100928", "PG1", fields)
+        assert suppressed.done() and suppressed.result() is None
+
+        batch = testee.new_batch()
+        batch.send_feedback(["M2MR111100928", "M2MR111100929"], "FOO")
+        await testee.send_batch(batch)
+        assert len(os.read(master, 4096).splitlines()) == 2
+
+    assert (
+        testee.devices.get("M2MR111100928").last_display["display_template_id"] == "PG1"
+    )
+    snapshot = metrics.snapshot()
+    assert snapshot["displays_suppressed"] == 1
+    assert snapshot['commands_sent{event_type="display!"}'] == 1
+    assert snapshot['commands_sent{event_type="batch"}'] == 2
+    os.close(master)
+    os.close(slave)
+
+
+async def test_read_error_restart():
+    """Test the Gateway stops on a read error and can be started again."""
+    master, slave = pty.openpty()
+    slave_name = os.ttyname(slave)
+    handler = AsyncGatewayMessageHandler()
+
+    testee = AsyncGateway(handler, port=slave_name)
+    await testee.start()
+    future = await testee.get_gateway_state()
+
+    # pylint: disable=protected-access
+    with patch.object(
+        testee._serial, "read", side_effect=OSError("device disconnected")
+    ):
+        os.write(master, b"\n")
+        with pytest.raises(ProgloveStreamsException):
+            await asyncio.wait_for(future, timeout=1)
+    assert not testee.is_running
+
+    await testee.start()
+    assert testee.is_running
+    await testee.stop()
+    os.close(master)
+    os.close(slave)
+
+
+async def test_backpressure():
+    """Test the port is not read while the handler is behind."""
+    master, slave = pty.openpty()
+    slave_name = os.ttyname(slave)
+    release = asyncio.Event()
+    handled = []
+
+    async def on_event(_client, event):
+        await release.wait()
+        handled.append(event)
+
+    handler = AsyncGatewayMessageHandler()
+    handler.register("foo", on_event)
+
+    # a read returns at most 10 lines however many wait, all fitting in the pty
+    padding = b"x" * (READ_SIZE // 10)
+    async with AsyncGateway(handler, port=slave_name, queue_size=10) as testee:
+        for i in range(30):
+            os.write(
+                master, b'{"event_type": "foo", "i": %d, "p": "%s"}\n' % (i, padding)
+            )
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.1)
+        # pylint: disable=protected-access
+        assert testee._events is not None and testee._events.qsize() < 20
+
+        release.set()
+        deadline = time.monotonic() + 5
+        while len(handled) < 30 and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    assert [event["i"] for event in handled] == list(range(30))
+    os.close(master)
+    os.close(slave)
@@ -0,0 +1,24 @@
+"""Test for the benchmarks entry point."""
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from proglove_streams.bench.__main__ import main
+
+
+@pytest.mark.parametrize(
+    "argv, usage",
+    [
+        (["-h"], "usage: proglove_streams.bench [-h]"),
+        (["codec", "--help"], "usage: proglove_streams.bench codec [-h]"),
+    ],
+)
+def test_help(capsys, argv, usage):
+    """Test the help of a benchmark is printed instead of the entry point one."""
+    with patch.object(sys, "argv", ["proglove_streams.bench"] + argv):
+        with pytest.raises(SystemExit) as exit_info:
+            main()
+
+    assert exit_info.value.code == 0
+    assert capsys.readouterr().out.startswith(usage)
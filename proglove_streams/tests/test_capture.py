@@ -0,0 +1,229 @@
+"""Test for the capture module."""
+import logging
+import os
+import pty
+import struct
+import time
+from threading import Event
+from unittest.mock import Mock
+
+import pytest
+
+from proglove_streams.capture import (
+    MAGIC,
+    CaptureRecorder,
+    ReplayClient,
+    capture_files,
+    read_capture,
+    replay,
+    rotated_path,
+)
+from proglove_streams.exception import ProgloveStreamsException
+from proglove_streams.gateway import Gateway, GatewayMessageHandler
+
+
+def _write_capture(path, records, start=0):
+    with open(path, "ab") as file:
+        file.write(MAGIC + struct.pack("<q", start))
+        for timestamp, line in records:
+            file.write(struct.pack("<QI", timestamp, len(line)) + line)
+
+
+def test_rotated_path():
+    """Test the rotated files are numbered before the extensions."""
+    assert rotated_path("/tmp/shift.pgcap.gz", 0) == "/tmp/shift.pgcap.gz"
+    assert rotated_path("/tmp/shift.pgcap.gz", 2) == "/tmp/shift.2.pgcap.gz"
+    assert rotated_path("shift", 1) == "shift.1"
+
+
+@pytest.mark.parametrize("name", ["shift.pgcap", "shift.pgcap.gz"])
+def test_record_rotated(tmp_path, name):
+    """Test the lines recorded in rotated files are read back in order."""
+    path = str(tmp_path / name)
+    lines = [b'{"event_type": "scan", "scan_code": "%d"}' % i for i in range(100)]
+
+    with CaptureRecorder(path, max_bytes=1000) as recorder:
+        for i in range(0, 100, 2):
+            recorder.record(lines[i : i + 2])
+        recorder.record([])
+    assert recorder.lines == 100
+
+    paths = capture_files(path)
+    assert len(paths) > 3 and paths[1] == rotated_path(path, 1)
+    records = list(read_capture(paths))
+    assert [line for _, line in records] == lines
+    timestamps = [timestamp for timestamp, _ in records]
+    assert timestamps[0] == 0 and timestamps == sorted(timestamps)
+
+
+def test_read_not_closed(tmp_path, caplog):
+    """Test the lines flushed to a compressed file not closed are read."""
+    path = str(tmp_path / "shift.pgcap.gz")
+    with CaptureRecorder(path) as recorder:
+        recorder.record([b"1", b"2"])
+    recorder = CaptureRecorder(path)
+    recorder.record([b"3"])
+    recorder.flush()
+
+    with caplog.at_level(logging.WARNING, logger="proglove_streams.capture"):
+        assert [line for _, line in read_capture(path)] == [b"1", b"2", b"3"]
+    assert "truncated gzip stream" in caplog.text
+    recorder.close()
+
+
+def test_record_error(tmp_path):
+    """Test a failed write stops the recording instead of raising."""
+    path = str(tmp_path / "shift.pgcap")
+    recorder = CaptureRecorder(path, max_bytes=100)
+    recorder.record([b"1"])
+
+    # pylint: disable=protected-access
+    recorder._file.write = Mock(side_effect=OSError("disk full"))
+    recorder.record([b"2"])
+    assert not recorder.is_recording and recorder.errors == 1
+    recorder.record([b"3"])
+    recorder.flush()
+    recorder.close()
+    assert recorder.errors == 1 and recorder.lines == 1
+
+    # the rotated file cannot be created
+    path = str(tmp_path / "rotated.pgcap")
+    os.mkdir(rotated_path(path, 1))
+    recorder = CaptureRecorder(path, max_bytes=100)
+    recorder.record([b"x" * 100])
+    assert not recorder.is_recording and recorder.errors == 1
+    assert [line for _, line in read_capture(path)] == [b"x" * 100]
+
+
+def test_sessions_continue(tmp_path):
+    """Test the time does not advance between two recordings of a file."""
+    path = str(tmp_path / "shift.pgcap")
+    _write_capture(path, [(10**9, b"1"), (2 * 10**9, b"2")], start=1)
+    _write_capture(path, [(5 * 10**9, b"3"), (6 * 10**9, b"4")], start=2)
+
+    assert list(read_capture(path)) == [
+        (0, b"1"),
+        (10**9, b"2"),
+        (10**9, b"3"),
+        (2 * 10**9, b"4"),
+    ]
+
+
+def test_truncated(tmp_path):
+    """Test a record truncated by a crash is ignored."""
+    path = str(tmp_path / "shift.pgcap")
+    _write_capture(path, [(0, b"complete")])
+    with open(path, "ab") as file:
+        file.write(struct.pack("<QI", 1, 100) + b"partial")
+
+    assert list(read_capture(path)) == [(0, b"complete")]
+
+
+def test_not_a_capture(tmp_path):
+    """Test the files which are not captures are rejected."""
+    path = tmp_path / "shift.pgcap"
+    path.write_bytes(b'{"event_type": "scan"}\n')
+
+    with pytest.raises(ProgloveStreamsException):
+        list(read_capture(str(path)))
+    with pytest.raises(ProgloveStreamsException):
+        list(read_capture(str(tmp_path / "missing.pgcap")))
+
+
+def test_replay_speed(tmp_path):
+    """Test the lines are replayed at the requested speed."""
+    path = str(tmp_path / "shift.pgcap")
+    _write_capture(
+        path,
+        [
+            (0, b'{"event_type": "scan"}'),
+            (400 * 10**6, b"{"),
+            (400 * 10**6, b'{"event_type": "button_pressed"}'),
+        ],
+    )
+    handler = Mock()
+
+    stats = replay(path, handler, speed=2)
+    assert stats.events == 2 and stats.malformed_lines == 1
+    assert stats.capture_seconds == pytest.approx(0.4)
+    assert stats.seconds >= 0.2
+    assert handler.handle.call_count == 2
+
+    stats = replay(path, handler, speed=None)
+    assert stats.seconds < 0.2
+    with pytest.raises(ValueError):
+        replay(path, handler, speed=0)
+
+
+def test_replay_client(tmp_path):
+    """Test the commands sent while replaying are recorded."""
+    path = str(tmp_path / "shift.pgcap")
+    _write_capture(
+        path, [(0, b'{"event_type": "button_pressed", "device_serial": "M2"}')]
+    )
+    client = ReplayClient()
+
+    def on_button_pressed(replay_client, event):
+        replay_client.send_feedback(event["device_serial"], "FEEDBACK_POSITIVE")
+        batch = replay_client.new_batch()
+        batch.send_feedback(["M3", "M4"], "FEEDBACK_NEGATIVE")
+        replay_client.send_batch(batch)
+
+    handler = GatewayMessageHandler()
+    handler.register("button_pressed", on_button_pressed)
+    replay(path, handler, speed=None, client=client)
+
+    assert [command["device_serial"] for command in client.commands] == [
+        "M2",
+        "M3",
+        "M4",
+    ]
+    with pytest.raises(ProgloveStreamsException):
+        client.get_gateway_state().result(timeout=0)
+
+
+def test_gateway_recorder(tmp_path):
+    """Test a Gateway records the received lines."""
+    master, slave = pty.openpty()
+    path = str(tmp_path / "shift.pgcap")
+    received = Event()
+    handler = GatewayMessageHandler()
+    handler.register("foo", lambda _client, _event: received.set())
+
+    with CaptureRecorder(path) as recorder:
+        with Gateway(handler, port=os.ttyname(slave), recorder=recorder):
+            os.write(master, b'{"event_type": "bar"}\n')
+            time.sleep(0.05)
+            os.write(master, b'{"event_type": "foo"}\n')
+            assert received.wait(timeout=5)
+
+    events = []
+    handler = Mock()
+    handler.handle.side_effect = lambda _client, event: events.append(event)
+    replay(path, handler, speed=None)
+
+    assert events == [{"event_type": "bar"}, {"event_type": "foo"}]
+    os.close(master)
+    os.close(slave)
+
+
+def test_gateway_recorder_error(tmp_path):
+    """Test a Gateway goes on reading when recording fails."""
+    master, slave = pty.openpty()
+    received = Event()
+    handler = GatewayMessageHandler()
+    handler.register("foo", lambda _client, _event: received.set())
+
+    with CaptureRecorder(str(tmp_path / "shift.pgcap")) as recorder:
+        # pylint: disable=protected-access
+        recorder._file.write = Mock(side_effect=OSError("disk full"))
+        with Gateway(handler, port=os.ttyname(slave), recorder=recorder) as testee:
+            os.write(master, b'{"event_type": "bar"}\n')
+            time.sleep(0.05)
+            os.write(master, b'{"event_type": "foo"}\n')
+            assert received.wait(timeout=5)
+            assert testee.is_running
+
+    assert recorder.errors == 1 and recorder.lines == 0
+    os.close(master)
+    os.close(slave)
@@ -0,0 +1,42 @@
+"""Test for the JSON codec module."""
+import json
+
+import pytest
+
+from proglove_streams.codec import available_codecs, get_codec
+from proglove_streams.exception import ProgloveStreamsException
+
+_EVENT = {
+    "api_version": "1.0",
+    "event_type": "scan",
+    "device_serial": "M2MR111100928",
+    "scan_code": "http://example.com/\r",
+    "time_created": 1546300800000,
+    "list": [1, 2.5, True, None],
+}
+
+
+@pytest.mark.parametrize("name", list(available_codecs()))
+def test_codec(name: str):
+    """Test encoding and decoding with every installed codec."""
+    testee = get_codec(name)
+
+    encoded = testee.encode(_EVENT)
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded) == _EVENT
+    assert testee.decode(json.dumps(_EVENT).encode() + b"\r") == _EVENT
+
+    with pytest.raises(testee.decode_errors):
+        testee.decode(b"{")
+
+
+def test_default_codec():
+    """Test a codec is always available."""
+    assert get_codec().name in available_codecs()
+    assert get_codec("json").name == "json"
+
+
+def test_unknown_codec():
+    """Test requesting an unknown codec."""
+    with pytest.raises(ProgloveStreamsException):
+        get_codec("foo")
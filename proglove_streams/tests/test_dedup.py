@@ -0,0 +1,64 @@
+"""Test for the scan de-duplication module."""
+from unittest.mock import patch
+
+import pytest
+
+from proglove_streams.dedup import ScanDeduplicator
+
+
+def _scan(device_serial: str, scan_code: str) -> dict:
+    return {
+        "event_type": "scan",
+        "device_serial": device_serial,
+        "scan_code": scan_code,
+    }
+
+
+def test_window():
+    """Test a scan is dropped when repeated by its device within the window."""
+    testee = ScanDeduplicator(0.5)
+
+    with patch("proglove_streams.dedup.time.monotonic") as monotonic:
+        monotonic.return_value = 100.0
+        assert not testee.is_duplicate(_scan("M1", "A"))
+        assert not testee.is_duplicate(_scan("M2", "A"))
+        assert not testee.is_duplicate(_scan("M1", "B"))
+
+        monotonic.return_value = 100.4
+        assert testee.is_duplicate(_scan("M1", "A"))
+        assert testee.is_duplicate(_scan("M1", "B"))
+
+        # the repeated scans do not extend the window
+        monotonic.return_value = 100.5
+        assert not testee.is_duplicate(_scan("M1", "A"))
+
+    assert testee.suppressed == 2
+    assert not testee.is_duplicate("not an event")
+
+
+def test_bounded():
+    """Test the oldest and the expired scans are forgotten."""
+    testee = ScanDeduplicator(1, max_entries=3)
+
+    with patch("proglove_streams.dedup.time.monotonic") as monotonic:
+        monotonic.return_value = 0.0
+        for device in range(10):
+            testee.is_duplicate(_scan(f"M{device}", "A"))
+        assert len(testee) == 3
+        assert not testee.is_duplicate(_scan("M0", "A"))
+        assert testee.is_duplicate(_scan("M9", "A"))
+
+        monotonic.return_value = 2.0
+        testee.is_duplicate(_scan("M10", "A"))
+        assert len(testee) == 1
+
+    testee.clear()
+    assert len(testee) == 0
+
+
+def test_arguments():
+    """Test the window and the size must be positive."""
+    with pytest.raises(ValueError):
+        ScanDeduplicator(0)
+    with pytest.raises(ValueError):
+        ScanDeduplicator(1, max_entries=0)
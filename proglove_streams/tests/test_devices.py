@@ -0,0 +1,73 @@
+"""Test for the device registry."""
+from proglove_streams.devices import DeviceRegistry
+
+
+def _event(event_type: str, device_serial: str, **fields) -> dict:
+    return {
+        "event_type": event_type,
+        "device_serial": device_serial,
+        "time_created": 1000,
+        **fields,
+    }
+
+
+def test_connections():
+    """Test the devices are connected and disconnected by the events."""
+    testee = DeviceRegistry()
+
+    testee.update(
+        _event("scanner_state", "A", device_connected_state="STATE_CONNECTED")
+    )
+    testee.update(_event("button_pressed", "B", trigger_gesture="TRIGGER_SINGLE_CLICK"))
+    assert testee.connected() == ["A", "B"]
+
+    testee.update(
+        _event("scanner_state", "A", device_connected_state="STATE_DISCONNECTED")
+    )
+    assert not testee.is_connected("A") and testee.is_connected("B")
+    assert "A" in testee and len(testee) == 2
+
+    testee.update(
+        {
+            "event_type": "gateway_state",
+            "device_connected_list": [{"device_serial": "A"}, {"device_serial": "C"}],
+        }
+    )
+    assert sorted(testee.connected()) == ["A", "C"]
+    assert not testee.is_connected("unknown")
+
+
+def test_last_scan_and_display():
+    """Test the last scan and display of a device are recorded."""
+    testee = DeviceRegistry()
+    display = {"event_type": "display!", "device_serial": "A", "foo": "bar"}
+
+    testee.update(_event("scan", "A", scan_code="123"))
+    testee.record_display(display)
+    state = testee.get("A")
+
+    assert state is not None
+    assert state.connected
+    assert state.last_scan_code == "123" and state.last_scan_time == 1000
+    assert state.last_display == display
+    assert testee.get("B") is None
+
+    # the returned state is a copy
+    state.connected = False
+    assert testee.get("A").connected
+    assert testee.snapshot()["A"].last_scan_code == "123"
+
+
+def test_ignored_events():
+    """Test the events not about the device connectivity are ignored."""
+    testee = DeviceRegistry()
+
+    testee.update(_event("errors", "A", error_code="ERROR_UNKNOWN"))
+    testee.update({"event_type": "scan"})
+    testee.update({"event_type": "gateway_state", "device_connected_list": None})
+    testee.update(["not", "a", "dict"])
+
+    assert len(testee) == 0
+    testee.update(_event("scan", "A"))
+    testee.clear()
+    assert len(testee) == 0
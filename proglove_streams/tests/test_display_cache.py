@@ -0,0 +1,81 @@
+"""Test for the display cache."""
+from unittest.mock import patch
+
+import pytest
+
+from proglove_streams.display_cache import DisplayCache
+from proglove_streams.gateway import display_command
+
+
+def _display(device_serial: str = "A", text: str = "foo", **kwargs) -> dict:
+    return display_command(
+        device_serial,
+        "PG1",
+        [{"display_field_id": 1, "display_field_text": text}],
+        **kwargs,
+    )
+
+
+def test_redundant_displays():
+    """Test only the displays already shown are suppressed."""
+    testee = DisplayCache(ttl=60)
+    fields = [{"display_field_id": 1, "display_field_text": "foo"}]
+    command = display_command("A", "PG1", fields)
+
+    assert not testee.is_shown(command)
+    testee.store(command)
+    # the fields are copied when stored
+    fields[0]["display_field_text"] = "bar"
+
+    assert testee.is_shown(_display())
+    assert not testee.is_shown(_display(text="bar"))
+    assert not testee.is_shown(_display(display_refresh_type="FULL_REFRESH"))
+    assert not testee.is_shown(_display("B"))
+    assert testee.suppressed == 1
+
+
+def test_expiry():
+    """Test the displays expire with the time to live or their validity."""
+    testee = DisplayCache(ttl=10)
+
+    with patch("proglove_streams.display_cache.time.monotonic", return_value=0.0):
+        testee.store(_display("A"))
+        testee.store(_display("B", time_validity_duration=1000))
+
+    with patch("proglove_streams.display_cache.time.monotonic", return_value=5.0):
+        assert testee.is_shown(_display("A"))
+        assert not testee.is_shown(_display("B", time_validity_duration=1000))
+
+    with patch("proglove_streams.display_cache.time.monotonic", return_value=10.0):
+        assert not testee.is_shown(_display("A"))
+    assert len(testee) == 0
+
+
+def test_invalidation():
+    """Test the displays are forgotten on connection changes and errors."""
+    testee = DisplayCache(ttl=60)
+    for device_serial in "ABCD":
+        testee.store(_display(device_serial))
+
+    testee.update({"event_type": "scanner_state", "device_serial": "A"})
+    testee.update({"event_type": "errors", "device_serial": "B"})
+    testee.update({"event_type": "scan", "device_serial": "C"})
+    assert [testee.is_shown(_display(serial)) for serial in "ABCD"] == [
+        False,
+        False,
+        True,
+        True,
+    ]
+
+    testee.update(
+        {
+            "event_type": "gateway_state",
+            "device_connected_list": [{"device_serial": "C"}],
+        }
+    )
+    assert testee.is_shown(_display("C")) and not testee.is_shown(_display("D"))
+
+    testee.invalidate()
+    assert len(testee) == 0
+    with pytest.raises(ValueError):
+        DisplayCache(ttl=0)
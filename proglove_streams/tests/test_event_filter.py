@@ -0,0 +1,54 @@
+"""Test for the event filter module."""
+import pytest
+
+from proglove_streams.event_filter import EventFilter
+
+SCAN = b'{"api_version": "1.0", "event_type": "scan", "device_serial": "M1"}'
+BUTTON = b'{"event_type":"button_pressed","device_serial":"M2"}'
+STATE = (
+    b'{"event_type": "gateway_state", '
+    b'"device_connected_list": [{"device_serial": "M3"}]}'
+)
+ERROR = b'{"event_type": "errors", "device_serial": "M3"}'
+
+
+@pytest.mark.parametrize(
+    "options, accepted",
+    [
+        ({}, [SCAN, BUTTON, STATE, ERROR]),
+        ({"event_types": ["scan"]}, [SCAN]),
+        ({"exclude_event_types": ["scan", "errors"]}, [BUTTON, STATE]),
+        ({"device_serials": ["M1"]}, [SCAN, STATE]),
+        ({"exclude_device_serials": ["M1", "M3"]}, [BUTTON, STATE]),
+        ({"event_types": ["scan", "errors"], "device_serials": ["M3"]}, [ERROR]),
+    ],
+)
+def test_accepts(options, accepted):
+    """Test the lines kept by the filters."""
+    testee = EventFilter(**options)
+
+    assert [line for line in (SCAN, BUTTON, STATE, ERROR) if testee.accepts(line)] == (
+        accepted
+    )
+    assert testee.passed == len(accepted)
+    assert sum(testee.filtered.values()) == 4 - len(accepted)
+
+
+def test_replies_kept():
+    """Test the events which may reply to a command can be kept."""
+    testee = EventFilter(event_types=["scan"])
+
+    assert testee.accepts(STATE, replies=True)
+    assert testee.accepts(ERROR, replies=True)
+    assert not testee.accepts(BUTTON, replies=True)
+    assert testee.filtered == {"button_pressed": 1}
+
+
+def test_undecidable_lines_kept():
+    """Test the lines whose fields cannot be read are decoded."""
+    testee = EventFilter(event_types=["scan"], device_serials=["M1"])
+
+    assert testee.accepts(b"{")
+    assert testee.accepts(b'{"event_type": "sc\\u0061n", "device_serial": "M2"}')
+    assert testee.accepts(b'{"event_type": "scan", "device_serial": "M\\u0031"}')
+    assert not testee.filtered
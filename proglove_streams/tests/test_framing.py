@@ -0,0 +1,62 @@
+"""Test for the line framing module."""
+import pytest
+from serial import serial_for_url
+
+from proglove_streams.framing import LineFramer, discard_input
+
+
+@pytest.mark.parametrize(
+    "chunks, expected",
+    [
+        pytest.param([b"foo\n"], [b"foo"], id="single_line"),
+        pytest.param([b"foo\nbar\nbaz\n"], [b"foo", b"bar", b"baz"], id="burst"),
+        pytest.param([b"fo", b"o\nba", b"r\n"], [b"foo", b"bar"], id="partial"),
+        pytest.param([b"\n\nfoo\n", b"\n"], [b"foo"], id="empty_lines"),
+        pytest.param([b"foo"], [], id="no_newline"),
+    ],
+)
+def test_feed(chunks, expected):
+    """Test splitting chunks into lines."""
+    testee = LineFramer()
+
+    lines = []
+    for chunk in chunks:
+        lines.extend(testee.feed(chunk))
+
+    assert lines == expected
+    assert testee.overflows == 0
+
+
+def test_flush():
+    """Test flushing a partial line."""
+    testee = LineFramer()
+
+    assert testee.feed(b"foo\nbar") == [b"foo"]
+    assert testee.pending == 3
+    assert testee.flush() == b"bar"
+    assert testee.flush() is None
+    assert testee.pending == 0
+
+
+def test_max_line_length():
+    """Test overlong lines are dropped."""
+    testee = LineFramer(max_line_length=4)
+
+    assert testee.feed(b"12345\nfoo\n") == [b"foo"]
+    assert testee.overflows == 1
+
+    assert testee.feed(b"1234") == []
+    assert testee.feed(b"5678") == []
+    assert testee.pending == 0
+    assert testee.feed(b"9\nbar\n") == [b"bar"]
+    assert testee.overflows == 2
+
+
+def test_discard_input():
+    """Test the received data is discarded without waiting for more."""
+    serial = serial_for_url("loop://", timeout=1)
+    serial.write(b'{"event_type": "scan"}\n')
+
+    assert discard_input(serial) == 0
+    assert serial.in_waiting == 0
+    serial.close()
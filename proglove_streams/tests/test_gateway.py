@@ -3,6 +3,7 @@ import json
 import logging
 import os
 import pty
+import socket
 import time
 import uuid
 from threading import Event
@@ -11,6 +12,7 @@ from unittest.mock import Mock, patch
 
 import pytest
 from pydantic import BaseModel
+from serial import SerialException
 from streams_api.customer_integrations.button_pressed.model import ButtonPressedStream
 from streams_api.customer_integrations.errors.model import ErrorsStream
 from streams_api.customer_integrations.gateway_state_event.model import (
@@ -20,8 +22,14 @@ from streams_api.customer_integrations.gateway_state_event.model import (
 from streams_api.customer_integrations.scan.model import DeviceModel, ScanStream
 from streams_api.customer_integrations.scanner_state.model import ScannerStateStream
 
-from proglove_streams.exception import ProgloveStreamsException
-from proglove_streams.gateway import Gateway, GatewayMessageHandler
+from proglove_streams.codec import get_codec
+from proglove_streams.dedup import ScanDeduplicator
+from proglove_streams.event_filter import EventFilter
+from proglove_streams.exception import CommandError, ProgloveStreamsException
+from proglove_streams.gateway import Gateway, GatewayMessageHandler, start_gateways
+from proglove_streams.metrics import Metrics
+from proglove_streams.reconnect import ReconnectPolicy
+from proglove_streams.workers import WorkerDispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +44,12 @@ class _SideEffect:
         self.event.set()
 
 
+def _wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
 @pytest.mark.parametrize(
     "model, callback_name, use_mock",
     [
@@ -165,6 +179,7 @@ def test_events(
         for args in (
             ({"foo": "bar"}, "no_event"),
             ({"event_type": "foo"}, "wrong_event"),
+            ({"event_type": ["scan"]}, "list_event_type"),
             ({"event_type": "button_pressed"}, "wrong_button_pressed"),
             ({"event_type": "scan"}, "wrong_scan"),
             ({"event_type": "scanner_state"}, "wrong_scanner_state"),
@@ -331,12 +346,12 @@ def test_commands(
 
     handler = GatewayMessageHandler()
 
-    testee = Gateway(handler, port=slave_name)
+    testee = Gateway(handler, port=slave_name, codec=get_codec("json"))
 
     testee.start(flush_input=False)
 
-    with patch("proglove_streams.gateway.time.time") as time_patch, patch(
-        "proglove_streams.gateway.uuid.uuid4"
+    with patch("proglove_streams.commands.time.time") as time_patch, patch(
+        "proglove_streams.commands.uuid.uuid4"
     ) as uuid4_patch:
         time_created = 1546300800000
         event_id = "c6fd7137-055a-4feb-8c32-9dbb9a117f6a"
@@ -377,6 +392,31 @@ def test_double_start():
         testee.start(flush_input=False)
 
 
+def test_start_gateways():
+    """Test starting Gateways in parallel, discarding the waiting events."""
+    ports = [pty.openpty() for _ in range(3)]
+    on_scan = Mock()
+    handler = GatewayMessageHandler(on_scan=on_scan)
+    gateways = [Gateway(handler, port=os.ttyname(slave)) for _, slave in ports]
+    gateways.append(Gateway(handler, port="/dev/does-not-exist"))
+    for master, _ in ports:
+        os.write(master, b'{"event_type": "scan", "scan_code": "foo"}\n')
+
+    start = time.monotonic()
+    errors = start_gateways(gateways)
+    assert time.monotonic() - start < 1
+
+    assert list(errors) == ["/dev/does-not-exist"]
+    assert all(gateway.is_running for gateway in gateways[:3])
+    for gateway in gateways:
+        gateway.stop()
+    for master, slave in ports:
+        os.close(master)
+        os.close(slave)
+    on_scan.assert_not_called()
+    assert start_gateways([]) == {}
+
+
 def test_thread_error():
     """Test error in the receiving thread."""
     _, slave = pty.openpty()
@@ -423,3 +463,561 @@ def test_malformed_json():
     os.write(master, b"{")
 
     testee.stop()
+
+
+def test_register_event():
+    """Test registering a callback for a new event type."""
+    client = Mock()
+    callback = Mock()
+    handler = GatewayMessageHandler()
+    handler.register("foo", callback)
+
+    handler.handle(client, {"event_type": "foo", "bar": 42})
+    callback.assert_called_once_with(client, {"event_type": "foo", "bar": 42})
+
+    handler.unregister("foo")
+    handler.handle(client, {"event_type": "foo", "bar": 42})
+    callback.assert_called_once()
+
+
+@pytest.mark.parametrize("event_type", [["scan"], {"scan": 1}, 42])
+def test_invalid_event_type(event_type: Any):
+    """Test an event_type which is not a string is treated like a missing one."""
+    on_scan = Mock()
+    handler = GatewayMessageHandler(on_scan=on_scan)
+
+    assert handler.resolve({"event_type": event_type}) is None
+    handler.handle(Mock(), {"event_type": event_type})
+    on_scan.assert_not_called()
+
+
+def test_scan_dedup():
+    """Test the scans repeated by a device are not handled."""
+    client = Mock()
+    callback = Mock()
+    metrics = Metrics()
+    handler = GatewayMessageHandler(scan_dedup=ScanDeduplicator(60), metrics=metrics)
+    handler.register("scan", callback)
+    handler.register("button_pressed", callback)
+    scan = {"event_type": "scan", "device_serial": "M1", "scan_code": "A"}
+
+    handler.handle(client, scan)
+    handler.handle(client, dict(scan))
+    handler.handle(client, dict(scan, device_serial="M2"))
+    handler.handle(client, {"event_type": "button_pressed", "device_serial": "M1"})
+    handler.handle(client, {"event_type": "button_pressed", "device_serial": "M1"})
+
+    assert callback.call_count == 4
+    assert handler.scan_dedup is not None and handler.scan_dedup.suppressed == 1
+    assert metrics.snapshot()["scans_suppressed"] == 1
+
+
+def test_unhandled_event_not_parsed():
+    """Test events without callback are not parsed."""
+    handler = GatewayMessageHandler()
+
+    with patch.object(ScanStream, "parse_obj") as parse_obj:
+        handler.handle(Mock(), {"event_type": "scan", "scan_code": "foo"})
+        parse_obj.assert_not_called()
+
+        handler.on_scan = Mock()
+        handler.handle(Mock(), {"event_type": "scan", "scan_code": "foo"})
+        parse_obj.assert_called_once()
+        handler.on_scan.assert_called_once()
+
+
+@pytest.mark.parametrize("validation", ["full", "lazy", "none"])
+def test_validation_modes(validation: str):
+    """Test the callbacks receive the event in every validation mode."""
+    client = Mock()
+    on_scan = Mock()
+    handler = GatewayMessageHandler(on_scan=on_scan, validation=validation)
+
+    model = ScanStream(
+        api_version="1.0",
+        event_id=str(uuid.uuid4()),
+        time_created=int(time.time() * 1000),
+        gateway_serial="PGGW000000042",
+        device_serial="123456789",
+        device_model=DeviceModel.m2_mr,
+        scan_code="foo bar baz",
+    )
+    handler.handle(client, json.loads(model.json(exclude_none=True)))
+
+    (_, stream), _ = on_scan.call_args
+    assert stream.device_serial == "123456789"
+    assert stream.scan_code == "foo bar baz"
+
+
+def test_unknown_validation_mode():
+    """Test an unknown validation mode is refused."""
+    with pytest.raises(ValueError):
+        GatewayMessageHandler(validation="foo")
+
+
+def test_worker_dispatch():
+    """Test the handler runs on the worker threads."""
+    master, slave = pty.openpty()
+    slave_name = os.ttyname(slave)
+
+    event = Event()
+    callback = Mock(side_effect=_SideEffect(event).side_effect)
+    handler = GatewayMessageHandler()
+    handler.register("foo", callback)
+    dispatcher = WorkerDispatcher(workers=2)
+
+    with Gateway(handler, port=slave_name, dispatcher=dispatcher) as testee:
+        assert dispatcher.is_running
+        os.write(master, b'{"event_type": "foo", "device_serial": "12345"}\n')
+        assert event.wait(timeout=1)
+
+    assert not dispatcher.is_running
+    callback.assert_called_once_with(
+        testee, {"event_type": "foo", "device_serial": "12345"}
+    )
+    assert dispatcher.stats().processed == 1
+
+
+def test_coalesced_commands():
+    """Test commands written by the writer thread."""
+    master, slave = pty.openpty()
+    slave_name = os.ttyname(slave)
+
+    handler = GatewayMessageHandler()
+
+    with Gateway(handler, port=slave_name, coalesce_writes=True) as testee:
+        for index in range(3):
+            testee.send_feedback(str(index), "FEEDBACK_POSITIVE")
+
+        # pylint: disable=protected-access
+        assert testee._writer.flush(timeout=1)
+        stats = testee.writer_stats()
+
+    data = os.read(master, stats.bytes_written)
+    commands = [json.loads(line) for line in data.splitlines()]
+    assert [command["device_serial"] for command in commands] == ["0", "1", "2"]
+    assert stats.commands == 3
+    assert Gateway(handler, port=slave_name).writer_stats() is None
+
+
+def test_coalesced_write_error():
+    """Test the futures of the commands the writer thread could not write fail."""
+    master, slave = pty.openpty()
+
+    with Gateway(
+        GatewayMessageHandler(), port=os.ttyname(slave), coalesce_writes=True
+    ) as testee:
+        # pylint: disable=protected-access
+        testee._serial.write = Mock(side_effect=SerialException("foo"))
+        future = testee.send_feedback("M2MR111100928", "FEEDBACK_POSITIVE")
+
+        with pytest.raises(ProgloveStreamsException, match="foo"):
+            future.result(timeout=1)
+        assert testee.writer_stats().errors == 1
+
+    os.close(master)
+    os.close(slave)
+
+
+def test_send_batch():
+    """Test sending a batch of commands with a single write."""
+    master, slave = pty.openpty()
+    slave_name = os.ttyname(slave)
+
+    handler = GatewayMessageHandler()
+
+    with Gateway(handler, port=slave_name) as testee:
+        batch = testee.new_batch()
+        display_ids = batch.set_display(
+            ["1", "2", "3"],
+            "PG3",
+            [{"display_field_id": 1, "display_field_text": "R15"}],
+            time_validity_duration=1234,
+        )
+        feedback_ids = batch.send_feedback(["4"], "FEEDBACK_POSITIVE")
+
+        # pylint: disable=protected-access
+        with patch.object(
+            testee._serial, "write", wraps=testee._serial.write
+        ) as write_mock:
+            event_ids = testee.send_batch(batch)
+            write_mock.assert_called_once()
+
+        assert event_ids == display_ids + feedback_ids
+        data = os.read(master, len(write_mock.call_args[0][0]))
+
+        commands = [json.loads(line) for line in data.splitlines()]
+        assert [command["event_id"] for command in commands] == event_ids
+        assert commands[0] == {
+            "api_version": "1.0",
+            "event_type": "display!",
+            "event_id": display_ids[0],
+            "time_created": commands[0]["time_created"],
+            "device_serial": "1",
+            "display_template_id": "PG3",
+            "display_refresh_type": "DEFAULT",
+            "display_fields": [{"display_field_id": 1, "display_field_text": "R15"}],
+            "time_validity_duration": 1234,
+        }
+        assert commands[3]["feedback_action_id"] == "FEEDBACK_POSITIVE"
+
+        command = {"api_version": "1.0", "event_type": "gateway_state!"}
+        command["event_id"] = "foo"
+        assert testee.send_batch([command]) == ["foo"]
+        assert json.loads(os.read(master, 1024)) == command
+
+
+def test_command_futures():
+    """Test the command futures are resolved by the replies."""
+    master, slave = pty.openpty()
+    slave_name = os.ttyname(slave)
+
+    handler = GatewayMessageHandler()
+    state = GatewayStateEventStream(
+        api_version="1.0",
+        event_id=str(uuid.uuid4()),
+        time_created=int(time.time() * 1000),
+        gateway_app_version="1.2.3",
+        gateway_serial="PGGW000000042",
+        device_connected_list=[DeviceConnectedListItem(device_serial="M2MR111100928")],
+    )
+
+    with Gateway(handler, port=slave_name, command_timeout=0.2) as testee:
+        display = testee.set_display(
+            "M2MR111100928", "PG1", [{"display_field_id": 1, "display_field_text": "A"}]
+        )
+        command = json.loads(os.read(master, 1024))
+        error = ErrorsStream(
+            api_version="1.0",
+            event_id=str(uuid.uuid4()),
+            time_created=int(time.time() * 1000),
+            gateway_serial="PGGW000000042",
+            device_serial="M2MR111100928",
+            error_code="ERROR_UNKNOWN",
+            event_reference_id=command["event_id"],
+            error_severity="CRITICAL",
+        )
+        os.write(master, error.json(exclude_none=True).encode() + b"\n")
+        with pytest.raises(CommandError) as command_error:
+            display.result(timeout=1)
+        assert command_error.value.error_code == "ERROR_UNKNOWN"
+
+        gateway_state = testee.get_gateway_state()
+        os.read(master, 1024)
+        os.write(master, state.json(exclude_none=True).encode() + b"\n")
+        assert gateway_state.result(timeout=1) == state
+        assert testee.devices.is_connected("M2MR111100928")
+        device = testee.devices.get("M2MR111100928")
+        assert device is not None and device.last_display == command
+
+        assert testee.send_feedback("M2MR111100928", "FOO").result(timeout=1) is None
+        with pytest.raises(TimeoutError):
+            testee.get_gateway_state().result(timeout=1)
+
+        pending = testee.send_feedback("M2MR111100928", "FOO")
+
+    assert pending.cancelled()
+
+
+def test_metrics():
+    """Test the metrics recorded by the Gateway and its handler."""
+    master, slave = pty.openpty()
+    slave_name = os.ttyname(slave)
+
+    metrics = Metrics()
+    received = Event()
+    handler = GatewayMessageHandler(
+        on_scan=lambda *_args: received.set(), metrics=metrics
+    )
+    scan = ScanStream(
+        api_version="1.0",
+        event_id=str(uuid.uuid4()),
+        time_created=int(time.time() * 1000),
+        gateway_serial="PGGW000000042",
+        device_serial="123456789",
+        device_model=DeviceModel.m2_mr,
+        scan_code="foo bar baz",
+    )
+
+    with Gateway(handler, port=slave_name, metrics=metrics) as testee:
+        os.write(master, b"{\n" + scan.json(exclude_none=True).encode() + b"\n")
+        assert received.wait(timeout=1)
+        testee.send_feedback("123456789", "FEEDBACK_POSITIVE")
+
+    snapshot = metrics.snapshot()
+    assert snapshot["lines_read"] == 2
+    assert snapshot["malformed_lines"] == 1
+    assert snapshot["bytes_read"] > 0
+    assert snapshot["decode_seconds"].count == 1
+    assert snapshot['dispatch_seconds{event_type="scan"}'].count == 1
+    assert snapshot['validation_seconds{event_type="scan"}'].count == 1
+    assert snapshot['callback_seconds{event_type="scan"}'].count == 1
+    assert snapshot['commands_sent{event_type="feedback!"}'] == 1
+    assert snapshot["write_seconds"].count == 1
+    assert snapshot["bytes_written"] > 0
+
+
+def test_reconnect():
+    """Test the commands not delivered are sent again once reconnected."""
+    server = socket.create_server(("localhost", 0))
+    server.settimeout(5)
+    port = server.getsockname()[1]
+    metrics = Metrics()
+    policy = ReconnectPolicy(initial_delay=0.01, max_delay=0.05)
+    testee = Gateway(
+        GatewayMessageHandler(),
+        f"socket://localhost:{port}",
+        reconnect=policy,
+        metrics=metrics,
+    )
+
+    testee.start(flush_input=False)
+    connection, _ = server.accept()
+    delivered = testee.send_feedback("M2MR000000000", "FEEDBACK_POSITIVE")
+    assert json.loads(connection.makefile("rb").readline())["device_serial"] == (
+        "M2MR000000000"
+    )
+
+    # the reconnection attempts fail until the server listens again
+    server.close()
+    connection.close()
+    _wait_for(lambda: metrics.snapshot().get("reconnect_attempts", 0) >= 1)
+    queued = testee.send_feedback("M2MR000000001", "FEEDBACK_POSITIVE")
+
+    server = socket.create_server(("localhost", port))
+    server.settimeout(5)
+    connection, _ = server.accept()
+    # the delivered command, sent first otherwise, is not sent again
+    assert json.loads(connection.makefile("rb").readline())["device_serial"] == (
+        "M2MR000000001"
+    )
+    assert not delivered.done() and not queued.done()
+    assert testee.is_running
+
+    testee.stop()
+    connection.close()
+    server.close()
+
+    assert delivered.cancelled() and queued.cancelled()
+    snapshot = metrics.snapshot()
+    assert snapshot["reconnects"] == 1
+    assert snapshot["commands_reissued"] == 1
+    assert snapshot["reconnect_seconds"].count == 1
+
+
+def test_reconnect_exhausted():
+    """Test the Gateway stops once the reconnection attempts are exhausted."""
+    server = socket.create_server(("localhost", 0))
+    server.settimeout(5)
+    policy = ReconnectPolicy(initial_delay=0.01, max_delay=0.01, max_attempts=2)
+    testee = Gateway(
+        GatewayMessageHandler(),
+        f"socket://localhost:{server.getsockname()[1]}",
+        reconnect=policy,
+    )
+
+    testee.start(flush_input=False)
+    connection, _ = server.accept()
+    server.close()
+    future = testee.get_gateway_state()
+    connection.close()
+
+    with pytest.raises(ProgloveStreamsException):
+        future.result(timeout=5)
+    assert not testee.is_running
+    testee.stop()
+
+
+def test_metric_labels():
+    """Test the event types neither known nor routed share a label."""
+    metrics = Metrics()
+    handler = GatewayMessageHandler(metrics=metrics)
+    handler.register("foo", Mock())
+    testee = Gateway(handler, port="/dev/null", metrics=metrics)
+
+    for event_type in ("scan", "foo", "bar", "baz"):
+        testee.feed(b'{"event_type": "%s"}' % event_type.encode())
+    testee.feed(b'{"event_type": 42}')
+
+    labels = [name for name in metrics.snapshot() if name.startswith("dispatch")]
+    assert sorted(labels) == [
+        'dispatch_seconds{event_type="foo"}',
+        'dispatch_seconds{event_type="scan"}',
+        'dispatch_seconds{event_type="unknown"}',
+    ]
+    assert metrics.snapshot()['dispatch_seconds{event_type="unknown"}'].count == 3
+
+
+def test_external_loop():
+    """Test the hooks servicing the port without the input thread."""
+    master, slave = pty.openpty()
+    on_scan = Mock()
+    testee = Gateway(
+        GatewayMessageHandler(on_scan=on_scan),
+        port=os.ttyname(slave),
+        command_timeout=0,
+    )
+    with pytest.raises(ProgloveStreamsException):
+        testee.fileno()
+
+    testee.open()
+    assert not testee.is_running
+    assert testee.fileno() >= 0
+    scan = ScanStream(
+        api_version="1.0",
+        event_id=str(uuid.uuid4()),
+        time_created=int(time.time() * 1000),
+        gateway_serial="PGGW000000042",
+        device_serial="123456789",
+        device_model=DeviceModel.m2_mr,
+        scan_code="foo bar baz",
+    )
+    os.write(master, scan.json(exclude_none=True).encode() + b"\n")
+    data = b""
+    while not data.endswith(b"\n"):
+        data += testee.read()
+    assert testee.feed(data.rstrip(b"\n"))
+    assert not testee.feed(b"{")
+    on_scan.assert_called_once()
+
+    expired = testee.send_feedback("M2MR111100928", "FOO")
+    assert testee.expire_pending() == 1
+    assert expired.result(timeout=0) is None
+    failed = testee.get_gateway_state()
+    testee.fail_pending(ProgloveStreamsException("foo"))
+    with pytest.raises(ProgloveStreamsException):
+        failed.result(timeout=0)
+
+    testee.close()
+    with pytest.raises(ProgloveStreamsException):
+        testee.read()
+    os.close(master)
+    os.close(slave)
+
+
+def test_display_cache():
+    """Test the displays already shown are not sent again."""
+    master, slave = pty.openpty()
+    metrics = Metrics()
+    fields = [{"display_field_id": 1, "display_field_text": "A"}]
+
+    with Gateway(
+        GatewayMessageHandler(),
+        port=os.ttyname(slave),
+        display_cache_ttl=60,
+        metrics=metrics,
+    ) as testee:
+        testee.set_display("M2MR111100928", "PG1", fields)
+        assert json.loads(os.read(master, 1024))["event_type"] == "display!"
+
+        suppressed = testee.set_display("M2MR111100928", "PG1", fields)
+        assert suppressed.result(timeout=0) is None
+
+        testee.set_display("M2MR111100928", "PG2", fields)
+        assert json.loads(os.read(master, 1024))["display_template_id"] == "PG2"
+
+    assert testee.display_cache is not None
+    assert testee.display_cache.suppressed == 1
+    assert metrics.snapshot()["displays_suppressed"] == 1
+    os.close(master)
+    os.close(slave)
+
+
+def test_display_cache_batch():
+    """Test the displays of a batch are recorded as shown."""
+    master, slave = pty.openpty()
+    fields_a = [{"display_field_id": 1, "display_field_text": "A"}]
+    fields_b = [{"display_field_id": 1, "display_field_text": "B"}]
+
+    with Gateway(
+        GatewayMessageHandler(), port=os.ttyname(slave), display_cache_ttl=60
+    ) as testee:
+        testee.set_display("M2MR111100928", "PG1", fields_a)
+        os.read(master, 1024)
+
+        batch = testee.new_batch()
+        batch.set_display(["M2MR111100928"], "PG1", fields_b)
+        testee.send_batch(batch)
+        os.read(master, 1024)
+
+        testee.set_display("M2MR111100928", "PG1", fields_a)
+        command = json.loads(os.read(master, 1024))
+        assert command["display_fields"] == fields_a
+
+        device = testee.devices.get("M2MR111100928")
+        assert device is not None and device.last_display is not None
+        assert device.last_display["display_fields"] == fields_a
+
+    assert testee.display_cache is not None
+    assert testee.display_cache.suppressed == 0
+    os.close(master)
+    os.close(slave)
+
+
+def test_display_cache_invalidation():
+    """Test the displays are sent again after an error or a restart."""
+    master, slave = pty.openpty()
+    fields = [{"display_field_id": 1, "display_field_text": "A"}]
+
+    testee = Gateway(
+        GatewayMessageHandler(), port=os.ttyname(slave), display_cache_ttl=60
+    )
+    testee.start()
+    display = testee.set_display("M2MR111100928", "PG1", fields)
+    command = json.loads(os.read(master, 1024))
+
+    # the device of the error is the one of the command it replies to
+    error = {
+        "event_type": "errors",
+        "event_id": str(uuid.uuid4()),
+        "error_code": "ERROR_UNKNOWN",
+        "event_reference_id": command["event_id"],
+    }
+    os.write(master, json.dumps(error).encode() + b"\n")
+    with pytest.raises(CommandError):
+        display.result(timeout=1)
+
+    testee.set_display("M2MR111100928", "PG1", fields)
+    os.read(master, 1024)
+    testee.stop()
+    assert testee.display_cache is not None
+    assert len(testee.display_cache) == 0
+
+    testee.start()
+    testee.set_display("M2MR111100928", "PG1", fields)
+    assert json.loads(os.read(master, 1024))["display_fields"] == fields
+    testee.stop()
+
+    assert testee.display_cache.suppressed == 0
+    os.close(master)
+    os.close(slave)
+
+
+def test_event_filter():
+    """Test the filtered events are neither decoded nor handled."""
+    master, slave = pty.openpty()
+    metrics = Metrics()
+    on_scan = Mock()
+    received = Event()
+    handler = GatewayMessageHandler(on_scan=on_scan)
+    handler.register("button_pressed", lambda *_args: received.set())
+    event_filter = EventFilter(exclude_event_types=["scan"])
+
+    with Gateway(
+        handler, port=os.ttyname(slave), metrics=metrics, event_filter=event_filter
+    ) as testee:
+        os.write(
+            master,
+            b'{"event_type": "scan", "device_serial": "M2MR111100928"}\n'
+            b'{"event_type": "button_pressed", "device_serial": "M2MR111100928"}\n',
+        )
+        assert received.wait(timeout=1)
+
+    on_scan.assert_not_called()
+    assert testee.event_filter is event_filter
+    assert event_filter.filtered == {"scan": 1}
+    snapshot = metrics.snapshot()
+    assert snapshot["events_filtered"] == 1
+    assert snapshot["decode_seconds"].count == 1
+    os.close(master)
+    os.close(slave)
@@ -0,0 +1,70 @@
+"""Test the modules imported by the package."""
+import os
+import subprocess
+import sys
+from typing import List
+
+# slow to import, and only needed by some features
+LAZY_MODULES = (
+    "streams_api",
+    "pydantic",
+    "colorlog",
+    "http.server",
+    "logging.handlers",
+    "serial.tools.list_ports",
+)
+
+
+def _imported_modules(code: str) -> List[str]:
+    """Run code in a new interpreter and list the modules it imported.
+
+    The modules imported with ``importlib`` are not reported by ``-X
+    importtime``, the modules loaded at exit are listed as well.
+
+    """
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            code + "import sys\nprint('\\n'.join(sys.modules))\n",
+        ],
+        capture_output=True,
+        check=True,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+        text=True,
+    )
+    imported = [
+        line.rsplit("|", 1)[1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and "|" in line
+    ]
+    return imported + result.stdout.split()
+
+
+def test_lazy_imports():
+    """Test creating a Gateway does not import the models nor the extras."""
+    modules = _imported_modules(
+        "import proglove_streams.gateway\n"
+        "from proglove_streams import Gateway, GatewayMessageHandler\n"
+        "Gateway(GatewayMessageHandler(), 'loop://')\n"
+    )
+
+    assert "proglove_streams.gateway" in modules
+    for module in modules:
+        assert not module.startswith(LAZY_MODULES), module
+
+
+def test_models_imported_on_use():
+    """Test only the model of the handled event type is imported."""
+    modules = _imported_modules(
+        "from unittest.mock import Mock\n"
+        "from proglove_streams.gateway import GatewayMessageHandler\n"
+        "handler = GatewayMessageHandler(on_scan=Mock())\n"
+        "handler.handle(Mock(), {'event_type': 'scan'})\n"
+        "handler.handle(Mock(), {'event_type': 'button_pressed'})\n"
+    )
+
+    assert "streams_api.customer_integrations.scan.model" in modules
+    assert "streams_api.customer_integrations.button_pressed.model" not in modules
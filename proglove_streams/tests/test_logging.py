@@ -1,10 +1,159 @@
 """Test for the logging module."""
-from unittest.mock import patch
+import json
+import logging
+import sys
+from threading import Event
+from unittest.mock import Mock, patch
 
-from proglove_streams.logging import init_logging
+from proglove_streams.logging import (
+    JsonFormatter,
+    LogSampler,
+    dropped_records,
+    init_logging,
+    log_sampled,
+    stop_logging,
+)
 
 
 def test_logging():
     """Test the logging functionality."""
-    with patch("proglove_streams.logging.logging.StreamHandler"):
+    # keep the mocked handler out of the root logger used by the other tests
+    with patch("proglove_streams.logging.logging.StreamHandler"), patch.object(
+        logging.getLogger(), "handlers", []
+    ):
         init_logging()
+
+
+def test_queued_logging():
+    """Test the records are formatted and written by the listener thread."""
+    handler = Mock(level=logging.DEBUG)
+    root = logging.getLogger()
+    with patch(
+        "proglove_streams.logging.logging.StreamHandler", return_value=handler
+    ), patch.object(root, "handlers", []):
+        init_logging(queued=True)
+        event = {"event_type": "scan"}
+        logging.getLogger("proglove_streams.test").debug("event: %s", event)
+        # the message is rendered when logged, not when written
+        event["event_type"] = "button_pressed"
+        stop_logging()
+        assert not root.handlers
+
+    # the record is only formatted by the listener handler
+    handler.handle.assert_called_once()
+    record = handler.handle.call_args[0][0]
+    assert record.getMessage() == "event: {'event_type': 'scan'}"
+    assert not hasattr(record, "asctime")
+
+
+def test_sampler():
+    """Test the records are rate limited per key."""
+    testee = LogSampler(rate=2)
+
+    with patch("proglove_streams.logging.time.monotonic", return_value=0.0):
+        assert [testee.allow("scan") for _ in range(4)] == [0, 0, None, None]
+        assert testee.allow("button_pressed") == 0
+
+    with patch("proglove_streams.logging.time.monotonic", return_value=1.0):
+        assert testee.allow("scan") == 2
+        assert testee.allow("scan") == 0
+
+    assert LogSampler().allow("scan") == 0
+
+
+def test_log_sampled():
+    """Test the sampled records report the suppressed ones."""
+    logger = Mock()
+    logger.name = "test"
+    logger.isEnabledFor.return_value = True
+
+    # a fixed time, the clock patched is shared with the threads of other tests
+    with patch("proglove_streams.logging._sampler", LogSampler(rate=1)), patch(
+        "proglove_streams.logging.time.monotonic"
+    ) as monotonic:
+        for now in (0.0, 0.5, 1.5):
+            monotonic.return_value = now
+            log_sampled(logger, logging.DEBUG, "scan", "event %s", "foo")
+
+    assert logger.log.call_args_list == [
+        ((logging.DEBUG, "event %s", "foo"),),
+        ((logging.DEBUG, "event %s (%u similar records suppressed)", "foo", 1),),
+    ]
+
+    logger.isEnabledFor.return_value = False
+    log_sampled(logger, logging.DEBUG, "scan", "event %s", "foo")
+    assert logger.log.call_count == 2
+
+
+def test_log_sampled_event():
+    """Test the event fields are added to the sampled records."""
+    logger = Mock()
+    logger.name = "test"
+    logger.isEnabledFor.return_value = True
+    event = {"event_type": "scan", "event_id": "42", "scan_code": "foo"}
+
+    log_sampled(logger, logging.DEBUG, "scan", "event %s", event, event=event)
+
+    assert logger.log.call_args == (
+        (logging.DEBUG, "event %s", event),
+        {"extra": {"device_serial": None, "event_type": "scan", "event_id": "42"}},
+    )
+
+
+def test_json_formatter():
+    """Test the records are formatted as JSON lines."""
+    record = logging.makeLogRecord(
+        {
+            "name": "proglove_streams.handler",
+            "levelname": "DEBUG",
+            "msg": "event received: %s",
+            "args": ("foo",),
+            "created": 0.5,
+            "device_serial": "M2MR000000000",
+            "event_type": "scan",
+            "event_id": None,
+        }
+    )
+
+    line = JsonFormatter().format(record)
+
+    assert "\n" not in line
+    assert json.loads(line) == {
+        "time": "1970-01-01T00:00:00.500+00:00",
+        "level": "DEBUG",
+        "logger": "proglove_streams.handler",
+        "message": "event received: foo",
+        "device_serial": "M2MR000000000",
+        "event_type": "scan",
+    }
+
+    try:
+        raise ValueError("foo")
+    except ValueError:
+        record = logging.makeLogRecord({"msg": "failed", "exc_info": sys.exc_info()})
+    assert "ValueError: foo" in json.loads(JsonFormatter().format(record))["exception"]
+
+
+def test_dropped_records():
+    """Test the records are dropped instead of blocking when the queue is full."""
+    blocked = Event()
+    handler = Mock(level=logging.DEBUG)
+    handler.handle.side_effect = lambda _: blocked.wait(5)
+    root = logging.getLogger()
+    before = dropped_records()
+    with patch(
+        "proglove_streams.logging.logging.StreamHandler", return_value=handler
+    ), patch.object(root, "handlers", []):
+        init_logging(queued=True, queue_size=2)
+        for index in range(10):
+            logging.getLogger("proglove_streams.test").info("record %u", index)
+
+        # two records are queued, and one more if the listener holds one
+        dropped = dropped_records() - before
+        assert dropped in (7, 8)
+        blocked.set()
+        stop_logging()
+
+    assert handler.handle.call_count + dropped == 10
+    # still counted once the logging stopped
+    assert dropped_records() == before + dropped
@@ -0,0 +1,73 @@
+"""Test for the metrics module."""
+import urllib.request
+
+from proglove_streams.metrics import Metrics
+
+
+def test_counters():
+    """Test the counters are shared per name and labels."""
+    testee = Metrics()
+
+    testee.counter("lines_read").inc()
+    testee.counter("lines_read").inc(2)
+    testee.counter("commands_sent", event_type="display!").inc()
+
+    assert testee.snapshot() == {
+        "lines_read": 3,
+        'commands_sent{event_type="display!"}': 1,
+    }
+
+
+def test_histograms():
+    """Test the histogram buckets and quantiles."""
+    testee = Metrics(buckets=(0.001, 0.01, 0.1))
+
+    histogram = testee.histogram("dispatch_seconds", event_type="scan")
+    for value in (0.0005, 0.001, 0.005, 0.05, 5.0):
+        histogram.observe(value)
+
+    snapshot = testee.snapshot()['dispatch_seconds{event_type="scan"}']
+    assert snapshot.count == 5
+    assert snapshot.buckets == {0.001: 2, 0.01: 3, 0.1: 4}
+    assert snapshot.mean == snapshot.sum / 5
+    assert snapshot.quantile(0.5) == 0.01
+    assert snapshot.quantile(0.99) == float("inf")
+
+
+def test_prometheus():
+    """Test the Prometheus text format."""
+    testee = Metrics(buckets=(0.001,))
+    testee.counter("lines_read").inc(3)
+    testee.histogram("callback_seconds", event_type='"quoted"').observe(0.0005)
+
+    assert testee.prometheus() == (
+        "# HELP proglove_streams_lines_read_total Lines read from the serial port.\n"
+        "# TYPE proglove_streams_lines_read_total counter\n"
+        "proglove_streams_lines_read_total 3\n"
+        "# HELP proglove_streams_callback_seconds "
+        "Time spent in the callback of an event.\n"
+        "# TYPE proglove_streams_callback_seconds histogram\n"
+        'proglove_streams_callback_seconds_bucket{event_type="\\"quoted\\"",'
+        'le="0.001"} 1\n'
+        'proglove_streams_callback_seconds_bucket{event_type="\\"quoted\\"",'
+        'le="+Inf"} 1\n'
+        'proglove_streams_callback_seconds_sum{event_type="\\"quoted\\""} 0.0005\n'
+        'proglove_streams_callback_seconds_count{event_type="\\"quoted\\""} 1\n'
+    )
+
+
+def test_serve():
+    """Test serving the metrics over HTTP."""
+    testee = Metrics()
+    testee.counter("bytes_read").inc(42)
+
+    server = testee.serve(0, "localhost")
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://localhost:{port}/metrics") as response:
+            body = response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert "proglove_streams_bytes_read_total 42\n" in body
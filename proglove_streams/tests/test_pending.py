@@ -0,0 +1,176 @@
+"""Test for the pending commands module."""
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from proglove_streams.exception import CommandError
+from proglove_streams.pending import PendingRequests
+
+
+def _error(event_reference_id: str) -> dict:
+    return {
+        "api_version": "1.0",
+        "event_type": "errors",
+        "event_id": "e1",
+        "time_created": 1546300800000,
+        "gateway_serial": "PGGW000000042",
+        "device_serial": "123456789",
+        "error_code": "ERROR_UNKNOWN",
+        "event_reference_id": event_reference_id,
+        "error_severity": "CRITICAL",
+    }
+
+
+def test_error_reply():
+    """Test an errors event fails the command it refers to."""
+    testee = PendingRequests()
+    failed: Future = Future()
+    other: Future = Future()
+    testee.add("1", "display!", failed, True)
+    testee.add("2", "display!", other, True)
+
+    testee.correlate(_error("1"), dict)
+    testee.correlate(_error("unknown"), dict)
+
+    with pytest.raises(CommandError) as error:
+        failed.result(timeout=0)
+    assert error.value.error_code == "ERROR_UNKNOWN"
+    assert error.value.error_severity == "CRITICAL"
+    assert not other.done()
+    assert len(testee) == 1 and "2" in testee
+
+
+def test_gateway_state_reply():
+    """Test a gateway_state event resolves the gateway_state! commands."""
+    testee = PendingRequests()
+    first: Future = Future()
+    second: Future = Future()
+    feedback: Future = Future()
+    testee.add("1", "gateway_state!", first, False)
+    testee.add("2", "gateway_state!", second, False)
+    testee.add("3", "feedback!", feedback, True)
+
+    testee.correlate({"event_type": "gateway_state", "foo": "bar"}, lambda e: e["foo"])
+
+    assert first.result(timeout=0) == second.result(timeout=0) == "bar"
+    assert not feedback.done()
+    assert len(testee) == 1
+
+
+def test_invalid_gateway_state_reply():
+    """Test an invalid gateway_state event leaves the commands pending."""
+
+    def parse_state(_event: dict) -> None:
+        raise ValueError("invalid")
+
+    testee = PendingRequests()
+    future: Future = Future()
+    testee.add("1", "gateway_state!", future, False)
+
+    testee.correlate({"event_type": "gateway_state"}, parse_state)
+    testee.correlate(["not", "an", "event"], parse_state)
+
+    assert not future.done()
+
+
+def test_expire():
+    """Test the commands are resolved or failed when their timeout expires."""
+    testee = PendingRequests(timeout=0.01)
+    feedback: Future = Future()
+    state: Future = Future()
+    late: Future = Future()
+    testee.add("1", "feedback!", feedback, True)
+    testee.add("2", "gateway_state!", state, False)
+    testee.add("3", "feedback!", late, True, timeout=10)
+
+    assert testee.expire() == 0
+    time.sleep(0.02)
+    assert testee.expire() == 2
+
+    assert feedback.result(timeout=0) is None
+    with pytest.raises(TimeoutError):
+        state.result(timeout=0)
+    assert not late.done()
+    assert testee.expired == 2
+
+
+def test_next_deadline():
+    """Test the next deadline skips the resolved commands."""
+    testee = PendingRequests(timeout=10)
+    assert testee.next_deadline() is None
+
+    testee.add("1", "feedback!", Future(), True, timeout=1)
+    testee.add("2", "feedback!", Future(), True, timeout=2)
+    before = time.monotonic()
+    testee.resolve("1")
+
+    deadline = testee.next_deadline()
+    assert deadline is not None and before < deadline <= before + 2
+    testee.resolve("2")
+    assert testee.next_deadline() is None
+
+
+def test_max_pending():
+    """Test the oldest command expires when the index is full."""
+    testee = PendingRequests(max_pending=2)
+    futures = [Future() for _ in range(3)]
+    for index, future in enumerate(futures):
+        testee.add(str(index), "feedback!", future, True)
+
+    assert futures[0].result(timeout=0) is None
+    assert not futures[1].done() and not futures[2].done()
+    assert len(testee) == 2
+
+
+def test_deadlines_compacted():
+    """Test the deadlines of resolved commands do not accumulate."""
+    testee = PendingRequests()
+    for index in range(1000):
+        testee.add(str(index), "feedback!", Future(), True)
+        testee.resolve(str(index))
+
+    # pylint: disable=protected-access
+    assert len(testee._deadlines) <= 2 + 64
+    assert not testee._by_type
+
+
+def test_discard_and_cancel():
+    """Test discarding and cancelling pending commands."""
+    testee = PendingRequests()
+    discarded: Future = Future()
+    cancelled: Future = Future()
+    testee.add("1", "feedback!", discarded, True)
+    testee.add("2", "feedback!", cancelled, True)
+
+    testee.discard("1")
+    testee.discard("unknown")
+    testee.cancel_all()
+
+    assert not discarded.done()
+    assert cancelled.cancelled()
+    assert not testee.resolve("2")
+    assert not testee.fail("2", ValueError())
+    assert len(testee) == 0
+
+
+def test_suspend_and_resume():
+    """Test the commands do not expire while suspended and are resent."""
+    testee = PendingRequests(timeout=0.01)
+    futures = [Future() for _ in range(3)]
+    testee.add("1", "feedback!", futures[0], True, data=b"1\n")
+    testee.add("2", "gateway_state!", futures[1], False, data=b"2\n")
+    testee.add("3", "feedback!", futures[2], True)
+
+    testee.suspend()
+    time.sleep(0.02)
+    assert testee.expire() == 0
+
+    assert testee.resume() == {"1": b"1\n", "2": b"2\n"}
+    # not sent again once written
+    testee.delivered("1")
+    testee.delivered("unknown")
+    assert testee.resume() == {"2": b"2\n"}
+    assert testee.expire() == 0 and len(testee) == 3
+    time.sleep(0.02)
+    assert testee.expire() == 3
@@ -0,0 +1,70 @@
+"""Test for the Gateway pool module."""
+import os
+import pty
+import time
+from threading import Event
+from unittest.mock import Mock
+
+import pytest
+
+from proglove_streams.exception import ProgloveStreamsException
+from proglove_streams.pool import GatewayPool
+
+
+def _wait_for(predicate, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_pool_dispatch():
+    """Test events of every port reach the shared handler."""
+    ptys = [pty.openpty() for _ in range(3)]
+    ports = [os.ttyname(slave) for _, slave in ptys]
+
+    handler = Mock()
+    received = Event()
+    handler.handle.side_effect = lambda *_args: received.set()
+
+    with GatewayPool(handler, ports + ["port_that_does_not_exist"]) as testee:
+        for index, (master, _) in enumerate(ptys):
+            os.write(master, b'{"event_type": "foo", ')
+            os.write(master, b'"index": %d}\n{\n' % index)
+
+        _wait_for(lambda: handler.handle.call_count == len(ptys))
+        health = testee.health()
+
+    for index, port in enumerate(ports):
+        handler.handle.assert_any_call(
+            testee[port], {"event_type": "foo", "index": index}
+        )
+        assert health[port].connected
+        assert health[port].lines_read == 2
+        assert health[port].malformed_lines == 1
+        assert health[port].last_event_time is not None
+
+    assert not health["port_that_does_not_exist"].connected
+    assert health["port_that_does_not_exist"].last_error
+    assert len(testee) == len(ports) + 1
+
+
+def test_pool_disconnect():
+    """Test a port error is reported in the health."""
+    master, slave = pty.openpty()
+    port = os.ttyname(slave)
+
+    with GatewayPool(Mock(), [port]) as testee:
+        os.close(master)
+        _wait_for(lambda: not testee.health()[port].connected)
+        assert not testee.health()[port].connected
+
+
+def test_pool_exceptions():
+    """Test the pool does not start without any port."""
+    testee = GatewayPool(Mock(), ["port_that_does_not_exist"])
+
+    with pytest.raises(ProgloveStreamsException):
+        testee.start(flush_input=False)
+
+    assert not testee.is_running
+    testee.stop()
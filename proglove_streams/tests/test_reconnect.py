@@ -0,0 +1,43 @@
+"""Test for the reconnection module."""
+from unittest.mock import Mock, patch
+
+import pytest
+
+from proglove_streams.reconnect import ReconnectPolicy, find_port, port_serial_number
+
+
+def test_policy_delays():
+    """Test the delays grow exponentially up to the maximum."""
+    testee = ReconnectPolicy(initial_delay=0.1, max_delay=1.0, jitter=0.0)
+
+    assert [testee.delay(attempt) for attempt in range(6)] == pytest.approx(
+        [0.1, 0.2, 0.4, 0.8, 1.0, 1.0]
+    )
+    assert testee.delay(10000) == 1.0
+
+    jittered = ReconnectPolicy(initial_delay=1.0, max_delay=1.0, jitter=0.5)
+    assert all(0.5 <= jittered.delay(0) <= 1.5 for _ in range(100))
+
+
+def test_invalid_policy():
+    """Test the invalid reconnection policies."""
+    with pytest.raises(ValueError):
+        ReconnectPolicy(initial_delay=2.0, max_delay=1.0)
+    with pytest.raises(ValueError):
+        ReconnectPolicy(multiplier=0.5)
+    with pytest.raises(ValueError):
+        ReconnectPolicy(jitter=1.0)
+
+
+def test_find_port():
+    """Test the ports are looked up by USB serial number."""
+    ports = [
+        Mock(device="/dev/ttyS0", serial_number=None),
+        Mock(device="/dev/ttyACM1", serial_number="PGGW000000042"),
+    ]
+
+    with patch("serial.tools.list_ports.comports", return_value=ports):
+        assert find_port("PGGW000000042") == "/dev/ttyACM1"
+        assert find_port("PGGW000000043") is None
+        assert port_serial_number("/dev/ttyACM1") == "PGGW000000042"
+        assert port_serial_number("/dev/ttyACM0") is None
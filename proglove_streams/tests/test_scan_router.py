@@ -0,0 +1,80 @@
+"""Test for the scan router module."""
+import re
+from unittest.mock import Mock
+
+import pytest
+
+from proglove_streams.scan_router import ScanRouter
+
+
+def test_precedence():
+    """Test the exact codes win over the prefixes, and those over the patterns."""
+    testee = ScanRouter(default="default")
+    testee.exact("LOC-1", "exact")
+    testee.prefix("LOC-", "prefix")
+    testee.prefix("LOC-12", "longer prefix")
+    testee.pattern(r"LOC-\d+", "pattern")
+    testee.pattern(r"(\d+)-(\d+)", "groups")
+    testee.pattern(re.compile("ean-(?P<code>\\d{13})", re.IGNORECASE), "ean")
+    testee.pattern(r"\d+-\d+", "never")
+
+    assert testee.route("LOC-1\r") == "exact"
+    assert testee.route("LOC-2") == "prefix"
+    assert testee.route("LOC-123") == "longer prefix"
+    assert testee.route("LOC-1x") == "prefix"
+    assert testee.route("12-34") == "groups"
+    assert testee.route("EAN-4006381333931") == "ean"
+    assert testee.route("ean-400") == "default"
+    assert testee.route("LO") == "default"
+
+    # the flags only apply to their pattern
+    assert testee.route("loc-1") == "default"
+
+
+def test_patterns_recompiled():
+    """Test the patterns added after routing are used."""
+    testee = ScanRouter(terminator=None)
+    assert testee.route("A1") is None
+
+    testee.pattern("A\\d", "a")
+    assert testee.route("A1") == "a"
+    assert testee.route("A1\r") is None
+    with pytest.raises(ValueError):
+        testee.prefix("", "empty")
+
+
+def test_patterns_not_combined():
+    """Test the patterns which cannot be combined are matched in order."""
+    testee = ScanRouter(terminator=None)
+    testee.pattern(r"(?P<code>A\d)", "a")
+    testee.pattern(r"(?i)ean\d+", "ean")
+    testee.pattern(r"(?P<code>B\d)", "b")
+    testee.pattern(r"(?x) C \d  # comment", "c")
+    testee.pattern(r"(?P<code>\w\d)", "any")
+
+    assert testee.route("A1") == "a"
+    assert testee.route("EAN42") == "ean"
+    assert testee.route("B1") == "b"
+    assert testee.route("C1") == "c"
+    assert testee.route("D1") == "any"
+    assert testee.route("ean") is None
+    with pytest.raises(re.error):
+        testee.pattern("(", "invalid")
+
+
+def test_on_scan():
+    """Test the router calls the callback of a scan event."""
+    client = Mock()
+    callback = Mock(return_value=42)
+    default = Mock()
+    testee = ScanRouter(default=default)
+    testee.exact("DISPLAY", callback)
+
+    model = Mock(scan_code="DISPLAY\r")
+    assert testee(client, model) == 42
+    callback.assert_called_once_with(client, model)
+
+    event = {"event_type": "scan", "scan_code": "OTHER"}
+    testee(client, event)
+    testee(client, {"event_type": "scan"})
+    assert default.call_count == 2
@@ -0,0 +1,142 @@
+"""Test for the fan-out server."""
+import json
+import os
+import socket
+import struct
+import time
+from threading import Thread
+
+import pytest
+
+from proglove_streams.serve.server import FanOutServer
+from proglove_streams.simulator.engine import GatewaySimulator
+from proglove_streams.simulator.transport import PtyTransport
+
+
+def _read_lines(sock: socket.socket, count: int) -> list:
+    sock.settimeout(5)
+    data = b""
+    while data.count(b"\n") < count:
+        chunk = sock.recv(65536)
+        assert chunk, "connection closed"
+        data += chunk
+    return [json.loads(line) for line in data.splitlines()]
+
+
+def _wait(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_fan_out(tmp_path):
+    """Test the events reach all the subscribers, and their commands the Gateway."""
+    simulator = GatewaySimulator(
+        PtyTransport(), devices=10, rate=0, burst=10, latency=0, jitter=0, seed=42
+    )
+    unix = str(tmp_path / "serve.sock")
+
+    with FanOutServer(
+        simulator.transport.name, tcp=("localhost", 0), unix=unix
+    ) as testee:
+        tcp_address, unix_address = testee.addresses
+        assert unix_address == unix
+        subscribers = [
+            socket.create_connection(tcp_address),
+            socket.socket(socket.AF_UNIX, socket.SOCK_STREAM),
+        ]
+        subscribers[1].connect(unix)
+        _wait(lambda: testee.stats().subscribers == 2)
+
+        thread = Thread(target=simulator.run, kwargs={"events": 50}, daemon=True)
+        thread.start()
+        subscribers[0].sendall(
+            b'{"event_type": "gateway_state!"}\nnot json\n{"event_type": "scan"}\n'
+        )
+        _wait(lambda: simulator.stats().replies_sent == 1)
+        simulator.stop()
+        thread.join()
+
+        received = [_read_lines(subscriber, 51) for subscriber in subscribers]
+        stats = testee.stats()
+        for subscriber in subscribers:
+            subscriber.close()
+
+    assert received[0] == received[1]
+    assert "gateway_state" in {event["event_type"] for event in received[0]}
+    assert simulator.stats().commands_received == 1
+    assert stats.connections == 2 and stats.evictions == 0
+    assert stats.events == 51
+    assert stats.commands == 1 and stats.malformed_commands == 2
+    assert not os.path.exists(unix)
+    simulator.transport.close()
+
+
+def test_slow_subscriber_evicted(tmp_path):
+    """Test a subscriber not reading is disconnected, not the others."""
+    unix = str(tmp_path / "serve.sock")
+    event = {"event_type": "scan", "scan_code": "x" * 1000}
+
+    with FanOutServer("loop://", unix=unix, buffer_size=64 * 1024) as testee:
+        slow = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        slow.connect(unix)
+        fast = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        fast.connect(unix)
+        _wait(lambda: testee.stats().subscribers == 2)
+
+        received = 0
+        fast.settimeout(5)
+        for _ in range(1000):
+            testee.publish(event)
+            received += len(fast.recv(1024 * 1024))
+        _wait(lambda: testee.stats().subscribers == 1)
+        stats = testee.stats()
+
+        slow.settimeout(5)
+        while slow.recv(65536):
+            pass
+        fast.close()
+        slow.close()
+
+    assert stats.evictions == 1 and stats.subscribers == 1
+    assert received > 0
+
+
+def test_backlogged_subscriber_reset():
+    """Test a subscriber resetting its backlogged connection is closed once."""
+    event = {"event_type": "scan", "scan_code": "x" * 1000}
+
+    with FanOutServer(
+        "loop://", tcp=("localhost", 0), buffer_size=16 * 1024 * 1024
+    ) as testee:
+        (address,) = testee.addresses
+        reset = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        reset.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+        reset.connect(address)
+        _wait(lambda: testee.stats().subscribers == 1)
+
+        for _ in range(5000):
+            testee.publish(event)
+        time.sleep(0.1)
+        # closed with unread data and no linger, the connection is reset
+        reset.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        reset.close()
+        _wait(lambda: testee.stats().subscribers == 0)
+        time.sleep(0.1)
+
+        subscriber = socket.create_connection(address)
+        _wait(lambda: testee.stats().subscribers == 1)
+        testee.publish({"event_type": "scan"})
+        assert _read_lines(subscriber, 1) == [{"event_type": "scan"}]
+        subscriber.close()
+        stats = testee.stats()
+
+    assert stats.connections == 2 and stats.evictions == 0
+
+
+def test_arguments():
+    """Test the server requires an address to listen on."""
+    with pytest.raises(ValueError):
+        FanOutServer("loop://")
+    with pytest.raises(ValueError):
+        FanOutServer("loop://", tcp=("localhost", 0), buffer_size=0)
@@ -0,0 +1,105 @@
+"""Test for the Gateway simulator."""
+import time
+from threading import Thread
+from unittest.mock import Mock
+
+import pytest
+
+from proglove_streams.exception import CommandError
+from proglove_streams.gateway import Gateway, GatewayMessageHandler
+from proglove_streams.simulator.engine import (
+    ERROR_INJECTED,
+    ERROR_NOT_CONNECTED,
+    GatewaySimulator,
+)
+from proglove_streams.simulator.transport import PtyTransport, TcpTransport
+
+
+def _run(simulator: GatewaySimulator, events: int) -> Thread:
+    thread = Thread(target=simulator.run, kwargs={"events": events}, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_events_over_pty():
+    """Test the simulated events reach the Gateway handler."""
+    simulator = GatewaySimulator(
+        PtyTransport(),
+        devices=10,
+        rate=0,
+        burst=10,
+        mix={"scan": 1, "button_pressed": 1, "scanner_state": 1},
+        latency=0,
+        jitter=0,
+        seed=42,
+    )
+    on_scan = Mock()
+    on_button_pressed = Mock()
+    handler = GatewayMessageHandler(
+        on_scan=on_scan, on_button_pressed=on_button_pressed
+    )
+
+    with Gateway(handler, port=simulator.transport.name) as testee:
+        thread = _run(simulator, 300)
+        state = testee.get_gateway_state().result(timeout=5)
+        deadline = time.monotonic() + 5
+        while simulator.stats().events_sent < 300 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        simulator.stop()
+        thread.join()
+
+    stats = simulator.stats()
+    assert stats.events_sent == 300
+    assert stats.commands_received == 1 and stats.replies_sent == 1
+    assert on_scan.call_count + on_button_pressed.call_count > 0
+    assert state.gateway_serial == "PGGW000000042"
+    simulator.transport.close()
+
+
+def test_command_errors_over_tcp():
+    """Test the error replies to the commands, through a TCP socket."""
+    simulator = GatewaySimulator(
+        TcpTransport(), devices=1, rate=0, mix={}, latency=0, jitter=0
+    )
+    thread = _run(simulator, 0)
+
+    with Gateway(GatewayMessageHandler(), port=simulator.transport.name) as testee:
+        with pytest.raises(CommandError) as error:
+            testee.send_feedback("unknown", "FEEDBACK_POSITIVE").result(timeout=5)
+        assert error.value.error_code == ERROR_NOT_CONNECTED
+
+        simulator._error_rate = 1.0  # pylint: disable=protected-access
+        with pytest.raises(CommandError) as error:
+            testee.send_feedback("M2MR000000000", "FEEDBACK_POSITIVE").result(timeout=5)
+        assert error.value.error_code == ERROR_INJECTED
+
+    simulator.stop()
+    thread.join()
+    simulator.transport.close()
+
+    assert simulator.stats().errors_sent == 2
+    assert simulator.stats().errors_injected == 1
+
+
+def test_device_connections():
+    """Test the scanner state events keep the connected devices consistent."""
+    simulator = GatewaySimulator(Mock(), devices=5, seed=1)
+
+    for _ in range(1000):
+        # pylint: disable=protected-access
+        event = simulator._scanner_state()
+        connected = event["device_connected_state"] == "STATE_CONNECTED"
+        assert (event["device_serial"] in simulator.connected_devices) == connected
+
+    devices = simulator.connected_devices + simulator._disconnected
+    assert sorted(devices) == [f"M2MR{index:09d}" for index in range(5)]
+
+
+def test_invalid_arguments():
+    """Test the invalid simulator arguments."""
+    with pytest.raises(ValueError):
+        GatewaySimulator(Mock(), mix={"foo": 1})
+    with pytest.raises(ValueError):
+        GatewaySimulator(Mock(), devices=0)
+    with pytest.raises(ValueError):
+        GatewaySimulator(Mock(), error_rate=2)
@@ -0,0 +1,68 @@
+"""Test for the validation module."""
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel, Field, ValidationError
+
+from proglove_streams.validation import EventView, parse_event
+
+
+class _Item(BaseModel):
+    name: str
+
+
+class _Model(BaseModel):
+    event_type: str
+    count: int
+    items: List[_Item] = []
+    note: Optional[str] = None
+    renamed: Optional[str] = Field(None, alias="aliased")
+
+
+_EVENT = {
+    "event_type": "foo",
+    "count": "42",
+    "items": [{"name": "bar"}],
+    "aliased": "baz",
+    "extra": True,
+}
+
+
+def test_event_view():
+    """Test the fields of a lazy view are validated on access."""
+    testee = EventView(_Model, _EVENT)
+
+    assert testee.count == 42
+    assert testee.items == [_Item(name="bar")]
+    assert testee.note is None
+    assert testee.renamed == "baz"
+    assert testee.raw is _EVENT
+    assert testee.to_model() == _Model.parse_obj(_EVENT)
+
+    with pytest.raises(AttributeError):
+        _ = testee.extra
+
+
+def test_event_view_errors():
+    """Test invalid fields raise on access only."""
+    testee = EventView(_Model, {"event_type": "foo", "items": "bar"})
+
+    assert testee.event_type == "foo"
+
+    with pytest.raises(ValidationError):
+        _ = testee.count
+
+    with pytest.raises(ValidationError):
+        _ = testee.items
+
+
+def test_parse_event():
+    """Test parsing an event in every validation mode."""
+    assert parse_event(_Model, _EVENT, "full") == _Model.parse_obj(_EVENT)
+    assert isinstance(parse_event(_Model, _EVENT, "lazy"), EventView)
+
+    unchecked = parse_event(_Model, {"event_type": "foo", "count": "42"}, "none")
+    assert unchecked.count == "42"
+
+    with pytest.raises(ValueError):
+        parse_event(_Model, {"event_type": "foo"}, "full")
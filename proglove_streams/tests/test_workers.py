@@ -0,0 +1,80 @@
+"""Test for the worker dispatch module."""
+from threading import Event
+from typing import Dict, List
+
+import pytest
+
+from proglove_streams.workers import DispatchStats, WorkerDispatcher
+
+
+def test_order_per_key():
+    """Test the tasks of a key are run in order."""
+    results: Dict[int, List[int]] = {key: [] for key in range(10)}
+    testee = WorkerDispatcher(workers=3)
+    testee.start()
+
+    for index in range(100):
+        for key, values in results.items():
+            assert testee.submit(key, lambda v=values, i=index: v.append(i))
+
+    testee.stop()
+
+    for values in results.values():
+        assert values == list(range(100))
+    assert testee.stats() == DispatchStats(submitted=1000, processed=1000)
+
+
+@pytest.mark.parametrize(
+    "policy, expected",
+    [
+        pytest.param("drop_newest", [0, 1], id="drop_newest"),
+        pytest.param("drop_oldest", [0, 3], id="drop_oldest"),
+    ],
+)
+def test_drop_policies(policy: str, expected: List[int]):
+    """Test the tasks dropped when the queue is full."""
+    blocked = Event()
+    results: List[int] = []
+    testee = WorkerDispatcher(workers=1, queue_size=1, policy=policy)
+    testee.start()
+
+    def run(index: int) -> None:
+        blocked.wait()
+        results.append(index)
+
+    assert testee.submit(None, lambda: run(0))
+    while testee.queue_depths() != [0]:
+        pass
+    for index in range(1, 4):
+        testee.submit(None, lambda i=index: run(i))
+    blocked.set()
+    testee.stop()
+
+    assert results == expected
+    stats = testee.stats()
+    assert stats.submitted == 4
+    assert stats.dropped == 2
+    assert stats.processed == 2
+
+
+def test_failures():
+    """Test failing tasks are counted."""
+    testee = WorkerDispatcher(workers=1)
+    testee.start()
+
+    testee.submit(None, lambda: 1 / 0)
+    testee.stop()
+
+    assert testee.stats().failed == 1
+    assert not testee.submit(None, lambda: None)
+    assert testee.stats().dropped == 1
+
+
+def test_wrong_arguments():
+    """Test the arguments are checked."""
+    with pytest.raises(ValueError):
+        WorkerDispatcher(workers=0)
+    with pytest.raises(ValueError):
+        WorkerDispatcher(queue_size=0)
+    with pytest.raises(ValueError):
+        WorkerDispatcher(policy="foo")
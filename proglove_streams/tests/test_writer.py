@@ -0,0 +1,86 @@
+"""Test for the command writer module."""
+from threading import Event
+from typing import List
+
+import pytest
+
+from proglove_streams.exception import ProgloveStreamsException
+from proglove_streams.writer import CommandWriter
+
+
+def test_coalesced_writes():
+    """Test the commands queued during a write are written at once."""
+    writes: List[bytes] = []
+    blocked = Event()
+
+    def write(data: bytes) -> None:
+        blocked.wait()
+        writes.append(data)
+
+    testee = CommandWriter(write)
+    testee.start()
+    written: List[int] = []
+
+    testee.send(b"first\n", lambda: written.append(len(writes)))
+    while testee.stats().queued:
+        pass
+    for index in range(10):
+        testee.send(b"%d\n" % index)
+    assert testee.stats().queued == 10
+
+    blocked.set()
+    assert testee.flush(timeout=1)
+    testee.stop()
+
+    assert writes == [b"first\n", b"".join(b"%d\n" % index for index in range(10))]
+    assert written == [1]
+    stats = testee.stats()
+    assert stats.commands == 11
+    assert stats.writes == 2
+    assert stats.bytes_written == sum(len(data) for data in writes)
+    assert stats.latency_max >= stats.latency_mean > 0
+
+
+def test_max_batch_size():
+    """Test the writes are limited to the maximum batch size."""
+    writes: List[bytes] = []
+    testee = CommandWriter(writes.append, max_batch_size=4)
+
+    testee.start()
+    with pytest.raises(ProgloveStreamsException):
+        testee.start()
+        testee.send(b"123\n" * 3)
+        testee.send(b"1\n")
+        testee.send(b"2\n")
+        testee.send(b"3\n")
+        testee.stop()
+        testee.send(b"4\n")
+
+    assert b"".join(writes) == b"123\n" * 3 + b"1\n2\n3\n"
+    assert all(len(data) <= 4 for data in writes[1:])
+
+
+def test_errors():
+    """Test failed writes and full queue."""
+    blocked = Event()
+
+    def write(_data: bytes) -> None:
+        blocked.wait()
+        raise OSError("foo")
+
+    errors: List[Exception] = []
+    testee = CommandWriter(write, queue_size=1, on_error=errors.append)
+    testee.start()
+
+    testee.send(b"1\n", lambda: pytest.fail("failed write reported as written"))
+    while testee.stats().queued:
+        pass
+    testee.send(b"2\n")
+    with pytest.raises(ProgloveStreamsException):
+        testee.send(b"3\n")
+
+    blocked.set()
+    testee.stop()
+    assert testee.stats().errors == 2
+    assert testee.stats().commands == 0
+    assert [str(error) for error in errors] == ["foo", "foo"]
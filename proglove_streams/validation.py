@@ -0,0 +1,115 @@
+"""Validation of the received events.
+
+The handlers parse every event into its Streams API model, which validates
+all of its fields. For trusted Gateways the validation can be relaxed:
+
+- ``full`` parses the event into its model (default).
+- ``lazy`` passes an :class:`EventView` which only validates a field when
+  it is accessed.
+- ``none`` builds the model with ``construct``, without any validation.
+  Nested fields are then left as raw dictionaries and lists.
+
+"""
+from typing import TYPE_CHECKING, Any, Dict, Optional, Type
+
+if TYPE_CHECKING:
+    from pydantic import BaseModel
+
+VALIDATION_FULL = "full"
+VALIDATION_LAZY = "lazy"
+VALIDATION_NONE = "none"
+
+VALIDATION_MODES = (VALIDATION_FULL, VALIDATION_LAZY, VALIDATION_NONE)
+
+
+class EventView:
+    """Read-only view of a raw event validating its fields on access.
+
+    The fields are accessed as attributes, like on the model. A field is
+    validated the first time it is accessed and :class:`ValidationError`
+    is raised if it is invalid.
+
+    Arguments:
+        model: The model of the event.
+        event: The raw event dictionary.
+
+    """
+
+    __slots__ = ("_model", "_event", "_values")
+
+    def __init__(self, model: Type["BaseModel"], event: Dict[str, Any]):
+        """Initialize the class."""
+        self._model = model
+        self._event = event
+        self._values: Dict[str, Any] = {}
+
+    @property
+    def raw(self) -> Dict[str, Any]:
+        """Get the raw event dictionary."""
+        return self._event
+
+    def to_model(self) -> "BaseModel":
+        """Validate the whole event and get its model."""
+        return self._model.parse_obj(self._event)
+
+    def __getattr__(self, name: str) -> Any:
+        """Get a validated field."""
+        values = self._values
+        if name in values:
+            return values[name]
+
+        field = self._model.__fields__.get(name)
+        if field is None:
+            raise AttributeError(
+                f"'{self._model.__name__}' object has no attribute '{name}'"
+            )
+
+        if field.alias in self._event:
+            value, errors = field.validate(
+                self._event[field.alias], {}, loc=field.alias, cls=self._model
+            )
+            if errors:
+                raise _validation_error(self._model, errors)
+        elif field.required:
+            raise _validation_error(self._model, missing=field.alias)
+        else:
+            value = field.get_default()
+
+        values[name] = value
+        return value
+
+    def __repr__(self) -> str:
+        """Represent the view."""
+        return f"{self.__class__.__name__}({self._model.__name__}, {self._event!r})"
+
+
+def parse_event(
+    model: Type["BaseModel"], event: Dict[str, Any], validation: str
+) -> Any:
+    """Parse an event according to a validation mode.
+
+    Raises:
+        ValueError: if the event is invalid in ``full`` validation mode.
+
+    """
+    if validation == VALIDATION_LAZY:
+        return EventView(model, event)
+    if validation == VALIDATION_NONE:
+        return model.construct(**event)
+    return model.parse_obj(event)
+
+
+def _validation_error(
+    model: Type["BaseModel"], errors: Any = None, missing: Optional[str] = None
+) -> Exception:
+    """Build the validation error of a field, or of a missing field."""
+    # pydantic is already imported by the model, not by this module
+    # pylint: disable=import-outside-toplevel
+    from pydantic import ValidationError
+
+    if missing is not None:
+        from pydantic.error_wrappers import ErrorWrapper
+        from pydantic.errors import MissingError
+
+        errors = ErrorWrapper(MissingError(), loc=missing)
+    return ValidationError([errors], model)
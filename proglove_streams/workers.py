@@ -0,0 +1,193 @@
+"""Worker dispatch module.
+
+By default the Gateway calls the handler callbacks on its reading thread,
+so a slow callback stalls the reading of the serial port. With a
+:class:`WorkerDispatcher` the reading thread only decodes the events and
+queues them, while a pool of worker threads runs the callbacks.
+
+The events are distributed to the workers by a key, the ``device_serial``
+for the Gateway, so the events of a device are processed in order. Each
+worker has a bounded queue and the policy applied when it is full is
+configurable:
+
+- ``block`` blocks the reading thread until there is room in the queue
+  (backpressure).
+- ``drop_newest`` drops the event being queued.
+- ``drop_oldest`` drops the oldest queued event to make room.
+
+"""
+import logging
+from collections import deque
+from dataclasses import dataclass
+from threading import Condition, Thread
+from typing import Callable, Deque, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+POLICY_BLOCK = "block"
+POLICY_DROP_NEWEST = "drop_newest"
+POLICY_DROP_OLDEST = "drop_oldest"
+
+POLICIES = (POLICY_BLOCK, POLICY_DROP_NEWEST, POLICY_DROP_OLDEST)
+
+
+@dataclass
+class DispatchStats:
+    """Counters of a :class:`WorkerDispatcher`."""
+
+    submitted: int = 0
+    processed: int = 0
+    dropped: int = 0
+    failed: int = 0
+    queued: int = 0
+
+
+class _Shard:
+    """Queue of a worker."""
+
+    def __init__(self) -> None:
+        self.tasks: Deque[Callable[[], None]] = deque()
+        self.condition = Condition()
+        self.stats = DispatchStats()
+        self.thread: Optional[Thread] = None
+
+
+class WorkerDispatcher:
+    """Run tasks on a pool of worker threads, in order per key.
+
+    Arguments:
+        workers: The number of worker threads.
+        queue_size: The maximum number of queued tasks per worker.
+        policy: The policy applied when the queue of a worker is full.
+
+    """
+
+    def __init__(
+        self, workers: int = 4, queue_size: int = 1000, policy: str = POLICY_BLOCK
+    ):
+        """Initialize the class."""
+        if workers < 1:
+            raise ValueError("at least one worker is required")
+        if queue_size < 1:
+            raise ValueError("the queue size must be positive")
+        if policy not in POLICIES:
+            raise ValueError(f"unknown queue policy: {policy}")
+
+        self._shards = [_Shard() for _ in range(workers)]
+        self._queue_size = queue_size
+        self._policy = policy
+        self._is_running = False
+
+    @property
+    def is_running(self) -> bool:
+        """Tell whether the workers are running."""
+        return self._is_running
+
+    def start(self) -> None:
+        """Start the worker threads."""
+        if self._is_running:
+            return
+
+        logger.debug("start %u worker threads", len(self._shards))
+        self._is_running = True
+        for index, shard in enumerate(self._shards):
+            shard.thread = Thread(
+                target=self._work, args=(shard,), name=f"worker-{index}", daemon=True
+            )
+            shard.thread.start()
+
+    def stop(self) -> None:
+        """Stop the worker threads once the queued tasks are processed."""
+        if not self._is_running:
+            return
+
+        logger.debug("stop the worker threads")
+        self._is_running = False
+        for shard in self._shards:
+            with shard.condition:
+                shard.condition.notify_all()
+
+        for shard in self._shards:
+            if shard.thread is not None:
+                shard.thread.join()
+                shard.thread = None
+
+    def submit(self, key: Hashable, task: Callable[[], None]) -> bool:
+        """Queue a task.
+
+        Arguments:
+            key: The tasks with the same key are run in submission order.
+            task: The task to run.
+
+        Returns:
+            ``False`` if the task was dropped.
+
+        """
+        shard = self._shards[hash(key) % len(self._shards)]
+
+        with shard.condition:
+            shard.stats.submitted += 1
+
+            while self._is_running and len(shard.tasks) >= self._queue_size:
+                if self._policy == POLICY_DROP_NEWEST:
+                    shard.stats.dropped += 1
+                    logger.debug("worker queue full, event dropped")
+                    return False
+                if self._policy == POLICY_DROP_OLDEST:
+                    shard.tasks.popleft()
+                    shard.stats.dropped += 1
+                    logger.debug("worker queue full, oldest event dropped")
+                    continue
+                shard.condition.wait()
+
+            if not self._is_running:
+                shard.stats.dropped += 1
+                logger.warning("worker dispatcher not running, event dropped")
+                return False
+
+            shard.tasks.append(task)
+            shard.condition.notify_all()
+
+        return True
+
+    def stats(self) -> DispatchStats:
+        """Get a snapshot of the counters of all the workers."""
+        total = DispatchStats()
+        for shard in self._shards:
+            with shard.condition:
+                total.submitted += shard.stats.submitted
+                total.processed += shard.stats.processed
+                total.dropped += shard.stats.dropped
+                total.failed += shard.stats.failed
+                total.queued += len(shard.tasks)
+        return total
+
+    def queue_depths(self) -> List[int]:
+        """Get the number of queued tasks of every worker."""
+        depths = []
+        for shard in self._shards:
+            with shard.condition:
+                depths.append(len(shard.tasks))
+        return depths
+
+    def _work(self, shard: _Shard) -> None:
+        while True:
+            with shard.condition:
+                while self._is_running and not shard.tasks:
+                    shard.condition.wait()
+                if not shard.tasks:
+                    return
+                task = shard.tasks.popleft()
+                shard.condition.notify_all()
+
+            try:
+                task()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("event handling failed")
+                failed = 1
+            else:
+                failed = 0
+
+            with shard.condition:
+                shard.stats.processed += 1
+                shard.stats.failed += failed
@@ -0,0 +1,219 @@
+"""Command writer module.
+
+A :class:`CommandWriter` serializes the commands sent to a Gateway from any
+thread on a dedicated writing thread. The commands queued while a write is
+in progress are coalesced and sent with a single write to the serial port.
+
+"""
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from threading import Condition, Thread
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+from serial import SerialException
+
+from proglove_streams.exception import ProgloveStreamsException
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 64 * 1024
+
+
+@dataclass
+class WriterStats:
+    """Counters of a :class:`CommandWriter`.
+
+    Attributes:
+        commands: The number of commands written.
+        writes: The number of writes to the serial port.
+        bytes_written: The number of bytes written.
+        errors: The number of failed writes.
+        queued: The number of commands waiting to be written.
+        latency_total: The sum of the times, in seconds, between queueing
+            and writing the commands.
+        latency_max: The maximum time between queueing and writing a
+            command.
+
+    """
+
+    commands: int = 0
+    writes: int = 0
+    bytes_written: int = 0
+    errors: int = 0
+    queued: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+
+    @property
+    def latency_mean(self) -> float:
+        """Get the mean time between queueing and writing a command."""
+        return self.latency_total / self.commands if self.commands else 0.0
+
+
+class CommandWriter:
+    """Write queued commands from a dedicated thread.
+
+    Arguments:
+        write: The function writing data to the serial port.
+        queue_size: The maximum number of queued commands.
+        max_batch_size: The maximum number of bytes written at once.
+        on_error: Called from the writing thread with the exception when a
+            write fails, the commands of the write being lost.
+
+    """
+
+    def __init__(
+        self,
+        write: Callable[[bytes], Any],
+        queue_size: int = 10000,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        on_error: Optional[Callable[[Exception], Any]] = None,
+    ):
+        """Initialize the class."""
+        self._write = write
+        self._on_error = on_error
+        self._queue_size = queue_size
+        self._max_batch_size = max_batch_size
+        self._queue: Deque[Tuple[bytes, float, Optional[Callable[[], Any]]]] = deque()
+        self._condition = Condition()
+        self._thread: Optional[Thread] = None
+        self._is_running = False
+        self._is_writing = False
+        self._stats = WriterStats()
+
+    @property
+    def is_running(self) -> bool:
+        """Tell whether the writing thread is running."""
+        return self._is_running
+
+    def start(self) -> None:
+        """Start the writing thread."""
+        if self._is_running:
+            return
+
+        logger.debug("start the writer thread")
+        self._is_running = True
+        self._thread = Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the writing thread once the queued commands are written."""
+        if not self._is_running:
+            return
+
+        logger.debug("stop the writer thread")
+        with self._condition:
+            self._is_running = False
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def send(self, data: bytes, on_written: Optional[Callable[[], Any]] = None) -> None:
+        """Queue data to write.
+
+        Arguments:
+            data: The data to write.
+            on_written: Called from the writing thread once the data is
+                written, not if the write fails.
+
+        Raises:
+            ProgloveStreamsException: if the writer is not running or its
+                queue is full.
+
+        """
+        with self._condition:
+            if not self._is_running:
+                raise ProgloveStreamsException("command writer not running")
+            if len(self._queue) >= self._queue_size:
+                raise ProgloveStreamsException("command queue full")
+
+            self._queue.append((data, time.monotonic(), on_written))
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the queued commands are written.
+
+        Returns:
+            ``False`` if the timeout expired.
+
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._queue and not self._is_writing, timeout
+            )
+
+    def stats(self) -> WriterStats:
+        """Get a snapshot of the writer counters."""
+        with self._condition:
+            return replace(self._stats, queued=len(self._queue))
+
+    def _next_batch(
+        self,
+    ) -> Tuple[bytes, int, float, float, List[Callable[[], Any]]]:
+        """Take queued commands, up to the maximum batch size."""
+        chunks: List[bytes] = []
+        callbacks: List[Callable[[], Any]] = []
+        size = 0
+        latency_total = 0.0
+        now = time.monotonic()
+        latency_max = now - self._queue[0][1]
+        while self._queue and (
+            not chunks or size + len(self._queue[0][0]) <= self._max_batch_size
+        ):
+            data, queued_at, on_written = self._queue.popleft()
+            chunks.append(data)
+            if on_written is not None:
+                callbacks.append(on_written)
+            size += len(data)
+            latency_total += now - queued_at
+        return b"".join(chunks), len(chunks), latency_total, latency_max, callbacks
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or not self._is_running)
+                if not self._queue:
+                    self._condition.notify_all()
+                    return
+                (
+                    data,
+                    commands,
+                    latency_total,
+                    latency_max,
+                    callbacks,
+                ) = self._next_batch()
+                self._is_writing = True
+
+            start = time.monotonic()
+            error: Optional[Exception] = None
+            try:
+                self._write(data)
+            except (SerialException, OSError, ProgloveStreamsException) as e:
+                logger.error("could not send data to serial: %s", e)
+                error = e
+            write_time = time.monotonic() - start
+
+            if error is not None:
+                if self._on_error is not None:
+                    self._on_error(error)
+            else:
+                for on_written in callbacks:
+                    on_written()
+
+            with self._condition:
+                self._is_writing = False
+                if error is not None:
+                    self._stats.errors += 1
+                else:
+                    self._stats.commands += commands
+                    self._stats.writes += 1
+                    self._stats.bytes_written += len(data)
+                    self._stats.latency_total += latency_total + commands * write_time
+                    self._stats.latency_max = max(
+                        self._stats.latency_max, latency_max + write_time
+                    )
+                self._condition.notify_all()